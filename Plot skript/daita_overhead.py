@@ -0,0 +1,101 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# results_catalog ligger i repots rot, en nivå upp
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import results_catalog
+
+# Kolumnnamn i CSV-filerna från all-stats.py -> namn som används i graferna
+COLUMN_NAMES = {
+    "Average Duration (s)": "duration (sec)",
+    "Average Bandwidth (MiB)": "bandwidth (MiB)",
+    "Average Sent Bandwidth (MiB)": "bandwidth sent (MiB)",
+    "Average Received Bandwidth (MiB)": "bandwidth recv (MiB)",
+    "DF Accuracy": "df (accuracy)",
+    "RF Accuracy": "rf (accuracy)",
+    "Defense": "defense",
+    "Average Number Sent": "number sent",
+    "Average Number Received": "number received"
+}
+
+# (mätvärde, overhead-kolumn)
+OVERHEAD_COLUMNS = [
+    ("bandwidth (MiB)", "bandwidth overhead (x)"),
+    ("bandwidth sent (MiB)", "bandwidth overhead sent (x)"),
+    ("bandwidth recv (MiB)", "bandwidth overhead recv (x)"),
+    ("duration (sec)", "oh latency (x)"),
+    ("number sent", "number sent overhead (x)"),
+    ("number received", "number received overhead (x)")
+]
+
+GROUP_KEYS = ['daita_version', 'Server']
+
+# Indata är antingen en CSV-fil eller ett urval ur SQLite-katalogen: "results.db#daita_version=V2,medium=WiFi"
+# (tolkas och hämtas av results_catalog)
+def is_catalog_input(source):
+    return results_catalog.split_source(source) is not None
+
+
+def version_name(source):
+    """Label for an input: the CSV file name without .csv (e.g. 'DAITA V2 WiFi') or the catalogue selector values."""
+    if is_catalog_input(source):
+        _, selector = results_catalog.split_source(source)
+        return ' '.join(part.split('=', 1)[-1] for part in selector.split(',') if part)
+    return os.path.splitext(os.path.basename(source))[0]
+
+
+def read_input(source):
+    """Server rows of one input with the CSV column names, from a CSV file or a catalogue run."""
+    if not is_catalog_input(source):
+        return pd.read_csv(source)
+    headers, rows = results_catalog.read_run(*results_catalog.split_source(source))
+    return pd.DataFrame(rows, columns=headers)
+
+
+def compute_overheads(server_impact):
+    """Add overhead columns relative to the Undefended row of each (daita_version, Server).
+
+    All servers and versions are handled in one merge, overhead = value / baseline - 1.
+    Undefended rows get overhead 0 and servers without an Undefended row get NaN.
+    """
+    if 'daita_version' not in server_impact.columns:
+        server_impact = server_impact.assign(daita_version='')
+
+    metrics = [metric for metric, _ in OVERHEAD_COLUMNS]
+    undefended = server_impact['defense'].str.lower() == 'undefended'
+
+    baseline = server_impact.loc[undefended, GROUP_KEYS + metrics].drop_duplicates(GROUP_KEYS)
+    baseline = baseline.rename(columns={metric: f"{metric} baseline" for metric in metrics})
+    merged = server_impact.merge(baseline, on=GROUP_KEYS, how='left')
+    merged.index = server_impact.index
+
+    for metric, overhead in OVERHEAD_COLUMNS:
+        base = merged[f"{metric} baseline"]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(base != 0, merged[metric] / base, float('inf'))
+        merged[overhead] = ratio - 1
+        merged.loc[undefended, overhead] = 0
+
+    missing = merged.loc[merged['bandwidth (MiB) baseline'].isna(), GROUP_KEYS].drop_duplicates()
+    for version, server in missing.itertuples(index=False):
+        print(f"Server: {server} ({version}), Ingen Undefended-data")
+
+    return merged.drop(columns=[f"{metric} baseline" for metric in metrics])
+
+
+def calculate_overhead(data, daita_version):
+    server_impact = data.rename(columns=COLUMN_NAMES)
+    server_impact['daita_version'] = daita_version
+    return compute_overheads(server_impact)
+
+
+def load_versions(files):
+    """Read any number of stats inputs (DAITA versions / capture media) into one frame with overheads."""
+    frames = []
+    for fname in files:
+        data = read_input(fname).rename(columns=COLUMN_NAMES)
+        data['daita_version'] = version_name(fname)
+        frames.append(data)
+    return compute_overheads(pd.concat(frames, ignore_index=True))
@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import plot_DAITA_on_off
+import plot_DAITA_compare
+import render_cache
+
+SCRIPTS = {
+    'on_off': plot_DAITA_on_off,
+    'compare': plot_DAITA_compare
+}
+
+_frames = {}
+
+def load_spec(spec_file):
+    """Read a batch spec and resolve input/output paths relative to the spec file."""
+    with open(spec_file) as f:
+        spec = json.load(f)
+
+    spec_dir = os.path.dirname(os.path.abspath(spec_file))
+    output_dir = os.path.join(spec_dir, spec.get('output_dir', '.'))
+
+    jobs = []
+    for job in spec['jobs']:
+        if job['script'] not in SCRIPTS:
+            raise ValueError(f"Unknown script '{job['script']}', expected one of {list(SCRIPTS)}")
+        inputs = [os.path.join(spec_dir, fname) for fname in job['inputs']]
+        if job['script'] == 'on_off' and len(inputs) != 1:
+            raise ValueError(f"on_off takes exactly one input file, got {len(inputs)}")
+        jobs.append({
+            'script': job['script'],
+            'inputs': inputs,
+            'output': os.path.join(output_dir, job['output']),
+            'figures': expand_figures(SCRIPTS[job['script']], job.get('figures', 'all'))
+        })
+    return jobs
+
+def expand_figures(module, figures):
+    split_names = [figure['fig_name'] for figure in module.SPLIT_FIGURES]
+    if figures == 'all':
+        return module.FIGURE_NAMES
+    if figures == 'split':
+        return split_names
+    if figures == 'combined':
+        return [module.COMBINED_FIGURE]
+    for fig_name in figures:
+        if fig_name not in module.FIGURE_NAMES:
+            raise ValueError(f"Unknown figure '{fig_name}', expected one of {module.FIGURE_NAMES}")
+    return figures
+
+def prepare_frames(jobs):
+    """Parse each distinct (script, inputs) combination once."""
+    frames = {}
+    for job in jobs:
+        key = (job['script'], tuple(job['inputs']))
+        if key in frames:
+            continue
+        module = SCRIPTS[job['script']]
+        if job['script'] == 'on_off':
+            frames[key] = module.prepare_data(job['inputs'][0])
+        else:
+            frames[key] = module.prepare_data(job['inputs'])
+    return frames
+
+def init_worker(frames):
+    global _frames
+    import matplotlib
+    import seaborn as sns
+
+    matplotlib.use("Agg")   # Ingen GUI, figurerna skrivs bara till fil
+    sns.set_theme(style="darkgrid")
+    _frames = frames
+
+def render_task(key, output_name, fig_name):
+    SCRIPTS[key[0]].render_figure(_frames[key], output_name, fig_name)
+    return output_name, fig_name
+
+def run_batch(jobs, workers=None, force=False):
+    start = time.time()
+    frames = prepare_frames(jobs)
+
+    # Figurer vars indata inte ändrats sedan förra körningen hoppas över
+    caches = {}
+    tasks = []
+    skipped = 0
+    for job in jobs:
+        key = (job['script'], tuple(job['inputs']))
+        if frames[key] is None:
+            print(f"Skipping {job['output']}: no data to plot")
+            continue
+        output_dir = os.path.dirname(job['output'])
+        os.makedirs(output_dir, exist_ok=True)
+        cache = caches.setdefault(output_dir, render_cache.RenderCache(output_dir))
+        module = SCRIPTS[job['script']]
+        for fig_name in job['figures']:
+            output_path = module.figure_path(job['output'], fig_name)
+            cache_key = render_cache.figure_key(module, job['inputs'], fig_name)
+            if not force and cache.is_fresh(output_path, cache_key):
+                skipped += 1
+                continue
+            tasks.append((key, job['output'], fig_name, output_path, cache, cache_key))
+
+    failed = []
+    rebuilt = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(frames,)) as pool:
+        futures = {pool.submit(render_task, *task[:3]): task for task in tasks}
+        for future in as_completed(futures):
+            _, output_name, fig_name, output_path, cache, cache_key = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error rendering {output_name} {fig_name}: {e}")
+                failed.append((output_name, fig_name))
+                continue
+            cache.update(output_path, cache_key)
+            rebuilt.append(output_path)
+
+    for cache in caches.values():
+        cache.save()
+
+    print("\nRebuilt figures:")
+    for output_path in sorted(rebuilt):
+        print(f"  {output_path}")
+    print(f"\nRendered {len(rebuilt)}/{len(tasks)} figures, {skipped} up to date, in {time.time() - start:.1f} s")
+    return failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render figures from several stats CSVs in parallel.")
+    parser.add_argument("spec", type=str, help="Path to JSON batch spec")
+    parser.add_argument("--workers", default=None, type=int, help="number of render processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="re-render figures even if their inputs are unchanged")
+
+    args = parser.parse_args()
+
+    # Gäller även processerna i poolen, innan matplotlib har importerats någonstans
+    os.environ['MPLBACKEND'] = 'Agg'
+    failed = run_batch(load_spec(args.spec), args.workers, args.force)
+    sys.exit(1 if failed else 0)
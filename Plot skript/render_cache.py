@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import sys
+
+CACHE_FILE = '.render_cache.json'
+
+# Delas av alla plot-skript; läses som fil så att pandas inte behöver importeras
+OVERHEAD_ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'daita_overhead.py')
+# Katalogindata läses av results_catalog i repots rot
+CATALOG_READER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'results_catalog.py')
+sys.path.insert(0, os.path.dirname(CATALOG_READER))
+
+_digests = {}
+
+def file_digest(path):
+    """sha256 of a file's contents, memoised per process."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    memo_key = (path, stat.st_mtime_ns, stat.st_size)
+    if memo_key not in _digests:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        _digests[memo_key] = h.hexdigest()
+    return _digests[memo_key]
+
+def input_digest(source):
+    """Digest of a plot input; for a catalogue selection (results.db#...) the whole database and the selector."""
+    import results_catalog
+
+    catalog_source = results_catalog.split_source(source)
+    if catalog_source is not None:
+        db_path, selector = catalog_source
+        return file_digest(db_path) + results_catalog.SOURCE_SEPARATOR + selector
+    return file_digest(source)
+
+def script_version(module):
+    """Version of a plot script = hash of its source, of the shared overhead engine and of the catalogue reader."""
+    return file_digest(module.__file__)[:16] + file_digest(OVERHEAD_ENGINE)[:16] + file_digest(CATALOG_READER)[:16]
+
+def figure_spec(module, fig_name):
+    for figure in module.SPLIT_FIGURES:
+        if figure['fig_name'] == fig_name:
+            return repr(sorted(figure.items()))
+    return fig_name
+
+def figure_key(module, inputs, fig_name):
+    key = {
+        'inputs': [input_digest(fname) for fname in inputs],
+        'figure': figure_spec(module, fig_name),
+        'version': script_version(module)
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+class RenderCache:
+    """Keys of rendered figures, stored as .render_cache.json in the output directory."""
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir or '.', CACHE_FILE)
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                print(f"Warning: ignoring unreadable render cache {self.path}")
+
+    def is_fresh(self, output_path, key):
+        name = os.path.basename(output_path)
+        return self.entries.get(name) == key and os.path.exists(output_path)
+
+    def update(self, output_path, key):
+        self.entries[os.path.basename(output_path)] = key
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def render_figures(module, data, inputs, output_name, fig_names, force=False):
+    """Render fig_names with module.render_figure, skipping figures whose inputs are unchanged."""
+    cache = RenderCache(os.path.dirname(output_name))
+    rebuilt = []
+    for fig_name in fig_names:
+        output_path = module.figure_path(output_name, fig_name)
+        key = figure_key(module, inputs, fig_name)
+        if not force and cache.is_fresh(output_path, key):
+            print(f'Up to date: {output_path}')
+            continue
+        module.render_figure(data, output_name, fig_name)
+        cache.update(output_path, key)
+        cache.save()
+        rebuilt.append(fig_name)
+    print(f'Rebuilt {len(rebuilt)}/{len(fig_names)} figures')
+    return rebuilt
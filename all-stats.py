@@ -3,36 +3,160 @@ import argparse
 from pathlib import Path
 import csv
 import subprocess
+import numpy as np
+import trace_io
+import padding_metrics
+import memory_profile
+import parse_ledger
+import trace_manifest
+
+def process_log_file(log_file, trace=None):
+    """Process each log file to calculate its total size, duration and padding metrics.
+
+    trace is the already read (times, sent, sizes) of the file, e.g. from trace_io.prefetch_traces.
+    """
+    times, sent, sizes = trace if trace is not None else trace_io.read_trace(log_file)
+
+    sent_bandwidth = int(sizes[sent].sum())
+    received_bandwidth = int(sizes[~sent].sum())
+    number_sent = int(np.count_nonzero(sent))
+    number_received = sizes.size - number_sent
+    total_log_size = sent_bandwidth + received_bandwidth
+    duration = times[-1] / (10 ** 9) if times.size else 0  # Convert time to seconds (assuming nanoseconds)
+
+    padding = padding_metrics.trace_padding_metrics(times, sent, sizes)
+
+    return total_log_size, sent_bandwidth, received_bandwidth, duration, number_sent, number_received, padding
+
+# Attackerna körs som egna skript i arbetskatalogen, sista raden i utskriften är träffsäkerheten
+ATTACKS = {
+    "df": ["python3", "df.py", "-c", "50", "-s", "100", "--epochs", "30", "--seed", "0", "--train", "-l"],
+    "rf": ["python3", "rf.py", "-c", "50", "-s", "100", "--epochs", "30", "--seed", "0", "--train"],
+}
+
+def run_attack(name, server):
+    """Train and evaluate one WF attack (df or rf) on a server folder, returns the accuracy it prints."""
+    try:
+        print(f"Calculating {name.upper()} accuracy on {server.name}\n")
+        command = ATTACKS[name][:2] + ["-d", server] + ATTACKS[name][2:]
+        result = subprocess.run(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+            )
+        accuracy = result.stdout.strip().split("\n")[-1]
+        print(f"{server.name:<35} {accuracy}\n") #DEBUG
+        return accuracy
+    except Exception as e:
+        print(f"{server.name:<35} ERROR: {e}")
+        return "nan"
+
+@memory_profile.profiled("metrics")
+def server_metrics(server, url_rows=None, trace_rows=None, readahead=trace_io.READAHEAD, prefetch_bytes=trace_io.PREFETCH_BYTES):
+    """Average duration, bandwidth, packet counts and padding metrics over the URLs of one server.
+
+    If url_rows / trace_rows are lists, one dict per URL / valid trace is appended (see results_catalog).
+    readahead and prefetch_bytes are passed to trace_io.prefetch_traces.
+    """
+    print(f"Calculating metrics for {server.name}\n")
+
+    total_duration = 0
+    total_size = 0
+    total_sent_bandwidth = 0
+    total_received_bandwidth = 0
+    total_number_sent = 0
+    total_number_received = 0
+    total_padding = {key: 0 for key, _ in padding_metrics.METRIC_COLUMNS}
+    valid_urls = 0
+    excluded_logs = 0
+
+    for url_folder_num in range(50):
+        print(f"Processing {server.name} URL#{url_folder_num}")  #DEBUG
+
+        url_folder = server / str(url_folder_num)
+        if not url_folder.is_dir():
+            continue
 
-def process_log_file(log_file):
-    """Process each log file to calculate its total size and duration."""
-    duration = 0
-    total_log_size = 0
-    sent_bandwidth = 0
-    received_bandwidth = 0
-    number_sent = 0
-    number_received = 0
-
-    with open(log_file, "r") as f:
-        for line in f:
-            parts = line.strip().split(",")
-
-            time, direction, size = parts
-            size = int(size)
-
-            if direction == 's':
-                sent_bandwidth += size
-                number_sent += 1
-            else:
-                received_bandwidth += size
-                number_received += 1
-
-            duration = float(time) / (10 ** 9)  # Convert time to seconds (assuming nanoseconds)
-            total_log_size += size
-
-    return total_log_size, sent_bandwidth, received_bandwidth, duration, number_sent, number_received
-
-def process_server_folders(input_file):
+        total_log_duration = 0
+        total_log_size = 0
+        total_log_sent_bandwidth = 0
+        total_log_received_bandwidth = 0
+        total_log_number_sent = 0
+        total_log_number_received = 0
+        total_log_padding = {key: 0 for key, _ in padding_metrics.METRIC_COLUMNS}
+        valid_logs = 0
+
+        # Process log files (from 0.log to 99.log, text or compressed), except failed (see the ledger) or empty ones
+        log_files, excluded = parse_ledger.valid_trace_files(url_folder)
+        excluded_logs += excluded
+        for log_file, trace in trace_io.prefetch_traces(log_files, readahead, prefetch_bytes):
+            log_size, sent_bandwidth, received_bandwidth, duration, number_sent, number_received, padding = process_log_file(log_file, trace)
+            if number_sent + number_received == 0:
+                excluded_logs += 1
+                continue
+            valid_logs += 1
+            if trace_rows is not None:
+                sample_id, device_id = trace_manifest.trace_identity(server.parent, log_file)
+                trace_rows.append({"url": url_folder_num, "trace": int(log_file.name.split(".")[0]), "sample": sample_id, "device": device_id, "bytes": log_size,
+                                   "sent_bytes": sent_bandwidth, "received_bytes": received_bandwidth, "duration": duration,
+                                   "number_sent": number_sent, "number_received": number_received})
+            total_log_size += log_size
+            total_log_sent_bandwidth += sent_bandwidth
+            total_log_received_bandwidth += received_bandwidth
+            total_log_duration += duration
+            total_log_number_sent += number_sent
+            total_log_number_received += number_received
+            for key in total_log_padding:
+                total_log_padding[key] += padding[key]
+        if not valid_logs:
+            continue
+            
+
+        # Calculate averages for the URL over its valid traces (normally 5 devices * 20 samples = 100)
+        average_log_size = (total_log_size / valid_logs) / 1024**2  # Convert to MiB 
+        average_log_sent_bandwidth = total_log_sent_bandwidth / valid_logs / 1024**2
+        average_log_received_bandwidth = total_log_received_bandwidth / valid_logs / 1024**2
+        average_log_duration = total_log_duration / valid_logs
+        average_log_number_received = total_log_number_received / valid_logs
+        average_log_number_sent = total_log_number_sent / valid_logs
+
+        total_size += average_log_size
+        total_duration += average_log_duration
+        total_sent_bandwidth += average_log_sent_bandwidth
+        total_received_bandwidth += average_log_received_bandwidth
+        total_number_sent += average_log_number_sent
+        total_number_received += average_log_number_received
+        for key in total_padding:
+            total_padding[key] += total_log_padding[key] / valid_logs
+        valid_urls += 1
+        if url_rows is not None:
+            url_rows.append({"url": url_folder_num, "traces": valid_logs, "duration": average_log_duration,
+                             "bandwidth": average_log_size, "sent_bandwidth": average_log_sent_bandwidth,
+                             "received_bandwidth": average_log_received_bandwidth,
+                             "number_sent": average_log_number_sent, "number_received": average_log_number_received})
+
+    # Calculate averages for the server
+    if excluded_logs:
+        print(f"{server.name:<35} {excluded_logs} traces excluded (failed, truncated or empty)\n")
+    valid_urls = max(valid_urls, 1)
+    average_duration = total_duration / valid_urls
+    average_size = total_size / valid_urls
+    average_sent_bandwidth = total_sent_bandwidth / valid_urls
+    average_received_bandwidth = total_received_bandwidth / valid_urls
+    average_number_sent = total_number_sent / valid_urls
+    average_number_received = total_number_received / valid_urls
+    average_padding = {key: total_padding[key] / valid_urls for key in total_padding}
+
+    return average_duration, average_size, average_sent_bandwidth, average_received_bandwidth, average_number_sent, average_number_received, average_padding
+
+def server_result(metrics, df_accuracy, rf_accuracy):
+    """Combine server_metrics and the attack accuracies into one results tuple."""
+    *averages, average_padding = metrics
+    return (*averages, float(df_accuracy), float(rf_accuracy), average_padding)
+
+def process_server_folders(input_file, details=None, readahead=trace_io.READAHEAD, prefetch_bytes=trace_io.PREFETCH_BYTES):
+    """Metrics and attack accuracies per server; per-URL and per-trace rows go into details if given."""
     results = {}
 
     base_path = Path(input_file)
@@ -40,105 +164,24 @@ def process_server_folders(input_file):
         if not server.is_dir() or server.name.startswith("."):
             continue
         
-        try:
-            print(f"Calculating DF accuracy on {server.name}\n")
-            result = subprocess.run(
-                    ["python3", "df.py", "-d", server, "-c", "50", "-s", "100", "--epochs", "30", "--seed", "0", "--train", "-l"],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.DEVNULL,
-                    text=True,
-                )
-            df_accuracy = result.stdout.strip().split("\n")[-1]
-            print(f"{server.name:<35} {df_accuracy}\n") #DEBUG
-        except Exception as e:
-            print(f"{server.name:<35} ERROR: {e}")
-
-        try:
-            print(f"Calculating RF accuracy on {server.name}\n")
-            result = subprocess.run(
-                    ["python3", "rf.py", "-d", server, "-c", "50", "-s", "100", "--epochs", "30", "--seed", "0", "--train"],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.DEVNULL,
-                    text=True,
-                )
-            rf_accuracy = result.stdout.strip().split("\n")[-1]
-            print(f"{server.name:<35} {rf_accuracy}\n") #DEBUG
-        except Exception as e:
-            print(f"{server.name:<35} ERROR: {e}")
-        
+        df_accuracy = run_attack("df", server)
+        rf_accuracy = run_attack("rf", server)
 
-        print(f"Calculating metrics for {server.name}\n")
-
-        total_duration = 0
-        total_size = 0
-        total_sent_bandwidth = 0
-        total_received_bandwidth = 0
-        total_number_sent = 0
-        total_number_received = 0
-
-        for url_folder_num in range(50):
-            print(f"Processing {server.name} URL#{url_folder_num}")  #DEBUG
-
-            url_folder = server / str(url_folder_num)
-            if not url_folder.is_dir():
-                continue
-
-            total_log_duration = 0
-            total_log_size = 0
-            total_log_sent_bandwidth = 0
-            total_log_received_bandwidth = 0
-            total_log_number_sent = 0
-            total_log_number_received = 0
-
-            # Process log files (from 0.log to 99.log)
-            for log_file in url_folder.glob("*.log"):
-                log_size, sent_bandwidth, received_bandwidth, duration, number_sent, number_received = process_log_file(log_file)
-                total_log_size += log_size
-                total_log_sent_bandwidth += sent_bandwidth
-                total_log_received_bandwidth += received_bandwidth
-                total_log_duration += duration
-                total_log_number_sent += number_sent
-                total_log_number_received += number_received
-                
-                
-
-            # Calculate averages for the URL (5 devices * 20 samples = 100)
-            average_log_size = (total_log_size / 100) / 1024**2  # Convert to MiB 
-            average_log_sent_bandwidth = total_log_sent_bandwidth / 100 / 1024**2
-            average_log_received_bandwidth = total_log_received_bandwidth / 100 / 1024**2
-            average_log_duration = total_log_duration / 100
-            average_log_number_received = total_log_number_received / 100
-            average_log_number_sent = total_log_number_sent / 100
-
-            total_size += average_log_size
-            total_duration += average_log_duration
-            total_sent_bandwidth += average_log_sent_bandwidth
-            total_received_bandwidth += average_log_received_bandwidth
-            total_number_sent += average_log_number_sent
-            total_number_received += average_log_number_received
-
-        # Calculate averages for the server
-        average_duration = total_duration / 50
-        average_size = total_size / 50
-        average_sent_bandwidth = total_sent_bandwidth / 50
-        average_received_bandwidth = total_received_bandwidth / 50
-        average_number_sent = total_number_sent / 50
-        average_number_received = total_number_received / 50
-
-        results[server] = (average_duration, average_size, average_sent_bandwidth, average_received_bandwidth, average_number_sent, average_number_received, float(df_accuracy), float(rf_accuracy))
-        #results[server] = (average_duration, average_size, average_sent_bandwidth, average_received_bandwidth, average_number_sent, average_number_received, 0, 0)
+        url_rows, trace_rows = details.setdefault(server, ([], [])) if details is not None else (None, None)
+        results[server] = server_result(server_metrics(server, url_rows, trace_rows, readahead, prefetch_bytes), df_accuracy, rf_accuracy)
+        #results[server] = server_result(server_metrics(server, url_rows, trace_rows), 0, 0)
         
 
     return results
 
 def print_and_save_results(results, output_path=None):
     print("\n===== SUMMARY =====")
-    print(f"{'Server name':<25} | {'Defense':<20} | {'Average Duration (s)':<22} | {'Average Bandwidth (MiB)':<25} | {'Average Sent Bandwidth (MiB)':<30} | {'Average Received Bandwidth (MiB)':<30} | {'Average Number Sent':<32} | {'Average Number Received':<32} | {'DF Accuracy':<12} | {'RF Accuracy':<12}")
-    print("-" * 198)
+    print(f"{'Server name':<25} | {'Defense':<20} | {'Average Duration (s)':<22} | {'Average Bandwidth (MiB)':<25} | {'Average Sent Bandwidth (MiB)':<30} | {'Average Received Bandwidth (MiB)':<30} | {'Average Number Sent':<32} | {'Average Number Received':<32} | {'DF Accuracy':<12} | {'RF Accuracy':<12} | {'Padded Share':<12} | {'Padding Bytes':<13} | {'Run Length':<10} | {'Run IAT CV':<10}")
+    print("-" * 260)
 
-    for server, (average_duration, average_size, average_sent_bandwidth, average_received_bandwidth, average_number_sent, average_number_received, df_accuracy, rf_accuracy) in results.items():
+    for server, (average_duration, average_size, average_sent_bandwidth, average_received_bandwidth, average_number_sent, average_number_received, df_accuracy, rf_accuracy, padding) in results.items():
         display_server_name, defense = is_server_defended(server.name)
-        print(f"{display_server_name:<25} | {defense:<20} | {average_duration:<22.2f} | {average_size:<25.2f} | {average_sent_bandwidth:<30.2f} | {average_received_bandwidth:<32.2f} | {int(average_number_sent):<32} | {int(average_number_received):<32} | {df_accuracy:<12} | {rf_accuracy:<12}")
+        print(f"{display_server_name:<25} | {defense:<20} | {average_duration:<22.2f} | {average_size:<25.2f} | {average_sent_bandwidth:<30.2f} | {average_received_bandwidth:<32.2f} | {int(average_number_sent):<32} | {int(average_number_received):<32} | {df_accuracy:<12} | {rf_accuracy:<12} | {padding['padded_packet_share']:<12.2f} | {padding['run_byte_share']:<13.2f} | {padding['mean_run_length']:<10.1f} | {padding['run_iat_cv']:<10.2f}")
 
 
     if output_path:
@@ -156,13 +199,13 @@ def print_and_save_results(results, output_path=None):
             f"{'Average Number Received'}",
             f"{'DF Accuracy'}",
             f"{'RF Accuracy'}"
-            ]
+            ] + [column for _, column in padding_metrics.METRIC_COLUMNS]
             writer.writerow(header)
 
 
 
             # Write each server's data with formatted output for better alignment
-            for server_name, (average_duration, average_size, average_sent_bandwidth, average_received_bandwidth, average_number_sent, average_number_received, df_accuracy, rf_accuracy) in results.items():
+            for server_name, (average_duration, average_size, average_sent_bandwidth, average_received_bandwidth, average_number_sent, average_number_received, df_accuracy, rf_accuracy, padding) in results.items():
                 display_server_name, defense = is_server_defended(server_name.name)
                 writer.writerow([
                     f"{display_server_name}",
@@ -175,13 +218,70 @@ def print_and_save_results(results, output_path=None):
                     f"{round(average_number_received, 2)}",
                     f"{round(df_accuracy, 2)}",
                     f"{round(rf_accuracy, 2)}"
-                ])
+                ] + [f"{round(padding[key], 3)}" for key, _ in padding_metrics.METRIC_COLUMNS])
             print(f"\nSatistics saved to: {output_path}\n")
     else:
         print("Can't save, output file not defined\n")
 
     return
 
+def save_to_catalog(results, details, db_path, campaign, daita_version, medium, source):
+    """Store the summary, URL and trace rows of every server as one run in the SQLite catalogue."""
+    import results_catalog
+
+    columns = [column for column, _ in results_catalog.SERVER_COLUMNS]
+    with results_catalog.connect(db_path) as conn:
+        run_id = results_catalog.get_run(conn, campaign, daita_version, medium, os.path.abspath(source))
+        for server, (*values, padding) in results.items():
+            display_server_name, defense = is_server_defended(server.name)
+            summary = dict(zip(columns, values), **padding)
+            url_rows, trace_rows = details.get(server, ([], []))
+            results_catalog.store_server(conn, run_id, display_server_name, defense, summary, url_rows, trace_rows)
+    print(f"Catalogue updated: {db_path} ({campaign}/{daita_version}/{medium})\n")
+
+# Uppdelning per enhet eller sample: (nyckel i trace-raderna, kolumn) och (trace-värde, CSV-kolumn, skala)
+BREAKDOWNS = [("device", "Device"), ("sample", "Sample")]
+BREAKDOWN_COLUMNS = [
+    ("duration", "Average Duration (s)", 1),
+    ("bytes", "Average Bandwidth (MiB)", 1 / 1024**2),
+    ("sent_bytes", "Average Sent Bandwidth (MiB)", 1 / 1024**2),
+    ("received_bytes", "Average Received Bandwidth (MiB)", 1 / 1024**2),
+    ("number_sent", "Average Number Sent", 1),
+    ("number_received", "Average Number Received", 1),
+]
+
+def breakdown_rows(trace_rows, key):
+    """(value, traces, averages) per device or sample, averaged per URL first like server_metrics."""
+    groups = {}
+    for row in trace_rows:
+        groups.setdefault(row[key], {}).setdefault(row["url"], []).append([row[column] for column, _, _ in BREAKDOWN_COLUMNS])
+    scales = np.array([scale for _, _, scale in BREAKDOWN_COLUMNS])
+    rows = []
+    for value, urls in sorted(groups.items()):
+        url_averages = [np.mean(values, axis=0) for values in urls.values()]
+        rows.append((value, sum(len(values) for values in urls.values()), np.mean(url_averages, axis=0) * scales))
+    return rows
+
+def save_breakdowns(results, details, output_path):
+    """Write <output>_by_device.csv and <output>_by_sample.csv from the per-trace rows, print the device table."""
+    for key, title in BREAKDOWNS:
+        path = f"{os.path.splitext(output_path)[0]}_by_{key}.csv"
+        if key == "device":
+            print("\n===== PER DEVICE =====")
+            print(f"{'Server name':<25} | {'Defense':<12} | {'Device':<6} | {'Traces':<6} | {'Average Duration (s)':<22} | {'Average Bandwidth (MiB)':<25}")
+            print("-" * 110)
+        with open(path, mode='w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(["Server", "Defense", title, "Traces"] + [header for _, header, _ in BREAKDOWN_COLUMNS])
+            for server in results:
+                display_server_name, defense = is_server_defended(server.name)
+                for value, traces, averages in breakdown_rows(details.get(server, ([], []))[1], key):
+                    writer.writerow([display_server_name, defense, value, traces] + [f"{round(average, 2)}" for average in averages])
+                    if key == "device":
+                        print(f"{display_server_name:<25} | {defense:<12} | {value:<6} | {traces:<6} | {averages[0]:<22.2f} | {averages[1]:<25.2f}")
+        print(f"\nPer-{key} statistics saved to: {path}")
+    print()
+
 def is_server_defended(text):
     if text.endswith("-ND"):
         return text[:-3], "Undefended"
@@ -198,13 +298,27 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process log files, sum bytes transferred and runs Wf-attacks.")
     parser.add_argument("input_file", type=str, help="Path to the input directory")
     parser.add_argument("output_file", type=str, help="Path to output CSV file")
+    parser.add_argument("--catalog", default=None, help="also store the results in this SQLite catalogue (see results_catalog.py)")
+    parser.add_argument("--campaign", default="", help="measurement campaign, for the catalogue")
+    parser.add_argument("--daita-version", default=None, help="DAITA version for the catalogue, e.g. V2 (default: output file name)")
+    parser.add_argument("--medium", default="", help="capture medium for the catalogue, e.g. WiFi or 4G")
+    parser.add_argument("--breakdown", action="store_true", help="also write per-device and per-sample averages (<output>_by_device.csv, <output>_by_sample.csv)")
+    trace_io.add_prefetch_arguments(parser)
 
     args = parser.parse_args()
 
-    statistics = process_server_folders(args.input_file)
+    details = {} if args.catalog or args.breakdown else None
+    statistics = process_server_folders(args.input_file, details, args.readahead, args.prefetch_mib * 1024 ** 2)
 
     output_path = args.output_file
     if output_path and not output_path.lower().endswith(".csv"):
         output_path += ".csv"
 
-    print_and_save_results(statistics, output_path)
\ No newline at end of file
+    print_and_save_results(statistics, output_path)
+
+    if args.breakdown:
+        save_breakdowns(statistics, details, output_path)
+
+    if args.catalog:
+        daita_version = args.daita_version or os.path.splitext(os.path.basename(output_path))[0]
+        save_to_catalog(statistics, details, args.catalog, args.campaign, daita_version, args.medium, args.input_file)
\ No newline at end of file
@@ -0,0 +1,206 @@
+import argparse
+import csv
+import importlib
+import math
+import multiprocessing
+from pathlib import Path
+from statistics import NormalDist
+import numpy as np
+import padding_metrics
+import parse_ledger
+import trace_io
+
+# all-stats har bindestreck i namnet och kan inte importeras med en vanlig import-sats
+stats = importlib.import_module("all-stats")
+
+# Snabb överblick: i stället för alla 5000 loggar per server läses ett stratifierat slumpurval,
+# ett stratum per (URL, enhet) med ~20 samples var. Medelvärdena vägs ihop som i all-stats.py
+# (först per URL, sedan över URL:er) och får ett konfidensintervall från variansen inom strata.
+# Varje stratum läser minst MIN_PER_STRATUM traces så att variansen skattas inom stratumet, med URL:ens
+# poolade spridning som golv. Intervallen är normalapproximationer: på exempeldatan täckte 95 %-intervallen
+# det sanna värdet i ~93 % av fallen (bandbredd ~88 %, några få mycket stora traces), så använd
+# --target-error eller större --fraction för siffror som ska citeras.
+DEVICES = 5     # Loggindex = (sample-1)*5 + (enhet-1)
+MIN_PER_STRATUM = 2
+
+# (kolumn i all-stats-CSV:n, multiplikator från process_log_file), samma ordning som print_and_save_results
+TRAFFIC_COLUMNS = [
+    ("Average Duration (s)", 1),
+    ("Average Bandwidth (MiB)", 1 / 1024 ** 2),
+    ("Average Sent Bandwidth (MiB)", 1 / 1024 ** 2),
+    ("Average Received Bandwidth (MiB)", 1 / 1024 ** 2),
+    ("Average Number Sent", 1),
+    ("Average Number Received", 1),
+]
+COLUMNS = [column for column, _ in TRAFFIC_COLUMNS] + [column for _, column in padding_metrics.METRIC_COLUMNS]
+
+
+def trace_values(log_file):
+    """One trace's values in COLUMNS order, None for an empty trace (left out like in all-stats.py)."""
+    log_size, sent_bandwidth, received_bandwidth, duration, number_sent, number_received, padding = stats.process_log_file(log_file)
+    if number_sent + number_received == 0:
+        return None
+    traffic = [duration, log_size, sent_bandwidth, received_bandwidth, number_sent, number_received]
+    return [value * scale for value, (_, scale) in zip(traffic, TRAFFIC_COLUMNS)] + \
+           [padding[key] for key, _ in padding_metrics.METRIC_COLUMNS]
+
+
+class Stratum:
+    """The traces of one (URL, device) in a fixed random order; the first n of them are the sample."""
+
+    def __init__(self, url, files, rng):
+        self.url = url
+        self.files = [files[i] for i in rng.permutation(len(files))]
+        self.values = []
+        self.empty = 0
+
+    def read(self, n):
+        """Extend the sample to n traces (earlier reads are kept)."""
+        for log_file in self.files[len(self.values) + self.empty:n]:
+            values = trace_values(log_file)
+            if values is None:
+                self.empty += 1
+            else:
+                self.values.append(values)
+
+    @property
+    def sampled(self):
+        return len(self.values) + self.empty
+
+    @property
+    def size(self):
+        # Tomma traces räknas inte till populationen, de som inte lästs antas vara giltiga
+        return len(self.files) - self.empty
+
+
+def server_strata(server, seed):
+    strata = []
+    rng = np.random.default_rng(seed)
+    for url in range(trace_io.NUM_URLS):
+        url_folder = server / str(url)
+        if not url_folder.is_dir():
+            continue
+        log_files, _ = parse_ledger.valid_trace_files(url_folder)
+        by_device = {}
+        for log_file in log_files:
+            by_device.setdefault(int(log_file.name.split(".")[0]) % DEVICES, []).append(log_file)
+        strata += [Stratum(url, files, rng) for _, files in sorted(by_device.items())]
+    return strata
+
+
+def estimate(strata):
+    """(estimate, variance) per column for the URL-then-server average of all-stats.py."""
+    url_means = []
+    url_variances = []
+    for url in sorted({stratum.url for stratum in strata}):
+        url_strata = [stratum for stratum in strata if stratum.url == url and stratum.values]
+        if not url_strata:
+            continue
+        weights = np.array([stratum.size for stratum in url_strata], dtype=np.float64)
+        weights /= weights.sum()
+        # Med 2-3 traces per stratum underskattas spridningen ofta, så den poolade spridningen inom hela URL:en
+        # används som golv (den enda skattningen för strata med bara en läsbar trace)
+        url_values = np.array([values for stratum in url_strata for values in stratum.values])
+        url_spread = url_values.var(axis=0, ddof=1) if len(url_values) > 1 else np.zeros(len(COLUMNS))
+
+        mean = np.zeros(len(COLUMNS))
+        variance = np.zeros(len(COLUMNS))
+        for weight, stratum in zip(weights, url_strata):
+            values = np.array(stratum.values)
+            n = len(values)
+            spread = np.maximum(values.var(axis=0, ddof=1), url_spread) if n > 1 else url_spread
+            mean += weight * values.mean(axis=0)
+            variance += weight ** 2 * (1 - n / stratum.size) * spread / n
+        url_means.append(mean)
+        url_variances.append(variance)
+
+    if not url_means:
+        return np.zeros(len(COLUMNS)), np.zeros(len(COLUMNS))
+    return np.mean(url_means, axis=0), np.sum(url_variances, axis=0) / len(url_means) ** 2
+
+
+def sample_server(server, fraction, target_error, z, seed):
+    """Read a stratified sample of the server's traces, growing it until the traffic columns reach target_error.
+
+    Returns (estimates, half widths of the confidence intervals, traces read, traces available).
+    """
+    strata = server_strata(server, seed)
+    wanted = {id(stratum): min(len(stratum.files), max(MIN_PER_STRATUM, math.ceil(fraction * len(stratum.files)))) for stratum in strata}
+
+    while True:
+        for stratum in strata:
+            stratum.read(wanted[id(stratum)])
+        means, variances = estimate(strata)
+        half_widths = z * np.sqrt(variances)
+
+        if not target_error:
+            break
+        traffic = slice(0, len(TRAFFIC_COLUMNS))
+        relative = np.divide(half_widths[traffic], np.abs(means[traffic]), out=np.zeros(len(TRAFFIC_COLUMNS)), where=means[traffic] != 0)
+        worst = relative.max()
+        if worst <= target_error or all(stratum.sampled >= len(stratum.files) for stratum in strata):
+            break
+        # Halva intervallbredden krymper som 1/sqrt(n), så urvalet växer med kvadraten på felet (+10 % marginal)
+        growth = (worst / target_error) ** 2 * 1.1
+        for stratum in strata:
+            wanted[id(stratum)] = min(len(stratum.files), max(stratum.sampled + 1, math.ceil(stratum.sampled * growth)))
+        print(f"{server.name:<35} relative error {worst:.3f} > {target_error}, reading more traces")
+
+    return means, half_widths, sum(stratum.sampled for stratum in strata), sum(len(stratum.files) for stratum in strata)
+
+
+def print_and_save_results(results, output_path, confidence):
+    print("\n===== SUMMARY (approximate) =====")
+    shown = COLUMNS[:4]
+    print(f"{'Server name':<25} | {'Defense':<12} | {'Read':<11} | " + " | ".join(f"{column:<34}" for column in shown))
+    print("-" * 200)
+    for server, (means, half_widths, read, total) in results.items():
+        display_server_name, defense = stats.is_server_defended(server.name)
+        cells = [f"{mean:.2f} ± {half_width:.2f}" for mean, half_width in zip(means[:4], half_widths[:4])]
+        print(f"{display_server_name:<25} | {defense:<12} | {f'{read}/{total}':<11} | " + " | ".join(f"{cell:<34}" for cell in cells))
+
+    # Samma kolumner som all-stats.py (attackerna körs inte), följda av intervallens halva bredd
+    with open(output_path, mode="w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Server", "Defense"] + COLUMNS[:len(TRAFFIC_COLUMNS)] + ["DF Accuracy", "RF Accuracy"] +
+                        COLUMNS[len(TRAFFIC_COLUMNS):] + [f"{column} CI{round(confidence * 100)} ±" for column in COLUMNS] +
+                        ["Traces Read", "Traces Total"])
+        for server, (means, half_widths, read, total) in results.items():
+            display_server_name, defense = stats.is_server_defended(server.name)
+            traffic = [f"{round(value, 2)}" for value in means[:len(TRAFFIC_COLUMNS)]]
+            padding = [f"{round(value, 3)}" for value in means[len(TRAFFIC_COLUMNS):]]
+            writer.writerow([display_server_name, defense] + traffic + ["nan", "nan"] + padding +
+                            [f"{round(value, 3)}" for value in half_widths] + [read, total])
+    print(f"\nApproximate statistics saved to: {output_path}\n")
+
+
+def main(args):
+    if not 0 < args.fraction <= 1:
+        print("--fraction must be in (0, 1]\n")
+        return
+    z = NormalDist().inv_cdf(0.5 + args.confidence / 2)
+    servers = trace_io.list_servers(args.input_file)
+
+    with multiprocessing.Pool() as pool:
+        tasks = [pool.apply_async(sample_server, args=(server, args.fraction, args.target_error, z, args.seed)) for server in servers]
+        results = {}
+        for server, task in zip(servers, tasks):
+            results[server] = task.get()
+            print(f"{server.name:<35} {results[server][2]} of {results[server][3]} traces read")
+
+    output_path = args.output_file
+    if not output_path.lower().endswith(".csv"):
+        output_path += ".csv"
+    print_and_save_results(results, output_path, args.confidence)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Approximate all-stats.py numbers with confidence intervals from a stratified sample of the traces (no WF attacks).")
+    parser.add_argument("input_file", type=str, help="Path to the input directory")
+    parser.add_argument("output_file", type=str, help="Path to output CSV file")
+    parser.add_argument("--fraction", default=0.05, type=float, help=f"share of each (URL, device) stratum to read first (default 0.05, at least {MIN_PER_STRATUM} traces)")
+    parser.add_argument("--target-error", default=None, type=float, help="keep reading until every traffic column's CI half width is below this share of its value, e.g. 0.02")
+    parser.add_argument("--confidence", default=0.95, type=float, help="confidence level of the intervals")
+    parser.add_argument("--seed", default=0, type=int, help="seed for the sample")
+
+    main(parser.parse_args())
@@ -0,0 +1,343 @@
+import argparse
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+import parse_ledger
+import pcap_to_log_parser
+
+# Bygger om bara det som blivit inaktuellt, som make men med innehållshashar i stället för tidsstämplar.
+# Mål och beroenden:
+#   convert/<server>  <- captures i <dir>/<server> + konverteringsskripten och flaggorna
+#   metrics/<server>  <- loggarna från convert/<server> + statistikskripten
+#   attacks/<server>  <- loggarna från convert/<server> + df.py/rf.py
+#   summary           <- alla metrics/* och attacks/* -> CSV-filen
+#   figures           <- summary + plot-skripten (bara med --figures)
+# Nyckeln för ett mål är en hash av dess indata, inklusive beroendenas utdata. Målet är aktuellt när
+# nyckeln och utdatans hash är desamma som efter förra bygget (results/.build/state.json), så en
+# omkonvertering som ger identiska loggar bygger inte om statistiken.
+BUILD_DIR = ".build"
+HERE = os.path.dirname(os.path.abspath(__file__))
+CONVERT_SCRIPTS = ["pcap_to_log_parser.py", "pcap_reader.py", "trace_io.py"]
+METRICS_SCRIPTS = ["all-stats.py", "padding_metrics.py", "trace_io.py", "parse_ledger.py", "trace_manifest.py"]
+PLOT_SCRIPT = os.path.join(HERE, "Plot skript", "plot_DAITA_on_off.py")
+PLOT_SCRIPTS = [PLOT_SCRIPT, os.path.join(HERE, "Plot skript", "daita_overhead.py"), os.path.join(HERE, "results_catalog.py")]
+
+
+def combine(values):
+    return hashlib.sha256(json.dumps(values, sort_keys=True).encode()).hexdigest()
+
+
+class Digests:
+    """sha256 of files, remembered between runs by (mtime, size) so unchanged pcaps are not read again."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    def file(self, path):
+        """Digest of a file, "missing" if it does not exist."""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return "missing"
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        with self.lock:
+            self.entries[path] = [stat.st_mtime_ns, stat.st_size, h.hexdigest()]
+        return h.hexdigest()
+
+    def files(self, paths, root):
+        """One digest for a set of files, by their names relative to root."""
+        return combine(sorted((os.path.relpath(path, root), self.file(path)) for path in paths))
+
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.entries)
+        with open(self.path + ".tmp", "w") as f:
+            f.write(data)
+        os.replace(self.path + ".tmp", self.path)
+
+
+class Target:
+    """A build step: inputs() lists what its key depends on, build() makes the outputs, output() hashes them (None if missing)."""
+
+    def __init__(self, name, deps, inputs, build, output):
+        self.name = name
+        self.deps = deps
+        self.inputs = inputs
+        self.build = build
+        self.output = output
+
+
+class Builder:
+    def __init__(self, args):
+        self.args = args
+        self.build_dir = os.path.join(args.results, BUILD_DIR)
+        os.makedirs(os.path.join(self.build_dir, "metrics"), exist_ok=True)
+        os.makedirs(os.path.join(self.build_dir, "attacks"), exist_ok=True)
+        self.digests = Digests(os.path.join(self.build_dir, "digests.json"))
+        self.state_path = os.path.join(self.build_dir, "state.json")
+        try:
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.state = {}
+        self.lock = threading.Lock()
+        self.outputs = {}
+        self.pool = None
+        self.stats = importlib.import_module("all-stats")
+
+    def scripts(self, names):
+        return [self.digests.file(os.path.join(HERE, name)) for name in names]
+
+    def key(self, target):
+        return combine({"inputs": target.inputs(), "deps": [self.outputs[dep] for dep in target.deps]})
+
+    def is_fresh(self, target, key):
+        previous = self.state.get(target.name)
+        if not previous or previous["key"] != key:
+            return False
+        output = target.output()
+        if output is None or output != previous["output"]:
+            return False
+        self.outputs[target.name] = output
+        return True
+
+    def finish(self, target, key):
+        output = target.output()
+        with self.lock:
+            self.outputs[target.name] = output
+            self.state[target.name] = {"key": key, "output": output, "built": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            # Sparas efter varje mål, så att ett avbrutet bygge inte gör om det som redan är klart
+            with open(self.state_path + ".tmp", "w") as f:
+                json.dump(self.state, f, indent=1, sort_keys=True)
+            os.replace(self.state_path + ".tmp", self.state_path)
+        self.digests.save()
+
+    # --- mål ---------------------------------------------------------------------------
+
+    def server_logs(self, server_name):
+        server_dir = Path(self.args.results) / server_name
+        return [path for url in range(50) if (server_dir / str(url)).is_dir()
+                for path in (server_dir / str(url)).iterdir() if path.suffix in (".log", ".logz")]
+
+    def captures(self, server):
+        return [pcap for url_id in range(1, 51)
+                for _, _, pcap, _ in pcap_to_log_parser.capture_paths(server, url_id, self.args.results, self.args.format)]
+
+    def convert_target(self, server):
+        args = self.args
+
+        def inputs():
+            # --flow läggs bara till när den används, så att tidigare byggen inte blir inaktuella
+            options = [args.format, args.decoder, args.max_packets, args.max_seconds] + ([args.flow] if args.flow != "all" else [])
+            return [self.digests.files(self.captures(server), server), self.scripts(CONVERT_SCRIPTS), options]
+
+        def build():
+            tasks = []
+            for url_id in range(1, 51):
+                for _, _, pcap_path, log_path in pcap_to_log_parser.capture_paths(server, url_id, args.results, args.format):
+                    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+                    tasks.append((log_path, self.pool.apply_async(pcap_to_log_parser.parse_pcap,
+                                                                  args=(str(pcap_path), log_path, False, args.decoder, args.max_packets, args.max_seconds, args.flow))))
+            for log_path, task in tasks:
+                parse_ledger.record(args.results, log_path, task.get())
+            import trace_manifest
+            with self.lock:
+                trace_manifest.write_manifest(args.results, trace_manifest.capture_rows(args.results, server, args.format))
+
+        def output():
+            logs = self.server_logs(server.name)
+            if not logs:
+                return None
+            # Ledgerns status avgör vilka loggar statistiken räknar med, så den hör till utdatan
+            statuses = sorted((key, entry["status"]) for key, entry in parse_ledger.load(args.results).items()
+                              if key.startswith(f"{server.name}/"))
+            return combine([self.digests.files(logs, args.results), statuses])
+
+        return Target(f"convert/{server.name}", [], inputs, build, output)
+
+    def metrics_target(self, server):
+        path = os.path.join(self.build_dir, "metrics", f"{server.name}.json")
+
+        def build():
+            metrics = self.pool.apply(self.stats.server_metrics, (Path(self.args.results) / server.name,))
+            with open(path, "w") as f:
+                json.dump(metrics, f)
+
+        return Target(f"metrics/{server.name}", [f"convert/{server.name}"],
+                      lambda: self.scripts(METRICS_SCRIPTS), build, lambda: self.output_file(path))
+
+    def attacks_target(self, server):
+        path = os.path.join(self.build_dir, "attacks", f"{server.name}.json")
+
+        def build():
+            log_dir = Path(self.args.results) / server.name
+            with open(path, "w") as f:
+                json.dump([self.stats.run_attack("df", log_dir), self.stats.run_attack("rf", log_dir)], f)
+
+        # df.py och rf.py ligger i arbetskatalogen, som när all-stats.py kör dem
+        return Target(f"attacks/{server.name}", [f"convert/{server.name}"],
+                      lambda: [self.digests.file("df.py"), self.digests.file("rf.py"), self.stats.ATTACKS],
+                      build, lambda: self.output_file(path))
+
+    def summary_target(self, servers):
+        deps = [f"metrics/{server.name}" for server in servers]
+        if not self.args.no_attacks:
+            deps += [f"attacks/{server.name}" for server in servers]
+
+        def build():
+            results = {}
+            for server in servers:
+                with open(os.path.join(self.build_dir, "metrics", f"{server.name}.json")) as f:
+                    metrics = json.load(f)
+                accuracies = (0, 0)
+                if not self.args.no_attacks:
+                    with open(os.path.join(self.build_dir, "attacks", f"{server.name}.json")) as f:
+                        accuracies = json.load(f)
+                results[Path(self.args.results) / server.name] = self.stats.server_result(metrics, *accuracies)
+            self.stats.print_and_save_results(results, self.args.output_file)
+
+        return Target("summary", deps, lambda: [self.scripts(["all-stats.py"]), self.args.no_attacks],
+                      build, lambda: self.output_file(self.args.output_file))
+
+    def figures_target(self):
+        name = os.path.join(self.args.figures, Path(self.args.output_file).stem)
+
+        def build():
+            os.makedirs(self.args.figures, exist_ok=True)
+            # Plot-skriptet har en egen cache och ritar bara om figurer vars indata ändrats
+            subprocess.run([sys.executable, PLOT_SCRIPT, self.args.output_file, name, "split"], check=True)
+
+        def output():
+            figures = [str(path) for path in Path(self.args.figures).glob(f"{Path(name).name} *.png")] if os.path.isdir(self.args.figures) else []
+            return self.digests.files(figures, self.args.figures) if figures else None
+
+        return Target("figures", ["summary"], lambda: [self.digests.file(script) for script in PLOT_SCRIPTS], build, output)
+
+    def output_file(self, path):
+        return self.digests.file(path) if os.path.exists(path) else None
+
+    # --- körning -----------------------------------------------------------------------
+
+    def graph(self, servers):
+        targets = []
+        for server in servers:
+            targets.append(self.convert_target(server))
+            targets.append(self.metrics_target(server))
+            if not self.args.no_attacks:
+                targets.append(self.attacks_target(server))
+        targets.append(self.summary_target(servers))
+        if self.args.figures:
+            targets.append(self.figures_target())
+        return targets
+
+    def run(self, targets):
+        """Build the stale targets, independent ones in parallel. Returns (built, up to date, failed) names."""
+        remaining = {target.name: target for target in targets}
+        built, fresh, failed = [], [], []
+        running = {}
+
+        with ThreadPoolExecutor(self.args.jobs) as executor:
+            while remaining or running:
+                for name, target in list(remaining.items()):
+                    if any(dep in failed for dep in target.deps):
+                        print(f"{name:<40} skipped, a dependency failed")
+                        failed.append(name)
+                        del remaining[name]
+                    elif all(dep in self.outputs for dep in target.deps):
+                        del remaining[name]
+                        running[executor.submit(self.step, target)] = target
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    target = running.pop(future)
+                    try:
+                        (built if future.result() else fresh).append(target.name)
+                    except Exception as e:
+                        print(f"{target.name:<40} FAILED: {e}")
+                        failed.append(target.name)
+        return built, fresh, failed
+
+    def step(self, target):
+        """Build one target if it is stale; True if it was built."""
+        key = self.key(target)
+        if self.is_fresh(target, key):
+            return False
+        if self.args.dry_run:
+            print(f"{target.name:<40} stale")
+            # Torrkörning: antar att utdatan ändras, så att allt som beror på målet också visas
+            self.outputs[target.name] = "stale"
+            return True
+        start = time.monotonic()
+        target.build()
+        self.finish(target, key)
+        print(f"{target.name:<40} built in {time.monotonic() - start:.1f} s")
+        return True
+
+
+def main(args):
+    if not pcap_to_log_parser.check_dataset_structure(Path(args.dir)):
+        print("Input directory file structure not valid\n")
+        return 1
+    if not args.output_file.lower().endswith(".csv"):
+        args.output_file += ".csv"
+    os.makedirs(args.results, exist_ok=True)
+    servers = sorted(server for server in Path(args.dir).iterdir() if server.is_dir())
+
+    builder = Builder(args)
+    targets = builder.graph(servers)
+    start = time.monotonic()
+    with multiprocessing.Pool(args.workers) as pool:
+        builder.pool = pool
+        built, fresh, failed = builder.run(targets)
+    builder.digests.save()
+    if not args.dry_run and built:
+        pcap_to_log_parser.write_run_metadata(args)
+
+    print(f"\n{len(built)} targets {'stale' if args.dry_run else 'built'}, {len(fresh)} up to date, {len(failed)} failed"
+          f" ({time.monotonic() - start:.1f} s)\n")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert, compute statistics, run the WF attacks and plot, rebuilding only what changed since the last run.")
+    parser.add_argument("--dir", required=True, help="root folder with the captures")
+    parser.add_argument("--results", required=True, help="results folder (build state in <results>/.build)")
+    parser.add_argument("output_file", type=str, help="Path to output CSV file")
+    parser.add_argument("--figures", default=None, help="also plot the summary into this folder")
+    parser.add_argument("--jobs", default=4, type=int, help="targets built at the same time")
+    parser.add_argument("--workers", default=None, type=int, help="processes for conversion and statistics (default: all cores)")
+    parser.add_argument("--no-attacks", action="store_true", help="skip DF/RF, accuracies are reported as 0")
+    parser.add_argument("--dry-run", action="store_true", help="only list the targets that would be rebuilt")
+    parser.add_argument("--format", default="log", choices=["log", "logz"], help="trace format: text (log) or compressed (logz)")
+    parser.add_argument("--decoder", default="fast", choices=["fast", "scapy"], help="pcap decoder: native reader (fast) or scapy")
+    parser.add_argument("--max-packets", default=None, type=int, help="stop reading a capture after this many IP packets")
+    parser.add_argument("--max-seconds", default=None, type=float, help="stop reading a capture this many seconds after its first packet")
+    parser.add_argument("--flow", default="all", choices=["all", "dominant"], help="keep all IP packets, or only the tunnel flow of each capture (see pcap_to_log_parser.py)")
+
+    args = parser.parse_args()
+    if args.flow != "all" and args.decoder != "fast":
+        parser.error("--flow dominant needs the fast decoder")
+    sys.exit(main(args))
@@ -0,0 +1,117 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Tunga beroenden som bara får importeras i kodvägarna som faktiskt behöver dem
+HEAVY_MODULES = ["scapy", "pandas", "matplotlib", "seaborn"]
+
+# Statistikskripten läser loggarna med numpy (~100 ms att importera)
+NUMPY_BUDGET = 150
+
+# (skript, argument, startbudget i ms utöver en tom python-process)
+ENTRY_POINTS = [
+    ("pcap_to_log_parser.py", ["--help"], 150),
+    ("pcap_reader.py", ["--help"], 150 + NUMPY_BUDGET),
+    ("all-stats.py", ["--help"], 150 + NUMPY_BUDGET),
+    ("statistics_server_average.py", ["--help"], 150 + NUMPY_BUDGET),
+    ("statistics_total_average.py", ["--help"], 150 + NUMPY_BUDGET),
+    ("synthetic_dataset.py", ["--help"], 150 + NUMPY_BUDGET),
+    ("sharded_convert.py", ["--help"], 150),
+    ("watch_convert.py", ["--help"], 150),
+    ("pipeline.py", ["--help"], 150),
+    ("build.py", ["--help"], 150),
+    ("memory_profile.py", ["--help"], 150),
+    ("results_catalog.py", ["--help"], 150),
+    ("trace_features.py", ["--help"], 150 + NUMPY_BUDGET),
+    ("trace_tensors.py", ["--help"], 150 + NUMPY_BUDGET),
+    ("approx_stats.py", ["--help"], 150 + NUMPY_BUDGET),
+    ("daita_simulator.py", ["--help"], 150 + NUMPY_BUDGET),
+    ("trace_manifest.py", ["--help"], 150 + NUMPY_BUDGET),
+    ("ingest_logs.py", ["--help"], 150 + NUMPY_BUDGET),
+    ("Plot skript/plot_DAITA_on_off.py", [], 150),
+    ("Plot skript/plot_DAITA_compare.py", [], 150),
+    ("Plot skript/plot_batch.py", ["--help"], 150),
+]
+
+# Skriver ut vilka tunga moduler som blivit importerade när skriptet körts klart
+PROBE = """
+import runpy, sys
+sys.argv = sys.argv[1:]
+sys.path.insert(0, __import__('os').path.dirname(sys.argv[0]))
+try:
+    runpy.run_path(sys.argv[0], run_name='__main__')
+except SystemExit:
+    pass
+heavy = sorted({name.split('.')[0] for name in sys.modules} & set(%r))
+print('\\nHEAVY:' + ','.join(heavy))
+"""
+
+def time_command(cmd, runs):
+    """Median wall time in ms of running cmd."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+def heavy_imports(script, args):
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE % HEAVY_MODULES, script] + args,
+        cwd=REPO_DIR, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith("HEAVY:"):
+            return [name for name in line[len("HEAVY:"):].split(",") if name]
+    return ["<probe failed>"]
+
+def slowest_imports(script, args, count=5):
+    """Top cumulative import times (us) from python -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", script] + args,
+        cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2][1:]))
+    top_level = [row for row in rows if not row[1].startswith(" ")]
+    return sorted(top_level, reverse=True)[:count]
+
+def main(args):
+    baseline = time_command([sys.executable, "-c", "pass"], args.runs)
+    print(f"Empty interpreter startup: {baseline:.0f} ms\n")
+    print(f"{'Entry point':<40} | {'Startup (ms)':<13} | {'Budget (ms)':<12} | {'Heavy imports':<20}")
+    print("-" * 96)
+
+    failures = 0
+    for script, script_args, budget in ENTRY_POINTS:
+        elapsed = time_command([sys.executable, script] + script_args, args.runs) - baseline
+        heavy = heavy_imports(script, script_args)
+        over_budget = elapsed > budget * args.budget_scale
+        status = "FAIL" if over_budget or heavy else "ok"
+        print(f"{script:<40} | {elapsed:<13.0f} | {budget * args.budget_scale:<12.0f} | {','.join(heavy) or '-':<20} {status}")
+
+        if status == "FAIL":
+            failures += 1
+            for cumulative, module in slowest_imports(script, script_args):
+                print(f"    {cumulative / 1000:8.1f} ms  {module}")
+
+    if failures:
+        print(f"\n{failures} entry point(s) over their startup budget or importing heavy modules\n")
+        return 1
+    print("\nAll entry points within their startup budget\n")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check startup time and heavy imports of the pipeline entry points.")
+    parser.add_argument("--runs", default=5, type=int, help="runs per entry point, the median is used")
+    parser.add_argument("--budget-scale", default=1.0, type=float, help="multiply all budgets, e.g. for slow machines")
+
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,496 @@
+import argparse
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+from pathlib import Path
+import numpy as np
+import parse_ledger
+import trace_io
+import trace_manifest
+
+# Simulerat försvar: odefenderade traces (-ND) spelas upp genom tillståndsmaskiner i Maybenot-stil
+# (som DAITA bygger på) och sparas som <server>-DT i samma format, så att all-stats.py och attackerna
+# kan köras direkt på resultatet. Maskinerna körs på klientsidan (skickar/blockerar paket med riktning s)
+# eller på relän (riktning r). Uppspelningen tar inte hänsyn till kausalitet: blockerade paket skjuts
+# bara upp, och latens mellan klient och relä modelleras inte (relän ser paketen samtidigt som klienten).
+SIMULATION_METADATA = "simulation.json"
+
+# Händelser en maskin kan reagera på, sett från maskinens egen sida (sent = paket som sidan skickar)
+EVENTS = ["normal_sent", "normal_recv", "padding_sent", "padding_recv", "blocking_begin", "blocking_end", "limit_reached"]
+
+# Fördelningar för tider (ms) och gränser, i konfigurationen t.ex. {"uniform": [0.1, 0.5]}
+DISTRIBUTIONS = {
+    "fixed": lambda rng, value: value,
+    "uniform": lambda rng, low, high: rng.uniform(low, high),
+    "exponential": lambda rng, mean: rng.expovariate(1 / mean),
+    "normal": lambda rng, mean, std: max(0.0, rng.gauss(mean, std)),
+    "lognormal": lambda rng, mu, sigma: rng.lognormvariate(mu, sigma),
+}
+
+# Standardmaskinerna liknar DAITA så som den syns i -DT-mätningarna: skurar om 20 paddingpaket med
+# 0.3 ms mellanrum (~1.5 paddingpaket per riktigt paket, mest från klienten) och alla paket utfyllda till en fast storlek
+DEFAULT_CONFIG = {
+    "name": "default",
+    "padding_size": {"sent": 1340, "received": 1440},
+    "pad_normal": True,
+    "tail_ms": 0,
+    "machines": [
+        {
+            "name": "client bursts", "side": "client", "start": "wait",
+            "allowed_padding_packets": 100, "max_padding_frac": 0.75,
+            "states": {
+                "wait": {"next": {"normal_sent": [["burst", 0.045]], "normal_recv": [["burst", 0.045]]}},
+                "burst": {"action": {"type": "padding", "delay": {"fixed": 0.3}}, "limit": {"fixed": 20},
+                          "next": {"padding_sent": [["burst", 1.0]], "limit_reached": [["wait", 1.0]]}},
+            },
+        },
+        {
+            "name": "relay bursts", "side": "relay", "start": "wait",
+            "allowed_padding_packets": 100, "max_padding_frac": 0.75,
+            "states": {
+                "wait": {"next": {"normal_sent": [["burst", 0.03]], "normal_recv": [["burst", 0.03]]}},
+                "burst": {"action": {"type": "padding", "delay": {"fixed": 0.3}}, "limit": {"fixed": 20},
+                          "next": {"padding_sent": [["burst", 1.0]], "limit_reached": [["wait", 1.0]]}},
+            },
+        },
+    ],
+}
+
+# Åtgärder som en maskin får utföra vid samma tidpunkt innan uppspelningen ges upp (en slinga utan fördröjning)
+MAX_ACTIONS_AT_ONCE = 10000
+
+# Typer av köposter i uppspelningen
+_RELEASE, _TIMER, _UNBLOCK = 0, 1, 2
+# Händelsenamn för ett paket i maskinens egen utgående riktning respektive den andra
+_NORMAL = ("normal_sent", "normal_recv")
+_PADDING = ("padding_sent", "padding_recv")
+
+
+def sample(distribution, rng):
+    """Draw one value from a distribution given as {"name": parameters}."""
+    (name, parameters), = distribution.items()
+    return DISTRIBUTIONS[name](rng, *(parameters if isinstance(parameters, list) else [parameters]))
+
+
+def always_zero(distribution):
+    """True if a time distribution can only give 0 (e.g. {"fixed": 0} or {"uniform": [0, 0]})."""
+    (name, parameters), = distribution.items()
+    parameters = parameters if isinstance(parameters, list) else [parameters]
+    return (name == "fixed" and parameters[0] <= 0) or (name == "uniform" and max(parameters) <= 0)
+
+
+def instant_loop(machine):
+    """A cycle of states whose actions retrigger each other without time passing and without end, or None.
+
+    A padding action triggers padding_sent (unless the padding budget is finite), a block action
+    blocking_begin (and blocking_end for a zero duration). Only states without a limit and with a
+    delay that is always zero can take part.
+    """
+    states = machine["states"]
+    unbounded_padding = machine.get("max_padding_frac", 1.0) >= 1
+
+    def triggered(state):
+        action = state.get("action")
+        if action is None or "limit" in state or not always_zero(action.get("delay", {"fixed": 0})):
+            return []
+        if action["type"] == "padding":
+            events = ["padding_sent"] if unbounded_padding else []
+        else:
+            events = ["blocking_begin"] + (["blocking_end"] if always_zero(action["duration"]) else [])
+        return [target for event in events for target, probability in state.get("next", {}).get(event, [])
+                if target != "end" and probability > 0]
+
+    def visit(name, path):
+        if name in path:
+            return path[path.index(name):] + [name]
+        for target in triggered(states[name]):
+            loop = visit(target, path + [name])
+            if loop:
+                return loop
+        return None
+
+    for name in states:
+        loop = visit(name, [])
+        if loop:
+            return loop
+    return None
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def check_config(config):
+    """Raise ValueError describing the first problem in a simulator configuration."""
+    def check_distribution(distribution, where):
+        if not isinstance(distribution, dict) or len(distribution) != 1 or next(iter(distribution)) not in DISTRIBUTIONS:
+            raise ValueError(f"{where}: expected one of {', '.join(DISTRIBUTIONS)}, e.g. {{\"fixed\": 0.3}}")
+        (name, parameters), = distribution.items()
+        parameters = parameters if isinstance(parameters, list) else [parameters]
+        expected = DISTRIBUTIONS[name].__code__.co_argcount - 1
+        if len(parameters) != expected or not all(is_number(parameter) for parameter in parameters):
+            raise ValueError(f"{where}: {name} takes {expected} number(s), got {distribution[name]!r}")
+        if name == "exponential" and parameters[0] <= 0:
+            raise ValueError(f"{where}: the exponential mean must be positive")
+
+    if not isinstance(config, dict):
+        raise ValueError("the configuration must be a JSON object")
+    padding_size = config.get("padding_size")
+    for direction in ("sent", "received"):
+        if not isinstance(padding_size, dict) or not is_number(padding_size.get(direction)):
+            raise ValueError(f"padding_size needs a '{direction}' size")
+    if not config.get("machines") or not isinstance(config["machines"], list):
+        raise ValueError("no machines")
+    for machine in config["machines"]:
+        if not isinstance(machine, dict) or not isinstance(machine.get("states", {}), dict):
+            raise ValueError(f"machines must be objects with a states object, got {machine!r}")
+        name = machine.get("name", "machine")
+        states = machine.get("states", {})
+        for key in ("allowed_padding_packets", "max_padding_frac"):
+            if key in machine and not is_number(machine[key]):
+                raise ValueError(f"{name}: {key} must be a number")
+        if machine.get("side", "client") not in ("client", "relay"):
+            raise ValueError(f"{name}: side must be client or relay")
+        if machine.get("start") not in states:
+            raise ValueError(f"{name}: start state '{machine.get('start')}' is not defined")
+        for state_name, state in states.items():
+            where = f"{name}/{state_name}"
+            if not isinstance(state, dict):
+                raise ValueError(f"{where}: a state must be an object")
+            action = state.get("action")
+            if action is not None:
+                if not isinstance(action, dict) or action.get("type") not in ("padding", "block"):
+                    raise ValueError(f"{where}: action type must be padding or block")
+                check_distribution(action.get("delay", {"fixed": 0}), f"{where} delay")
+                if action["type"] == "block":
+                    check_distribution(action.get("duration"), f"{where} duration")
+            if "limit" in state:
+                check_distribution(state["limit"], f"{where} limit")
+            if not isinstance(state.get("next", {}), dict):
+                raise ValueError(f"{where}: next must map events to lists of [state, probability]")
+            for event, choices in state.get("next", {}).items():
+                if event not in EVENTS:
+                    raise ValueError(f"{where}: unknown event '{event}', expected one of {', '.join(EVENTS)}")
+                if not isinstance(choices, list) or not all(isinstance(choice, list) and len(choice) == 2 and isinstance(choice[0], str)
+                                                            and is_number(choice[1]) and choice[1] >= 0 for choice in choices):
+                    raise ValueError(f"{where}: transitions after {event} must be [state, probability] pairs, got {choices!r}")
+                for target, probability in choices:
+                    if target != "end" and target not in states:
+                        raise ValueError(f"{where}: unknown state '{target}' after {event}")
+                if sum(probability for _, probability in choices) > 1 + 1e-9:
+                    raise ValueError(f"{where}: probabilities after {event} sum to more than 1")
+        loop = instant_loop(machine)
+        if loop:
+            raise ValueError(f"{name}: states {' -> '.join(loop)} repeat without delay, limit or padding budget "
+                             "and would never let time pass; add a limit, a non-zero delay or max_padding_frac < 1")
+
+
+class Machine:
+    """Runtime state of one machine: current state, pending action, remaining limit and padding sent."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.states = spec["states"]
+        self.next = {name: state.get("next", {}) for name, state in self.states.items()}
+        # Maskinens utgående riktning som den syns i klientens trace (True = s)
+        self.outgoing = spec.get("side", "client") == "client"
+        self.allowed = spec.get("allowed_padding_packets", 0)
+        self.max_frac = spec.get("max_padding_frac", 1.0)
+        self.state = None
+        self.generation = 0
+        self.remaining = None
+        self.padding = 0
+
+
+class Replay:
+    """Event-driven replay of one undefended trace through the machines of a configuration."""
+
+    def __init__(self, config, rng):
+        self.rng = rng
+        self.machines = [Machine(spec) for spec in config["machines"]]
+        self.tail = config.get("tail_ms", 0) * 1e6
+        self.queue = []
+        self.counter = itertools.count()
+        self.blocked_until = {True: -1.0, False: -1.0}
+        self.queued = 0         # Blockerade riktiga paket som väntar
+        self.normal = 0
+        self.last_normal = 0.0
+        self.times, self.sent, self.sizes, self.padding = [], [], [], []
+
+    def push(self, time, kind, data):
+        heapq.heappush(self.queue, (time, next(self.counter), kind, data))
+
+    def enter(self, machine, state, now):
+        """Move a machine to a state; its pending action is replaced by the new state's action."""
+        machine.generation += 1
+        if state == "end":
+            machine.state = None
+            return
+        spec = machine.states[state]
+        if state != machine.state:
+            # Gränsen gäller per besök i tillståndet, en övergång till samma tillstånd behåller den
+            machine.remaining = round(sample(spec["limit"], self.rng)) if "limit" in spec else None
+        machine.state = state
+        action = spec.get("action")
+        if action is not None and (machine.remaining is None or machine.remaining > 0):
+            delay = sample(action.get("delay", {"fixed": 0}), self.rng) * 1e6
+            self.push(now + delay, _TIMER, (machine, machine.generation))
+
+    def dispatch(self, machine, event, now):
+        if machine.state is None:
+            return
+        choices = machine.next[machine.state].get(event)
+        if not choices:
+            return
+        draw = self.rng.random()
+        for target, probability in choices:
+            draw -= probability
+            if draw < 0:
+                self.enter(machine, target, now)
+                return
+
+    def packet_event(self, names, outgoing, now):
+        """Tell every machine about a packet (names _NORMAL or _PADDING) in direction outgoing."""
+        for machine in self.machines:
+            self.dispatch(machine, names[machine.outgoing != outgoing], now)
+
+    def emit(self, time, outgoing, size, is_padding):
+        self.times.append(time)
+        self.sent.append(outgoing)
+        self.sizes.append(size)
+        self.padding.append(is_padding)
+
+    def normal_packet(self, time, outgoing, size):
+        if time < self.blocked_until[outgoing]:
+            self.queued += 1
+            self.push(self.blocked_until[outgoing], _RELEASE, (outgoing, size))
+            return
+        self.emit(time, outgoing, size, False)
+        self.normal += 1
+        self.last_normal = time
+        self.packet_event(_NORMAL, outgoing, time)
+
+    def fire(self, machine, now):
+        state = machine.state
+        action = machine.states[state]["action"]
+        # Gränsen räknas innan händelserna skickas, så att en övergång till samma tillstånd inte schemalägger en åtgärd för mycket
+        if machine.remaining is not None:
+            machine.remaining -= 1
+        if action["type"] == "padding":
+            # Samma budget som i Maybenot: fritt upp till allowed_padding_packets, sedan högst max_padding_frac av alla paket
+            if machine.padding < self.allowed_padding(machine):
+                machine.padding += 1
+                self.emit(now, machine.outgoing, None, True)
+                self.packet_event(_PADDING, machine.outgoing, now)
+        else:
+            until = now + sample(action["duration"], self.rng) * 1e6
+            if until > self.blocked_until[machine.outgoing]:
+                self.blocked_until[machine.outgoing] = until
+                self.push(until, _UNBLOCK, machine.outgoing)
+            for other in self.machines:
+                self.dispatch(other, "blocking_begin", now)
+
+        if machine.remaining is not None and machine.remaining <= 0 and machine.state == state:
+            self.dispatch(machine, "limit_reached", now)
+
+    def allowed_padding(self, machine):
+        if machine.padding < machine.allowed:
+            return machine.allowed
+        # padding / (normal + padding) < max_frac  <=>  padding < max_frac * normal / (1 - max_frac)
+        if machine.max_frac >= 1:
+            return float("inf")
+        return machine.max_frac * self.normal / (1 - machine.max_frac)
+
+    def run(self, times, sent, sizes):
+        """Replay the normal packets in time order, interleaved with the machines' actions."""
+        times, sent, sizes = times.tolist(), sent.tolist(), sizes.tolist()
+        n = len(times)
+        if n == 0:
+            return
+        for machine in self.machines:
+            self.enter(machine, machine.spec["start"], times[0])
+
+        i = 0
+        instant, actions = None, 0
+        while True:
+            if self.queue and (i >= n or self.queue[0][0] <= times[i]):
+                time, _, kind, data = self.queue[0]
+                # Efter sista riktiga paketet körs maskinerna bara tail_ms till, sedan slutar inspelningen
+                if i >= n and self.queued == 0 and time > self.last_normal + self.tail:
+                    break
+                heapq.heappop(self.queue)
+                if kind == _RELEASE:
+                    self.queued -= 1
+                    self.normal_packet(time, *data)
+                elif kind == _TIMER:
+                    machine, generation = data
+                    if generation == machine.generation and machine.state is not None:
+                        # Skydd mot slingor mellan maskiner som check_config inte ser
+                        actions = actions + 1 if time == instant else 1
+                        instant = time
+                        if actions > MAX_ACTIONS_AT_ONCE:
+                            raise ValueError(f"more than {MAX_ACTIONS_AT_ONCE} actions at {time / 1e9:.6f} s without time passing "
+                                             f"(machine '{machine.spec.get('name', 'machine')}', state '{machine.state}')")
+                        self.fire(machine, time)
+                elif time >= self.blocked_until[data]:
+                    for machine in self.machines:
+                        self.dispatch(machine, "blocking_end", time)
+            elif i < n:
+                self.normal_packet(times[i], sent[i], sizes[i])
+                i += 1
+            else:
+                break
+
+
+def simulate_trace(times, sent, sizes, config, rng):
+    """Defended version of one trace, returns (times, sent, sizes, is_padding) arrays with times in ns from 0."""
+    replay = Replay(config, rng)
+    replay.run(times, sent, sizes)
+
+    out_sent = np.array(replay.sent, dtype=bool)
+    is_padding = np.array(replay.padding, dtype=bool)
+    padding_size = np.where(out_sent, config["padding_size"]["sent"], config["padding_size"]["received"])
+    out_sizes = np.array([0 if size is None else size for size in replay.sizes], dtype=np.int64)
+    if config.get("pad_normal", True):
+        out_sizes = np.maximum(out_sizes, padding_size)
+    out_sizes[is_padding] = padding_size[is_padding]
+
+    # Mikrosekundsupplösning som i pcap-filerna, första paketet vid tid 0
+    out_times = (np.array(replay.times, dtype=np.float64) // 1000).astype(np.int64) * 1000
+    if out_times.size:
+        out_times -= out_times[0]
+    return out_times, out_sent, out_sizes, is_padding
+
+
+def defended_name(server_name):
+    """Name of the simulated server folder: se-got-wg-001-ND -> se-got-wg-001-DT."""
+    return (server_name[:-3] if server_name.endswith("-ND") else server_name) + "-DT"
+
+
+def simulate_url(task):
+    """Simulate every valid trace of results/<server>/<url>; returns totals and manifest rows."""
+    input_dir, output_dir, server, url, config, seed, log_format = task
+    url_folder = Path(input_dir) / server / str(url)
+    out_folder = Path(output_dir) / defended_name(server) / str(url)
+    os.makedirs(out_folder, exist_ok=True)
+
+    totals = np.zeros(6)     # riktiga paket/byte, simulerade paket/byte, tid före/efter
+    rows = []
+    log_files, _ = parse_ledger.valid_trace_files(url_folder)
+    for log_file in log_files:
+        index = int(log_file.name.split(".")[0])
+        times, sent, sizes = trace_io.read_trace(log_file)
+        # Samma trace och seed ger alltid samma försvarade trace, oberoende av processer och ordning
+        rng = random.Random(f"{seed}/{server}/{url}/{index}")
+        out_times, out_sent, out_sizes, _ = simulate_trace(times, sent, sizes, config, rng)
+
+        out_file = out_folder / f"{index}.{log_format}"
+        trace_io.write_trace(out_file, out_times, out_sent, out_sizes,
+                             metadata={"simulated_from": parse_ledger.log_key(input_dir, log_file), "config": config.get("name", ""), "seed": seed})
+        totals += [times.size, sizes.sum(), out_times.size, out_sizes.sum(),
+                   times[-1] if times.size else 0, out_times[-1] if out_times.size else 0]
+
+        sample_id, device_id = trace_manifest.trace_identity(input_dir, log_file)
+        rows.append({"log": parse_ledger.log_key(output_dir, out_file), "server": defended_name(server), "url": url,
+                     "sample": sample_id, "device": device_id, "pcap": ""})
+    return server, totals, rows
+
+
+def copy_undefended(input_dir, output_dir, server):
+    """Copy the valid traces of an -ND server next to the simulated one, so all-stats.py compares them."""
+    rows = []
+    for url in range(trace_io.NUM_URLS):
+        url_folder = Path(input_dir) / server / str(url)
+        if not url_folder.is_dir():
+            continue
+        out_folder = Path(output_dir) / server / str(url)
+        os.makedirs(out_folder, exist_ok=True)
+        log_files, _ = parse_ledger.valid_trace_files(url_folder)
+        for log_file in log_files:
+            shutil.copy2(log_file, out_folder / log_file.name)
+            sample_id, device_id = trace_manifest.trace_identity(input_dir, log_file)
+            rows.append({"log": parse_ledger.log_key(output_dir, out_folder / log_file.name), "server": server, "url": url,
+                         "sample": sample_id, "device": device_id, "pcap": ""})
+    return rows
+
+
+def load_config(path):
+    if path is None:
+        return DEFAULT_CONFIG
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(args):
+    try:
+        config = load_config(args.config)
+        check_config(config)
+    except (OSError, ValueError) as e:
+        print(f"Error: invalid simulator configuration: {e}\n")
+        return 1
+
+    if args.print_config:
+        print(json.dumps(config, indent=2))
+        return 0
+
+    servers = [server.name for server in trace_io.list_servers(args.input_dir) if server.name.endswith("-ND")]
+    if args.server:
+        servers = [server for server in servers if server in args.server]
+    if not servers:
+        print(f"Error: no undefended (-ND) server folders in {args.input_dir}\n")
+        return 1
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, SIMULATION_METADATA), "w") as f:
+        json.dump({"input": os.path.abspath(args.input_dir), "seed": args.seed, "format": args.format, "config": config}, f, indent=2)
+
+    tasks = [(args.input_dir, args.output_dir, server, url, config, args.seed, args.format)
+             for server in servers for url in range(trace_io.NUM_URLS) if (Path(args.input_dir) / server / str(url)).is_dir()]
+    totals = {server: np.zeros(6) for server in servers}
+    rows = []
+    with multiprocessing.Pool(args.workers) as pool:
+        try:
+            for i, (server, url_totals, url_rows) in enumerate(pool.imap_unordered(simulate_url, tasks), start=1):
+                totals[server] += url_totals
+                rows += url_rows
+                sys.stdout.write(f"\rProgress: {i}/{len(tasks)} ({i / len(tasks) * 100:.1f}%)")
+                sys.stdout.flush()
+        except ValueError as e:
+            print(f"\nError: the simulation stopped: {e}\n")
+            return 1
+    print()
+
+    if args.copy_undefended:
+        for server in servers:
+            rows += copy_undefended(args.input_dir, args.output_dir, server)
+    trace_manifest.write_manifest(args.output_dir, rows)
+
+    print(f"\n{'Server name':<35} | {'Packet overhead':<16} | {'Byte overhead':<14} | {'Duration overhead':<17}")
+    print("-" * 90)
+    for server in servers:
+        packets, size, out_packets, out_size, duration, out_duration = totals[server]
+        overhead = [(new / old - 1) * 100 if old else 0 for new, old in ((out_packets, packets), (out_size, size), (out_duration, duration))]
+        cells = [f"{value:.1f}%" for value in overhead]
+        print(f"{defended_name(server):<35} | {cells[0]:<16} | {cells[1]:<14} | {cells[2]:<17}")
+    print(f"\nSimulated traces saved to: {args.output_dir}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay undefended (-ND) traces through DAITA-like padding/blocking state machines and write simulated -DT traces.")
+    parser.add_argument("input_dir", help="results folder with -ND server folders")
+    parser.add_argument("output_dir", help="results folder for the simulated <server>-DT folders")
+    parser.add_argument("--config", default=None, help="JSON file with the padding size and machines (default: built-in DAITA-like bursts, see --print-config)")
+    parser.add_argument("--print-config", action="store_true", help="print the configuration in use and exit (a starting point for --config)")
+    parser.add_argument("--server", action="append", default=None, help="only this -ND server folder (can be repeated)")
+    parser.add_argument("--seed", default=0, type=int, help="random seed of the machines")
+    parser.add_argument("--format", default="log", choices=["log", "logz"], help="trace format of the simulated traces")
+    parser.add_argument("--copy-undefended", action="store_true", help="also copy the -ND traces into the output folder, so all-stats.py shows both rows")
+    parser.add_argument("--workers", default=None, type=int, help="number of processes (default: all cores)")
+
+    sys.exit(main(parser.parse_args()))
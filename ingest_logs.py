@@ -0,0 +1,291 @@
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+from pathlib import Path
+import numpy as np
+import parse_ledger
+import trace_io
+import trace_manifest
+
+# Flyttar äldre resultatmappar (results/<server>/<url>/<n>.log) till det komprimerade formatet (.logz) med
+# ledger, manifest och en sammanfattning per trace. Arbetet delas upp i enheter (server, URL) som i
+# sharded_convert.py; en klar enhet får en markering i <output>/.ingest/done/ så att en avbruten körning
+# fortsätter där den slutade. Varje trace läses tillbaka efter skrivningen och jämförs med källan via en
+# kontrollsumma av (tider, riktningar, storlekar).
+# Lagringen är en .logz per trace och ingen samlad fil per server: det är det kompakta format som
+# trace_io, statistikskripten, attackerna och bygget läser, och en fil per trace gör enheterna oberoende
+# så att de kan skrivas parallellt och göras om var för sig. En minnesmappad matris per server för
+# träning skapas vid behov ur resultatet med trace_tensors.py.
+INGEST_DIR = ".ingest"
+SUMMARY_NAME = "trace_summary.csv"
+SUMMARY_COLUMNS = ["server", "url", "trace", "packets", "bytes", "sent_bytes", "received_bytes", "duration",
+                   "number_sent", "number_received", "status", "sha256"]
+
+
+def unit_name(server_name, url):
+    return f"{server_name}__{url}"
+
+
+def done_path(output_dir, server_name, url):
+    return os.path.join(output_dir, INGEST_DIR, "done", f"{unit_name(server_name, url)}.json")
+
+
+def trace_digest(times, sent, sizes):
+    """sha256 of a trace's arrays, the same for a .log and its .logz copy."""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(times, dtype="<i8").tobytes())
+    digest.update(np.ascontiguousarray(sent, dtype=np.uint8).tobytes())
+    digest.update(np.ascontiguousarray(sizes, dtype="<i8").tobytes())
+    return digest.hexdigest()
+
+
+def check_geometry(input_dir):
+    """Compare a legacy tree with the expected 50 URLs x 100 traces per server.
+
+    Returns {server name: (trace files found, missing keys, unexpected file names)}.
+    """
+    report = {}
+    for server in trace_io.list_servers(input_dir):
+        found = 0
+        missing = []
+        unexpected = []
+        for url in range(trace_io.NUM_URLS):
+            url_folder = server / str(url)
+            names = set(os.listdir(url_folder)) if url_folder.is_dir() else set()
+            expected = {f"{index}.log" for index in range(trace_io.TRACES_PER_URL)}
+            found += len(names & expected)
+            missing += [f"{server.name}/{url}/{name}" for name in sorted(expected - names, key=lambda name: int(name.split(".")[0]))]
+            unexpected += [f"{server.name}/{url}/{name}" for name in sorted(names - expected)]
+        extra_folders = [path.name for path in server.iterdir() if path.is_dir() and path.name not in {str(url) for url in range(trace_io.NUM_URLS)}]
+        unexpected += [f"{server.name}/{name}/" for name in sorted(extra_folders)]
+        report[server.name] = (found, missing, unexpected)
+    return report
+
+
+def source_state(log_files):
+    """(name, size, mtime) of the source files of a unit, to notice if they change between runs."""
+    states = []
+    for log_file in log_files:
+        stat = os.stat(log_file)
+        states.append([log_file.name, stat.st_size, stat.st_mtime_ns])
+    return states
+
+
+def unit_sources(input_dir, server_name, url):
+    url_folder = Path(input_dir) / server_name / str(url)
+    return [log_file for log_file in trace_io.trace_files(url_folder) if log_file.suffix == ".log"] if url_folder.is_dir() else []
+
+
+def ingest_unit(task):
+    """Convert, summarise and round-trip check the logs of one (server, url); returns the unit's record."""
+    input_dir, output_dir, server_name, url, compressor = task
+    log_files = unit_sources(input_dir, server_name, url)
+    legacy_ledger = parse_ledger.load(input_dir)
+    out_folder = Path(output_dir) / server_name / str(url)
+    os.makedirs(out_folder, exist_ok=True)
+
+    rows = []
+    ledger = []
+    failures = []
+    for log_file in log_files:
+        index = int(log_file.name.split(".")[0])
+        out_file = out_folder / f"{index}.logz"
+        with open(log_file, "rb") as f:
+            data = f.read()
+        error = None
+        try:
+            trace = trace_io.parse_trace(data)
+        except ValueError as e:
+            trace, error = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64)), e
+        times, sent, sizes = trace
+        digest = trace_digest(times, sent, sizes)
+
+        # Skrivs först i .ingest/partial (utanför URL-mappen, som trace_io listar) och flyttas dit när den är kontrollerad
+        partial = Path(output_dir) / INGEST_DIR / "partial" / f"{unit_name(server_name, url)}__{index}.logz"
+        trace_io.write_trace(partial, times, sent, sizes, compressor=compressor,
+                             metadata={"source": parse_ledger.log_key(input_dir, log_file), "sha256": digest})
+        with open(partial, "rb") as f:
+            copy = trace_io.load_trace(out_file, f.read())
+        if trace_digest(*copy) != digest:
+            failures.append(f"{server_name}/{url}/{log_file.name}: round trip checksum mismatch")
+            os.remove(partial)
+            continue
+        os.replace(partial, out_file)
+
+        # Loggar som den gamla ledgern uteslöt förblir uteslutna, annars avgörs statusen som vid konvertering
+        status = parse_ledger.parse_status(times.size, error)
+        legacy_key = parse_ledger.log_key(input_dir, log_file)
+        if legacy_ledger.get(legacy_key, {}).get("status", parse_ledger.OK) != parse_ledger.OK:
+            status = legacy_ledger[legacy_key]["status"]
+        sent_bytes = int(sizes[sent].sum())
+        received_bytes = int(sizes[~sent].sum())
+        number_sent = int(np.count_nonzero(sent))
+        rows.append({"server": server_name, "url": url, "trace": index, "packets": int(times.size),
+                     "bytes": sent_bytes + received_bytes, "sent_bytes": sent_bytes, "received_bytes": received_bytes,
+                     "duration": times[-1] / 1e9 if times.size else 0, "number_sent": number_sent,
+                     "number_received": int(times.size) - number_sent, "status": status, "sha256": digest})
+        sample_id, device_id = trace_manifest.trace_identity(input_dir, log_file)
+        ledger.append({"log": parse_ledger.log_key(output_dir, out_file), "pcap": legacy_key, "decoder": "ingest",
+                       "packets": int(times.size), "status": status,
+                       "error": f"{type(error).__name__}: {error}" if error is not None else None,
+                       "sample": sample_id, "device": device_id})
+
+    record = {"server": server_name, "url": url, "sources": source_state(log_files), "rows": rows, "ledger": ledger,
+              "source_bytes": sum(os.path.getsize(log_file) for log_file in log_files),
+              "stored_bytes": sum(os.path.getsize(out_folder / f"{row['trace']}.logz") for row in rows)}
+    if not failures:
+        # Markeringen skrivs sist, en enhet som avbryts eller misslyckas görs om nästa gång
+        path = done_path(output_dir, server_name, url)
+        with open(path + ".partial", "w") as f:
+            json.dump(record, f)
+        os.replace(path + ".partial", path)
+    return record, failures
+
+
+def load_done(output_dir, input_dir, server_name, url):
+    """The saved record of a finished unit, None if it must be (re)done because it is missing or its sources changed."""
+    try:
+        with open(done_path(output_dir, server_name, url)) as f:
+            record = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if record["sources"] != source_state(unit_sources(input_dir, server_name, url)):
+        return None
+    return record
+
+
+def verify_unit(task):
+    """Re-read every stored trace of a finished unit and compare it with the checksum in its record."""
+    output_dir, record = task
+    failures = []
+    for row in record["rows"]:
+        out_file = Path(output_dir) / row["server"] / str(row["url"]) / f"{row['trace']}.logz"
+        try:
+            digest = trace_digest(*trace_io.read_trace(out_file))
+        except Exception as e:
+            # En skadad fil kan ge fel från gzip/zlib/lzma eller numpy, alla räknas som misslyckad kontroll
+            failures.append(f"{out_file}: {type(e).__name__}: {e}")
+            continue
+        if digest != row["sha256"]:
+            failures.append(f"{out_file}: checksum mismatch")
+    if failures:
+        os.remove(done_path(output_dir, record["server"], record["url"]))
+    return failures
+
+
+def write_outputs(output_dir, records):
+    """Summary CSV, manifest and ledger entries of the finished units.
+
+    Ledger entries are only added where the ledger does not already agree, so units finished
+    by an interrupted run get theirs now and a repeated run adds nothing.
+    """
+    rows = [row for record in records for row in record["rows"]]
+    rows.sort(key=lambda row: (row["server"], row["url"], row["trace"]))
+    with open(os.path.join(output_dir, SUMMARY_NAME), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    manifest_rows = [{"log": entry["log"], "server": record["server"], "url": record["url"], "sample": entry["sample"],
+                      "device": entry["device"], "pcap": ""} for record in records for entry in record["ledger"]]
+    trace_manifest.write_manifest(output_dir, manifest_rows)
+
+    ledger = parse_ledger.load(output_dir)
+    for record in records:
+        for entry in record["ledger"]:
+            if ledger.get(entry["log"], {}).get("status") != entry["status"]:
+                parse_ledger.record(output_dir, os.path.join(output_dir, entry["log"]),
+                                    {key: entry[key] for key in ("pcap", "decoder", "packets", "status", "error")})
+
+
+def print_geometry(report):
+    print(f"\n{'Server name':<35} | {'Traces':<12} | {'Missing':<8} | {'Unexpected':<10}")
+    print("-" * 75)
+    for server_name, (found, missing, unexpected) in report.items():
+        print(f"{server_name:<35} | {f'{found}/{trace_io.NUM_URLS * trace_io.TRACES_PER_URL}':<12} | {len(missing):<8} | {len(unexpected):<10}")
+        for name in (missing + unexpected)[:5]:
+            print(f"{'':<35}   {name} {'missing' if name in missing else 'unexpected'}")
+        if len(missing) + len(unexpected) > 5:
+            print(f"{'':<35}   ... {len(missing) + len(unexpected) - 5} more")
+
+
+def main(args):
+    if os.path.abspath(args.input_dir) == os.path.abspath(args.output_dir):
+        print("Error: the output folder must differ from the legacy folder\n")
+        return 1
+    report = check_geometry(args.input_dir)
+    if not report:
+        print(f"Error: no server folders in {args.input_dir}\n")
+        return 1
+    print_geometry(report)
+    incomplete = any(missing or unexpected for _, missing, unexpected in report.values())
+    if incomplete and args.strict:
+        print("\nError: the tree does not have the expected geometry (run without --strict to ingest what exists)\n")
+        return 1
+
+    for folder in ("done", "partial"):
+        os.makedirs(os.path.join(args.output_dir, INGEST_DIR, folder), exist_ok=True)
+    units = [(server_name, url) for server_name in report for url in range(trace_io.NUM_URLS)]
+    records = {}
+    for server_name, url in units:
+        record = load_done(args.output_dir, args.input_dir, server_name, url)
+        if record is not None:
+            records[(server_name, url)] = record
+    tasks = [(args.input_dir, args.output_dir, server_name, url, args.compressor)
+             for server_name, url in units if (server_name, url) not in records]
+    print(f"\n{len(records)} of {len(units)} units already ingested, {len(tasks)} to do")
+
+    failures = []
+    with multiprocessing.Pool(args.workers) as pool:
+        for i, (record, unit_failures) in enumerate(pool.imap_unordered(ingest_unit, tasks), start=1):
+            failures += unit_failures
+            if not unit_failures:
+                records[(record["server"], record["url"])] = record
+            sys.stdout.write(f"\rProgress: {i}/{len(tasks)} ({i / len(tasks) * 100:.1f}%)")
+            sys.stdout.flush()
+        print()
+
+        if args.verify:
+            # Alla klara enheter, även från tidigare körningar, läses om och jämförs med sina kontrollsummor
+            verified = 0
+            for unit_failures in pool.imap_unordered(verify_unit, [(args.output_dir, record) for record in records.values()]):
+                failures += unit_failures
+                verified += 1
+            print(f"Verified {sum(len(record['rows']) for record in records.values())} traces in {verified} units")
+
+    ordered = [records[unit] for unit in units if unit in records]
+    write_outputs(args.output_dir, ordered)
+
+    print(f"\n{'Server name':<35} | {'Traces':<8} | {'Not ok':<7} | {'Log (MiB)':<10} | {'Logz (MiB)':<10}")
+    print("-" * 85)
+    for server_name in report:
+        server_records = [record for record in ordered if record["server"] == server_name]
+        rows = [row for record in server_records for row in record["rows"]]
+        not_ok = sum(row["status"] != parse_ledger.OK for row in rows)
+        source = sum(record["source_bytes"] for record in server_records) / 1024 ** 2
+        stored = sum(record["stored_bytes"] for record in server_records) / 1024 ** 2
+        print(f"{server_name:<35} | {len(rows):<8} | {not_ok:<7} | {source:<10.1f} | {stored:<10.1f}")
+
+    if failures:
+        print(f"\n{len(failures)} problem(s), the affected units are redone on the next run:")
+        for failure in failures[:20]:
+            print(f"  {failure}")
+        return 1
+    print(f"\nIngested into {args.output_dir} (summary in {SUMMARY_NAME})\n")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a legacy results/<server>/<url>/<n>.log tree into .logz traces with ledger, manifest and per-trace summaries (resumable).")
+    parser.add_argument("input_dir", help="legacy results folder, e.g. 'Exempel data/log_files_v3'")
+    parser.add_argument("output_dir", help="new results folder")
+    parser.add_argument("--compressor", default="gzip", choices=list(trace_io.COMPRESSORS), help="gzip reads fastest, xz gives smaller files")
+    parser.add_argument("--workers", default=None, type=int, help="number of processes (default: all cores)")
+    parser.add_argument("--strict", action="store_true", help="refuse to ingest a tree that does not have 50 URLs x 100 traces per server")
+    parser.add_argument("--verify", action="store_true", help="afterwards re-read every stored trace and compare it with its checksum")
+
+    sys.exit(main(parser.parse_args()))
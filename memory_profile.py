@@ -0,0 +1,292 @@
+import argparse
+import functools
+import json
+import os
+import resource
+import runpy
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Minnesprofilering, bara när den slagits på (python memory_profile.py run ...). Inställningen går
+# via en miljövariabel så att pool-processer och underprocesser också profilerar sina steg.
+# Varje process skriver results/<dir>/memory-<pid>.jsonl med:
+#   {"stage": ...}   ett avslutat steg: tid, RSS före/efter/topp, tracemalloc-topp och (för stegets
+#                    hittills största körning i processen) de allokeringsställen som höll mest minne
+#   {"sample": ...}  RSS och tracemalloc-minne med jämna mellanrum under hela körningen
+ENV_VAR = "DAITA_MEMORY_PROFILE"
+REPORT_NAME = "memory_report.txt"
+MIB = 1024 ** 2
+# En snapshot tar sekunder i en process med många objekt; nya snapshots tas bara så länge de har
+# kostat högst så här stor andel av tiden sedan profileringen startade
+SNAPSHOT_SHARE = 0.05
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def _config():
+    value = os.environ.get(ENV_VAR)
+    return json.loads(value) if value else None
+
+
+def current_rss():
+    """Resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Utan /proc (macOS) finns bara processens högsta RSS
+        return peak_rss()
+
+
+def peak_rss():
+    """Highest RSS of this process so far in bytes (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+class Profiler:
+    """Per-process tracemalloc, RSS sampler thread and stage log."""
+
+    def __init__(self, config):
+        self.top = config["top"]
+        self.interval = config["interval"]
+        self.tracing = config["frames"] > 0
+        self.active = []
+        self.worst = {}     # Mest tracemalloc-minne hittills per stegnamn, bara då sparas en ny snapshot
+        self.started = time.time()
+        self.snapshot_seconds = 0.0
+        self.lock = threading.Lock()
+        os.makedirs(config["dir"], exist_ok=True)
+        self.file = open(os.path.join(config["dir"], f"memory-{os.getpid()}.jsonl"), "a")
+        # tracemalloc gör allokeringstunga steg (scapy) flera gånger långsammare, frames=0 ger bara RSS
+        if self.tracing:
+            tracemalloc.start(config["frames"])
+        threading.Thread(target=self.sample_loop, daemon=True).start()
+
+    def write(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+
+    def sample_loop(self):
+        while True:
+            rss = current_rss()
+            traced = tracemalloc.get_traced_memory()[0] if self.tracing else 0
+            with self.lock:
+                for record in self.active:
+                    record["rss_peak"] = max(record["rss_peak"], rss)
+                stages = [record["stage"] for record in self.active]
+                # Långa steg fångas när de når en ny nivå (+10 %), korta vid slutet av steget
+                growing = [record for record in self.active if self.tracing and traced > self.worst.get(record["stage"], 0) * 1.1]
+            if growing and not self.snapshot_allowed():
+                growing = []
+            if growing:
+                top = self.top_sites()
+                with self.lock:
+                    for record in growing:
+                        self.worst[record["stage"]] = traced
+                        record["top"], record["top_traced"] = top, traced
+            self.write({"sample": time.time(), "pid": os.getpid(), "rss": rss, "traced": traced, "stages": stages})
+            time.sleep(self.interval)
+
+    def snapshot_allowed(self):
+        return self.snapshot_seconds <= SNAPSHOT_SHARE * (time.time() - self.started)
+
+    def top_sites(self):
+        start = time.time()
+        statistics = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            # Inlästa moduler (kodobjekt) syns annars överst utan att säga något om stegen
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ]).statistics("lineno")
+        self.snapshot_seconds += time.time() - start
+        return [{"site": str(stat.traceback), "size": stat.size, "count": stat.count} for stat in statistics[:self.top]]
+
+    def fold_peak(self):
+        """Credit tracemalloc's peak since the last reset to every active stage, then reset it (lock held)."""
+        if not self.tracing:
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        for record in self.active:
+            record["traced_peak"] = max(record["traced_peak"], peak)
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name, label):
+        rss = current_rss()
+        record = {"stage": name, "label": label, "pid": os.getpid(), "start": time.time(),
+                  "rss_before": rss, "rss_peak": rss, "traced_peak": 0}
+        # Toppen nollställs när ett steg börjar eller slutar, efter att ha räknats till de steg som var
+        # aktiva, så att nästlade och samtidiga steg (trådar) alla får en exakt topp
+        with self.lock:
+            self.fold_peak()
+            self.active.append(record)
+        try:
+            yield
+        finally:
+            current = tracemalloc.get_traced_memory()[0] if self.tracing else 0
+            with self.lock:
+                self.fold_peak()
+                self.active.remove(record)
+            record["seconds"] = time.time() - record.pop("start")
+            record["rss_after"] = current_rss()
+            record["rss_peak"] = max(record["rss_peak"], record["rss_after"])
+            record["process_peak_rss"] = peak_rss()
+            # Snapshoten tas medan stegets lokala variabler fortfarande lever (inom with-blocket). En snapshot
+            # tar sekunder i en stor process, så som i sample_loop krävs en ny nivå (+10 %), inte bara en ny topp
+            if (self.tracing and current > self.worst.get(name, 0) * 1.1 and current > record.get("top_traced", -1)
+                    and self.snapshot_allowed()):
+                self.worst[name] = current
+                record["top"], record["top_traced"] = self.top_sites(), current
+            self.write(record)
+
+
+def _get_profiler():
+    global _profiler
+    config = _config()
+    if config is None:
+        return None
+    with _profiler_lock:
+        # En fork ärver modulens profiler men inte dess tråd eller fil, så varje pid får en egen
+        if _profiler is None or _profiler.file.name != os.path.join(config["dir"], f"memory-{os.getpid()}.jsonl"):
+            _profiler = Profiler(config)
+    return _profiler
+
+
+@contextmanager
+def stage(name, label=None):
+    """Record memory use of a block as stage name (label e.g. the file); does nothing unless profiling is on."""
+    profiler = _get_profiler()
+    if profiler is None:
+        yield
+        return
+    with profiler.stage(name, None if label is None else str(label)):
+        yield
+
+
+def profiled(name):
+    """Decorator form of stage, labelled with the first argument (e.g. the server folder).
+
+    The allocation sites then come from the samples taken while the function runs.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name, args[0] if args else None):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def enable(output_dir, interval=1.0, top=10, frames=1):
+    """Turn profiling on for this process and every process started from it."""
+    os.environ[ENV_VAR] = json.dumps({"dir": os.path.abspath(output_dir), "interval": interval, "top": top, "frames": frames})
+
+
+def load_records(output_dir):
+    stages, samples = [], []
+    for name in sorted(os.listdir(output_dir)):
+        if name.startswith("memory-") and name.endswith(".jsonl"):
+            with open(os.path.join(output_dir, name)) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        (samples if "sample" in record else stages).append(record)
+    return stages, samples
+
+
+def write_report(output_dir, top=10):
+    """Summarise all memory-<pid>.jsonl files into memory_report.txt: per stage, per process and the worst allocation sites."""
+    stages, samples = load_records(output_dir)
+    lines = [f"Memory profile of {output_dir}", ""]
+
+    by_stage = {}
+    for record in stages:
+        by_stage.setdefault(record["stage"], []).append(record)
+    lines.append(f"{'Stage':<20} | {'Runs':<6} | {'Seconds':<9} | {'Max RSS (MiB)':<14} | {'Max RSS growth':<15} | {'Max traced (MiB)':<16}")
+    lines.append("-" * 95)
+    for name, records in sorted(by_stage.items()):
+        growth = max(record["rss_peak"] - record["rss_before"] for record in records)
+        lines.append(f"{name:<20} | {len(records):<6} | {sum(record['seconds'] for record in records):<9.1f} | "
+                     f"{max(record['rss_peak'] for record in records) / MIB:<14.1f} | {growth / MIB:<15.1f} | "
+                     f"{max(record['traced_peak'] for record in records) / MIB:<16.1f}")
+
+    by_pid = {}
+    for record in samples:
+        by_pid.setdefault(record["pid"], []).append(record)
+    for record in stages:
+        by_pid.setdefault(record["pid"], [])
+    lines += ["", f"{'Process':<10} | {'Peak RSS (MiB)':<15} | {'Stages':<8} | Duration (s)", "-" * 60]
+    for pid in sorted(by_pid):
+        pid_stages = [record for record in stages if record["pid"] == pid]
+        peak = max([record["rss"] for record in by_pid[pid]] + [record["process_peak_rss"] for record in pid_stages] or [0])
+        times = [record["sample"] for record in by_pid[pid]]
+        duration = max(times) - min(times) if times else sum(record["seconds"] for record in pid_stages)
+        lines.append(f"{pid:<10} | {peak / MIB:<15.1f} | {len(pid_stages):<8} | {duration:.1f}")
+
+    for name, records in sorted(by_stage.items()):
+        worst = max((record for record in records if "top" in record), key=lambda record: record["top_traced"], default=None)
+        if worst is None:
+            continue
+        lines += ["", f"Top allocation sites in {name} (largest run: {worst['label'] or '-'}, pid {worst['pid']}, "
+                      f"snapshot at {worst['top_traced'] / MIB:.1f} MiB traced, peak {worst['traced_peak'] / MIB:.1f} MiB)"]
+        for site in worst["top"][:top]:
+            lines.append(f"  {site['size'] / MIB:>9.2f} MiB  {site['count']:>9} blocks  {site['site']}")
+
+    report_path = os.path.join(output_dir, REPORT_NAME)
+    with open(report_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    print("\n".join(lines))
+    print(f"\nMemory report saved to: {report_path}\n")
+
+
+def run(args):
+    """Run a script with profiling on; the whole script is one stage named after it."""
+    enable(args.output_dir, args.interval, args.top, args.frames)
+    script, *script_args = args.command
+    sys.argv = [script] + script_args
+    # Skriptets egen mapp först på sökvägen, som när det körs direkt
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    # Körs den här filen som skript är den __main__, skripten importerar modulen memory_profile;
+    # samma modul (och därmed samma profiler) måste användas för det yttre steget
+    import memory_profile
+    try:
+        with memory_profile.stage(os.path.basename(script)):
+            runpy.run_path(script, run_name="__main__")
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            print(f"{script} exited with {e.code}")
+        # Rapporten skrivs i finally, sedan avslutas processen med skriptets egen kod
+        raise
+    finally:
+        write_report(args.output_dir, args.top)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Opt-in memory profiling (peak RSS, tracemalloc allocation sites) of the parse, stats and plot scripts.")
+    subparsers = parser.add_subparsers(dest="command_name", required=True)
+    run_parser = subparsers.add_parser("run", help="run a script with profiling, e.g. run --output-dir results/memory -- all-stats.py results out.csv")
+    run_parser.add_argument("--output-dir", required=True, help="folder for the memory-<pid>.jsonl files and the report, e.g. next to the results")
+    run_parser.add_argument("--interval", default=1.0, type=float, help="seconds between RSS samples")
+    run_parser.add_argument("--top", default=10, type=int, help="allocation sites listed per stage")
+    run_parser.add_argument("--frames", default=1, type=int, help="traceback depth stored by tracemalloc; tracing slows allocation-heavy code such as scapy several times, 0 records RSS only")
+    run_parser.add_argument("command", nargs=argparse.REMAINDER, help="script and its arguments")
+    report_parser = subparsers.add_parser("report", help="rewrite the report from existing memory-<pid>.jsonl files")
+    report_parser.add_argument("output_dir")
+    report_parser.add_argument("--top", default=10, type=int, help="allocation sites listed per stage")
+
+    args = parser.parse_args()
+    if args.command_name == "run":
+        if args.command and args.command[0] == "--":
+            args.command = args.command[1:]
+        if not args.command:
+            parser.error("run needs a script to run")
+        run(args)
+    else:
+        write_report(args.output_dir, args.top)
@@ -0,0 +1,69 @@
+import numpy as np
+
+MIN_RUN = 5     # Kortaste skuren av paket med utfylld storlek som räknas som padding
+
+# (nyckel, CSV-kolumn) för mätvärdena som rapporteras per server
+METRIC_COLUMNS = [
+    ("padded_packet_share", "Padded Packet Share"),
+    ("run_byte_share", "Padding Byte Share"),
+    ("mean_run_length", "Average Padding Run Length"),
+    ("max_run_length", "Max Padding Run Length"),
+    ("run_iat_cv", "Padding Run IAT CV"),
+]
+
+
+def padded_size(sizes):
+    """Most common packet size, the size DAITA pads to (0 if there are no packets)."""
+    if sizes.size == 0:
+        return 0
+    values, counts = np.unique(sizes, return_counts=True)
+    return int(values[np.argmax(counts)])
+
+
+def trace_padding_metrics(times, sent, sizes, min_run=MIN_RUN):
+    """Estimate how much of a trace is constant-size padding.
+
+    A packet counts as padded if it has the most common size for its direction.
+    Runs are consecutive padded packets in the same direction; runs of at least
+    min_run packets are treated as padding bursts, and their inter-arrival times
+    are summarised by the coefficient of variation (std/mean, 0 = perfectly regular).
+    Undefended bulk downloads also give runs of full-size packets, so the numbers
+    are meant to be read against the Undefended row of the same server.
+    """
+    metrics = {key: 0.0 for key, _ in METRIC_COLUMNS}
+    n = sizes.size
+    if n == 0:
+        return metrics
+
+    target = np.where(sent, padded_size(sizes[sent]), padded_size(sizes[~sent]))
+    at_padded = sizes == target
+    metrics["padded_packet_share"] = np.count_nonzero(at_padded) / n
+
+    # -1 för paket som inte är utfyllda, annars riktningen; en run är ett block med samma värde
+    key = np.where(at_padded, sent.astype(np.int8), np.int8(-1))
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(key)) + 1))
+    lengths = np.diff(np.append(starts, n))
+    is_padding_run = (key[starts] >= 0) & (lengths >= min_run)
+    if not is_padding_run.any():
+        return metrics
+
+    run_lengths = lengths[is_padding_run]
+    metrics["mean_run_length"] = float(run_lengths.mean())
+    metrics["max_run_length"] = float(run_lengths.max())
+
+    run_id = np.repeat(np.arange(starts.size), lengths)
+    in_run = is_padding_run[run_id]
+    metrics["run_byte_share"] = float(sizes[in_run].sum() / sizes.sum()) if sizes.sum() else 0.0
+
+    # Inter-arrival-tider inom samma run, grupperade per run med bincount
+    same_run = in_run[1:] & (run_id[1:] == run_id[:-1])
+    iat = np.diff(times)[same_run].astype(np.float64)
+    iat_run = run_id[1:][same_run]
+    count = np.bincount(iat_run, minlength=starts.size)[is_padding_run]
+    total = np.bincount(iat_run, weights=iat, minlength=starts.size)[is_padding_run]
+    square = np.bincount(iat_run, weights=iat * iat, minlength=starts.size)[is_padding_run]
+    mean = total / count
+    std = np.sqrt(np.maximum(square / count - mean * mean, 0))
+    cv = np.divide(std, mean, out=np.zeros_like(std), where=mean > 0)
+    metrics["run_iat_cv"] = float(np.average(cv, weights=count))
+    return metrics
@@ -0,0 +1,89 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+# En rad (JSON) per konverterad capture i results/parse_ledger.jsonl. Nya rader läggs till sist,
+# så en omkörning skriver inte över historiken; den senaste raden för en logg gäller.
+LEDGER_NAME = "parse_ledger.jsonl"
+
+# Status för en konverterad capture
+OK = "ok"
+EMPTY = "empty"             # Läst utan fel men inga IP-paket
+TRUNCATED = "truncated"     # Fel mitt i filen, paketen före felet finns i loggen
+FAILED = "failed"           # Inget kunde läsas
+SUSPICIOUS = (EMPTY, TRUNCATED, FAILED)
+
+
+def parse_status(packets, error):
+    """Status for a parse that produced packets and possibly ended with error."""
+    if error is not None:
+        return TRUNCATED if packets else FAILED
+    return OK if packets else EMPTY
+
+
+def ledger_path(results):
+    return os.path.join(results, LEDGER_NAME)
+
+
+def log_key(results, log_path):
+    """Ledger key of a log file: its path relative to the results folder, e.g. se-got-wg-001-DT/3/17.log."""
+    return Path(os.path.relpath(log_path, results)).as_posix()
+
+
+def record(results, log_path, entry):
+    """Append the parse result of one capture to the ledger."""
+    line = dict(entry, log=log_key(results, log_path), time=datetime.now().isoformat(timespec="seconds"))
+    # En write per rad med O_APPEND, så flera processer kan skriva samtidigt utan att rader blandas
+    fd = os.open(ledger_path(results), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, (json.dumps(line) + "\n").encode())
+    finally:
+        os.close(fd)
+
+
+def load(results):
+    """Latest ledger entry per log key, {} when the results folder has no ledger."""
+    entries = {}
+    try:
+        with open(ledger_path(results)) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    entries[entry["log"]] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+_excluded_cache = {}
+
+def excluded_logs(results):
+    """Log keys whose latest parse was not ok; cached per results folder until the ledger changes."""
+    results = os.path.abspath(results)
+    # Processer i en pool lever längre än en konvertering, så cachen gäller bara så länge ledgern är oförändrad
+    try:
+        stat = os.stat(ledger_path(results))
+        version = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        version = None
+    cached = _excluded_cache.get(results)
+    if cached is None or cached[0] != version:
+        cached = _excluded_cache[results] = (version, {key for key, entry in load(results).items() if entry["status"] != OK})
+    return cached[1]
+
+
+def valid_trace_files(url_folder):
+    """trace_io.trace_files for results/<server>/<url>, without traces the ledger marks as failed.
+
+    Returns (files, excluded) where excluded is the number of traces left out.
+    """
+    import trace_io
+
+    url_folder = Path(url_folder)
+    results = url_folder.parent.parent
+    excluded = excluded_logs(results)
+    files = trace_io.trace_files(url_folder)
+    valid = [trace_file for trace_file in files if log_key(results, trace_file) not in excluded]
+    return valid, len(files) - len(valid)
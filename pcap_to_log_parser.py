@@ -1,17 +1,32 @@
 import argparse
+import json
 import os
 import multiprocessing
-from scapy.all import PcapReader
 from datetime import datetime
-import math
 from pathlib import Path
-import requests
 import sys
+import memory_profile
+import parse_ledger
 #from tqdm import tqdm
 
+# Format som pcap_reader kan läsa, gz/zst packas upp som en ström
+CAPTURE_EXTENSIONS = (".pcap", ".pcapng", ".pcap.gz", ".pcapng.gz", ".pcap.zst", ".pcapng.zst")
+RUN_METADATA = "parse_metadata.json"
+FLOWS_IN_LEDGER = 5     # Största flödena som sparas per capture med --flow dominant
+
 def main(args):
     print(f"Results folder: {args.results}")
 
+    if args.retry:
+        retry(args)
+        return
+    if not args.dir:
+        print("Error: --dir is required\n")
+        return
+    if args.flow != "all" and args.decoder != "fast":
+        print("Error: --flow dominant needs the fast decoder\n")
+        return
+
     if os.path.exists(args.results):
         print(f"Error: The results folder {args.results} already exists.\n")
         return
@@ -26,46 +41,102 @@ def main(args):
         for server in Path(args.dir).iterdir():
             if server.is_dir():
                 for url_id in range(1, 51):  # URL 1–50
-                    count = 0
-                    for sample_id in range(1, 21):  # Sample 1–20
-                        for device_id in range(1, 6):  # Enhet 1–5
-                            # Input PCAP-fil
-                            pcap_path = server / f"URL_{url_id}_Sample_{sample_id}_D_{device_id}.pcap"
-                            
-                            # Output-struktur: results/[Server]/[URL]/[Sample].log
-                            log_dir = os.path.join(
-                                args.results,
-                                server.name,
-                                f"{url_id-1}"  # Använd URL-id för att skapa undermappen
-                            )
-                            os.makedirs(log_dir, exist_ok=True)
-                            
-                            log_path = os.path.join(log_dir, f"{count}.log")
-                            
-                            if os.path.exists(log_path):
-                                print(f"{server}/URL {url_id}/Sample {sample_id}/ Device{device_id} Log file already exists\n")
-                            else:
-                                tasks.append(
-                                    pool.apply_async(
-                                        parse_pcap,
-                                        args=(str(pcap_path), log_path, False)
-                                    )
+                    for sample_id, device_id, pcap_path, log_path in capture_paths(server, url_id, args.results, args.format):
+                        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+                        if os.path.exists(log_path):
+                            print(f"{server}/URL {url_id}/Sample {sample_id}/ Device{device_id} Log file already exists\n")
+                        else:
+                            tasks.append((log_path,
+                                pool.apply_async(
+                                    parse_pcap,
+                                    args=(str(pcap_path), log_path, False, args.decoder, args.max_packets, args.max_seconds, args.flow)
                                 )
-                            count += 1
+                            ))
 
         #for task in tqdm(tasks, desc="Processing tasks", unit="task"):
             #task.get()
         total = len(tasks)
-        for i, task in enumerate(tasks, start=1):
-            task.get()
+        problems = {}
+        for i, (log_path, task) in enumerate(tasks, start=1):
+            entry = task.get()
+            parse_ledger.record(args.results, log_path, entry)
+            if entry["status"] != parse_ledger.OK:
+                problems[entry["status"]] = problems.get(entry["status"], 0) + 1
             progress = (i / total) * 100
             sys.stdout.write(f"\rProgress: {i}/{total} ({progress:.1f}%)")
             sys.stdout.flush()
         
+    write_run_metadata(args)
+    write_manifest(args)
     print("\nParse complete!\n")
+    if problems:
+        print(f"Problems: {', '.join(f'{count} {status}' for status, count in sorted(problems.items()))} (see {parse_ledger.ledger_path(args.results)})")
+        print("Run again with --retry to re-parse only those captures\n")
     return
 
 
+def retry(args):
+    """Re-parse the captures whose latest ledger entry is not ok, with the other decoder."""
+    entries = [entry for entry in parse_ledger.load(args.results).values() if entry["status"] in parse_ledger.SUSPICIOUS]
+    if args.only:
+        entries = [entry for entry in entries if args.only in (entry["log"], entry["pcap"])]
+    if not entries:
+        print("Nothing to retry\n")
+        return
+
+    # Samma fönster som när loggarna skapades, om inget annat anges
+    try:
+        with open(os.path.join(args.results, RUN_METADATA)) as f:
+            metadata = json.load(f)
+    except FileNotFoundError:
+        metadata = {}
+    max_packets = args.max_packets or metadata.get("max_packets")
+    max_seconds = args.max_seconds or metadata.get("max_seconds")
+    flow = metadata.get("flow", "all")
+    if flow != "all":
+        print(f"Logs were converted with --flow {flow}, which only the fast decoder supports; retrying with it")
+
+    fixed = 0
+    for entry in entries:
+        decoder = "scapy" if entry["decoder"] == "fast" and flow == "all" else "fast"
+        log_path = os.path.join(args.results, entry["log"])
+        new_entry = parse_pcap(entry["pcap"], log_path, False, decoder, max_packets, max_seconds, flow)
+        parse_ledger.record(args.results, log_path, new_entry)
+        print(f"{entry['log']:<40} {entry['status']} ({entry['packets']} packets) -> {new_entry['status']} ({new_entry['packets']} packets) with {decoder}")
+        fixed += new_entry["status"] == parse_ledger.OK
+    print(f"\n{fixed}/{len(entries)} captures fixed\n")
+
+
+def capture_paths(server, url_id, results, log_format="log"):
+    """(sample_id, device_id, pcap_path, log_path) for the 100 captures of one URL on one server."""
+    paths = []
+    for sample_id in range(1, 21):  # Sample 1–20
+        for device_id in range(1, 6):  # Enhet 1–5
+            # Input PCAP-fil, .pcap, .pcapng eller komprimerad
+            pcap_path = find_capture(server, url_id, sample_id, device_id)
+
+            paths.append((sample_id, device_id, pcap_path, log_path(results, Path(server).name, url_id, sample_id, device_id, log_format)))
+    return paths
+
+
+def find_capture(server, url_id, sample_id, device_id):
+    """Path to a capture in any supported format, the plain .pcap name if none exists."""
+    name = f"URL_{url_id}_Sample_{sample_id}_D_{device_id}"
+    for extension in CAPTURE_EXTENSIONS:
+        pcap_path = Path(server) / f"{name}{extension}"
+        if pcap_path.exists():
+            return pcap_path
+    return Path(server) / f"{name}.pcap"
+
+
+def log_path(results, server_name, url_id, sample_id, device_id, log_format="log"):
+    """Output path of one capture: results/[Server]/[URL]/[n].log with n = 0-99 over sample and device."""
+    # URL-id används för undermappen, numret räknar upp enheterna inom varje sample
+    count = (sample_id - 1) * 5 + (device_id - 1)
+    return os.path.join(results, server_name, f"{url_id-1}", f"{count}.{log_format}")
+
+
 def check_dataset_structure(input_file_path):
     print(f"Checking dataset structure in {input_file_path}...")
     
@@ -74,7 +145,7 @@ def check_dataset_structure(input_file_path):
             for url_id in range(1, 51):
                 for sample_id in range(1, 21):
                     for device_id in range(1, 6):
-                        pcap = folder / f"URL_{url_id}_Sample_{sample_id}_D_{device_id}.pcap"
+                        pcap = find_capture(folder, url_id, sample_id, device_id)
                         png = folder / f"URL_{url_id}_Sample_{sample_id}_D_{device_id}.png"
                         if not pcap.exists():
                             print(f"Error: {pcap} is missing")
@@ -85,25 +156,129 @@ def check_dataset_structure(input_file_path):
     print("Dataset structure is ok.")
     return True
 
-def parse_pcap(pcap_file, trace_file, server_name):
+def remove_other_formats(trace_file):
+    """Delete the same trace in the other format (0.log next to 0.logz), so a URL folder keeps one file per index."""
+    base, extension = os.path.splitext(str(trace_file))
+    for other in (".log", ".logz"):
+        if other != extension and os.path.exists(base + other):
+            os.remove(base + other)
+
+def parse_pcap(pcap_file, trace_file, server_name, decoder="fast", max_packets=None, max_seconds=None, flow="all"):
+    """Convert one capture to a trace file, returns its ledger entry (see parse_ledger).
+
+    flow "all" keeps every IP packet, "dominant" only the tunnel flow (see pcap_reader.read_dominant_flow),
+    which needs the fast decoder.
+    """
+    # Byts --format i en befintlig resultatmapp ersätter den nya filen den gamla, annars räknas tracen två gånger
+    remove_other_formats(trace_file)
+    if flow != "all" or (decoder == "fast" and not server_name):
+        return parse_pcap_fast(pcap_file, trace_file, max_packets, max_seconds, flow)
+
+    # scapy tar flera sekunder att importera, så det görs först när en pcap ska läsas
+    from scapy.all import PcapReader
+    import pcap_reader
+
     #print(f"parse {pcap_file} to {trace_file}")    #DEBUG
     first_timestamp = None
+    first_time = None
     lines = []
+    stopped = False
+    error = None
 
-    try:
-        capture = PcapReader(str(pcap_file))
-        for packet in capture:
-            if first_timestamp is None and packet.time:
-                first_timestamp = datetime.fromtimestamp(float(packet.time))
+    # Profileras (om det slagits på) medan lines och scapys paket fortfarande lever
+    with memory_profile.stage("parse", pcap_file):
+        try:
+            # Komprimerade captures packas upp som en ström innan scapy läser dem
+            capture = PcapReader(pcap_reader.open_capture(str(pcap_file)))
+            for packet in capture:
+                if first_timestamp is None and packet.time:
+                    first_timestamp = datetime.fromtimestamp(float(packet.time))
+                    first_time = float(packet.time)
+                if max_seconds and first_time is not None and float(packet.time) - first_time > max_seconds:
+                    stopped = True
+                    break
             
-            parsed_packet = parse_packet(packet, first_timestamp, server_name)
-            if parsed_packet:  # Check if packet was successfully parsed
-                lines.append(parsed_packet)
-    except Exception as e:
-        print(f"Error processing pcap file: {e}")
+                parsed_packet = parse_packet(packet, first_timestamp, server_name)
+                if parsed_packet:  # Check if packet was successfully parsed
+                    if max_packets and len(lines) >= max_packets:
+                        stopped = True
+                        break
+                    lines.append(parsed_packet)
+        except Exception as e:
+            print(f"Error processing pcap file: {e}")
+            error = e
+
+        if str(trace_file).endswith(".logz"):
+            import trace_io
+            trace_io.write_trace(trace_file, *trace_io.parse_trace("\n".join(lines).encode()),
+                                 metadata=window_metadata(max_packets, max_seconds, stopped))
+        else:
+            with open(trace_file, "w") as f:
+                f.write("\n".join(lines))
+    return ledger_entry(pcap_file, "scapy", len(lines), error)
+
+def parse_pcap_fast(pcap_file, trace_file, max_packets=None, max_seconds=None, flow="all"):
+    """parse_pcap with the native pcap/pcapng reader instead of scapy, same output."""
+    import pcap_reader
+    import trace_io
+
+    flows = None
+    with memory_profile.stage("parse", pcap_file):
+        try:
+            if flow == "dominant":
+                trace, stopped, error, flows = pcap_reader.read_dominant_flow(pcap_file, max_packets, max_seconds)
+            else:
+                trace, stopped, error = pcap_reader.read_capture(pcap_file, max_packets, max_seconds)
+        except Exception as e:
+            trace, stopped, error = pcap_reader.empty_trace(), False, e
+        if error:
+            print(f"Error processing pcap file: {error}")
+        trace_io.write_trace(trace_file, *trace, metadata=window_metadata(max_packets, max_seconds, stopped))
+    return ledger_entry(pcap_file, "fast", trace[0].size, error, flows)
+
+def ledger_entry(pcap_file, decoder, packets, error, flows=None):
+    import parse_ledger
+
+    entry = {
+        "pcap": str(pcap_file),
+        "decoder": decoder,
+        "packets": int(packets),
+        "status": parse_ledger.parse_status(packets, error),
+        "error": f"{type(error).__name__}: {error}" if error is not None else None,
+    }
+    if flows is not None:
+        # Med --flow dominant: antal flöden och de största, så att andra tunnlar eller trafik syns i ledgern
+        entry["flow_count"] = len(flows)
+        entry["flows"] = flows[:FLOWS_IN_LEDGER]
+    return entry
+
+def window_metadata(max_packets, max_seconds, stopped):
+    """Parse window stored in .logz headers, empty when the whole capture was read."""
+    if not max_packets and not max_seconds:
+        return {}
+    return {"max_packets": max_packets, "max_seconds": max_seconds, "stopped_early": stopped}
+
+def write_run_metadata(args):
+    """Record how a results folder was produced, .log files have no header of their own."""
+    metadata = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "input": str(args.dir),
+        "format": args.format,
+        "decoder": args.decoder,
+        "max_packets": args.max_packets,
+        "max_seconds": args.max_seconds,
+        "flow": args.flow,
+    }
+    with open(os.path.join(args.results, RUN_METADATA), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+def write_manifest(args):
+    """List server, URL, sample and device of every log in results/manifest.csv (see trace_manifest)."""
+    import trace_manifest
 
-    with open(trace_file, "w") as f:
-        f.write("\n".join(lines))
+    rows = [row for server in sorted(Path(args.dir).iterdir()) if server.is_dir()
+            for row in trace_manifest.capture_rows(args.results, server, args.format)]
+    trace_manifest.write_manifest(args.results, rows)
 
 def parse_packet(packet, first_timestamp, server_name):
     global vpn_dict
@@ -125,9 +300,16 @@ def parse_packet(packet, first_timestamp, server_name):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Check dataset.")
-    parser.add_argument("--dir", required=True, help="root folder")
+    parser.add_argument("--dir", default=None, help="root folder (not needed with --retry)")
     parser.add_argument("--results", required=True, help="results folder")
     parser.add_argument("--classes", default=50, type=int, help="number of classes")
     parser.add_argument("--samples", default=100, type=int, help="number of samples")
+    parser.add_argument("--format", default="log", choices=["log", "logz"], help="trace format: text (log) or compressed (logz)")
+    parser.add_argument("--decoder", default="fast", choices=["fast", "scapy"], help="pcap decoder: native reader (fast) or scapy")
+    parser.add_argument("--max-packets", default=None, type=int, help="stop reading a capture after this many IP packets")
+    parser.add_argument("--max-seconds", default=None, type=float, help="stop reading a capture this many seconds after its first packet")
+    parser.add_argument("--flow", default="all", choices=["all", "dominant"], help="keep all IP packets, or only the tunnel flow (largest bidirectional UDP 5-tuple, fast decoder only; flows are listed in the ledger)")
+    parser.add_argument("--retry", action="store_true", help="re-parse failed, truncated and empty captures from the ledger with the other decoder")
+    parser.add_argument("--only", default=None, help="with --retry: only this capture (its log path in the ledger, e.g. server/3/17.log, or its pcap path)")
 
     main(parser.parse_args())
\ No newline at end of file
@@ -0,0 +1,169 @@
+import argparse
+import importlib
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+import parse_ledger
+import pcap_to_log_parser
+
+# Steg: konvertering (processpool) -> statistik (egen liten pool) -> attacker (egna processer via df.py/rf.py).
+# Stegen pratar över begränsade köer, så en server som är klar med ett steg går direkt vidare
+# medan nästa server fortfarande konverteras.
+DONE = None     # Skickas genom köerna när ett steg inte har något mer att lämna vidare
+
+
+class Timeline:
+    """When each server finished each stage, printed at the end to show the overlap."""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.events = {}
+        self.lock = threading.Lock()
+
+    def mark(self, server_name, stage):
+        elapsed = time.monotonic() - self.start
+        with self.lock:
+            self.events.setdefault(server_name, {})[stage] = elapsed
+        print(f"[{elapsed:7.1f} s] {server_name:<30} {stage} done")
+
+    def show(self, stages):
+        print(f"\n{'Server name':<30} | " + " | ".join(f"{stage + ' (s)':<12}" for stage in stages))
+        print("-" * (33 + 15 * len(stages)))
+        for server_name, events in sorted(self.events.items()):
+            print(f"{server_name:<30} | " + " | ".join(f"{events.get(stage, float('nan')):<12.1f}" for stage in stages))
+
+
+def convert_stage(args, pool, servers, converted, timeline):
+    """Parse the captures server by server, at most --queue-size servers ahead of the statistics."""
+    in_flight = []
+
+    def finish_oldest():
+        server, tasks = in_flight.pop(0)
+        for log_path, task in tasks:
+            parse_ledger.record(args.results, log_path, task.get())
+        timeline.mark(server.name, "convert")
+        converted.put(server)   # Blockerar när statistiksteget ligger efter
+
+    try:
+        for server in servers:
+            tasks = []
+            for _, _, pcap_path, log_path in [path for url_id in range(1, 51)
+                                              for path in pcap_to_log_parser.capture_paths(server, url_id, args.results, args.format)]:
+                if os.path.exists(log_path):
+                    continue
+                os.makedirs(os.path.dirname(log_path), exist_ok=True)
+                tasks.append((log_path, pool.apply_async(pcap_to_log_parser.parse_pcap,
+                                                         args=(str(pcap_path), log_path, False, args.decoder, args.max_packets, args.max_seconds, args.flow))))
+            in_flight.append((server, tasks))
+            # Nästa servers paket köas redan nu så att poolen aldrig står still mellan servrar
+            if len(in_flight) > 1:
+                finish_oldest()
+
+        while in_flight:
+            finish_oldest()
+    finally:
+        # Även om konverteringen kraschar måste de andra stegen få veta att inget mer kommer
+        converted.put(DONE)
+
+
+def metrics_stage(args, pool, stats, converted, attack_queue, metrics, timeline):
+    """Compute each converted server's traffic and padding statistics, then pass it on to the attacks.
+
+    pool is separate from the conversion pool, whose FIFO queue already holds the next server's
+    captures; sharing it would start a server's statistics only after those had been parsed.
+    """
+    while True:
+        server = converted.get()
+        if server is DONE:
+            for _ in range(args.attack_workers):
+                attack_queue.put(DONE)
+            return
+        log_dir = Path(args.results) / server.name
+        try:
+            metrics[server.name] = pool.apply(stats.server_metrics, (log_dir,))
+        except Exception as e:
+            print(f"{server.name:<35} ERROR: {e}")
+        timeline.mark(server.name, "metrics")
+        attack_queue.put(log_dir)
+
+
+def attack_stage(args, stats, attack_queue, accuracies, timeline):
+    """Run DF and RF on each server folder that has been converted."""
+    while True:
+        log_dir = attack_queue.get()
+        if log_dir is DONE:
+            return
+        if args.no_attacks:
+            accuracies[log_dir.name] = (0, 0)
+        else:
+            accuracies[log_dir.name] = (stats.run_attack("df", log_dir), stats.run_attack("rf", log_dir))
+            timeline.mark(log_dir.name, "attacks")
+
+
+def main(args):
+    # all-stats har bindestreck i namnet och kan inte importeras med en vanlig import-sats
+    stats = importlib.import_module("all-stats")
+
+    if not pcap_to_log_parser.check_dataset_structure(Path(args.dir)):
+        print("Input directory file structure not valid\n")
+        return
+    os.makedirs(args.results, exist_ok=True)
+    servers = sorted(server for server in Path(args.dir).iterdir() if server.is_dir())
+
+    converted = queue.Queue(maxsize=args.queue_size)
+    attack_queue = queue.Queue(maxsize=args.queue_size)
+    metrics = {}
+    accuracies = {}
+    timeline = Timeline()
+
+    with multiprocessing.Pool(args.workers) as pool, multiprocessing.Pool(args.metrics_workers) as metrics_pool:
+        threads = [threading.Thread(target=convert_stage, args=(args, pool, servers, converted, timeline)),
+                   threading.Thread(target=metrics_stage, args=(args, metrics_pool, stats, converted, attack_queue, metrics, timeline))]
+        threads += [threading.Thread(target=attack_stage, args=(args, stats, attack_queue, accuracies, timeline))
+                    for _ in range(args.attack_workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    pcap_to_log_parser.write_run_metadata(args)
+    pcap_to_log_parser.write_manifest(args)
+
+    results = {}
+    for server in servers:
+        if server.name in metrics and server.name in accuracies:
+            results[Path(args.results) / server.name] = stats.server_result(metrics[server.name], *accuracies[server.name])
+        else:
+            print(f"{server.name:<35} missing from the summary, a stage failed")
+
+    timeline.show(["convert", "metrics"] + ([] if args.no_attacks else ["attacks"]))
+
+    output_path = args.output_file
+    if output_path and not output_path.lower().endswith(".csv"):
+        output_path += ".csv"
+    stats.print_and_save_results(results, output_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert captures, compute statistics and run the WF attacks as one overlapping pipeline.")
+    parser.add_argument("--dir", required=True, help="root folder with the captures")
+    parser.add_argument("--results", required=True, help="results folder for the logs, may already exist (converted logs are skipped)")
+    parser.add_argument("output_file", type=str, help="Path to output CSV file")
+    parser.add_argument("--workers", default=None, type=int, help="processes for conversion (default: all cores)")
+    parser.add_argument("--metrics-workers", default=1, type=int, help="processes for the statistics, next to the conversion pool")
+    parser.add_argument("--attack-workers", default=1, type=int, help="servers whose attacks run at the same time")
+    parser.add_argument("--queue-size", default=2, type=int, help="servers that may wait between two stages")
+    parser.add_argument("--no-attacks", action="store_true", help="skip DF/RF, accuracies are reported as 0")
+    parser.add_argument("--format", default="log", choices=["log", "logz"], help="trace format: text (log) or compressed (logz)")
+    parser.add_argument("--decoder", default="fast", choices=["fast", "scapy"], help="pcap decoder: native reader (fast) or scapy")
+    parser.add_argument("--max-packets", default=None, type=int, help="stop reading a capture after this many IP packets")
+    parser.add_argument("--max-seconds", default=None, type=float, help="stop reading a capture this many seconds after its first packet")
+    parser.add_argument("--flow", default="all", choices=["all", "dominant"], help="keep all IP packets, or only the tunnel flow of each capture (see pcap_to_log_parser.py)")
+
+    args = parser.parse_args()
+    if args.flow != "all" and args.decoder != "fast":
+        parser.error("--flow dominant needs the fast decoder")
+    main(args)
@@ -0,0 +1,208 @@
+import argparse
+import csv
+import os
+import sqlite3
+from datetime import datetime
+
+# En körning (run) = en mätkampanj med en DAITA-version på ett medium, t.ex. ("vt2025", "V2", "WiFi").
+# Under varje körning finns en rad per (server, försvar), per URL och per trace, så att jämförelser
+# mellan versioner blir SQL-frågor i stället för ihopklistrade CSV-filer. URL:er och traces som
+# saknas syns som rader som inte finns (se status).
+RUN_KEYS = ["campaign", "daita_version", "medium"]
+
+# (kolumn i databasen, kolumn i CSV-filen från all-stats.py)
+SERVER_COLUMNS = [
+    ("duration", "Average Duration (s)"),
+    ("bandwidth", "Average Bandwidth (MiB)"),
+    ("sent_bandwidth", "Average Sent Bandwidth (MiB)"),
+    ("received_bandwidth", "Average Received Bandwidth (MiB)"),
+    ("number_sent", "Average Number Sent"),
+    ("number_received", "Average Number Received"),
+    ("df_accuracy", "DF Accuracy"),
+    ("rf_accuracy", "RF Accuracy"),
+    ("padded_packet_share", "Padded Packet Share"),
+    ("run_byte_share", "Padding Byte Share"),
+    ("mean_run_length", "Average Padding Run Length"),
+    ("max_run_length", "Max Padding Run Length"),
+    ("run_iat_cv", "Padding Run IAT CV"),
+]
+URL_COLUMNS = ["traces", "duration", "bandwidth", "sent_bandwidth", "received_bandwidth", "number_sent", "number_received"]
+TRACE_COLUMNS = ["bytes", "sent_bytes", "received_bytes", "duration", "number_sent", "number_received"]
+
+# Plot-skripten tar en CSV-fil eller ett urval ur katalogen: "results.db#daita_version=V2,medium=WiFi"
+SOURCE_SEPARATOR = "#"
+
+EXPECTED_URLS = 50
+EXPECTED_TRACES = 100
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    campaign TEXT NOT NULL,
+    daita_version TEXT NOT NULL,
+    medium TEXT NOT NULL,
+    source TEXT,
+    updated TEXT,
+    UNIQUE (campaign, daita_version, medium)
+);
+CREATE TABLE IF NOT EXISTS servers (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    server TEXT NOT NULL,
+    defense TEXT NOT NULL,
+    {", ".join(f"{column} REAL" for column, _ in SERVER_COLUMNS)},
+    PRIMARY KEY (run_id, server, defense)
+);
+CREATE TABLE IF NOT EXISTS urls (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    server TEXT NOT NULL,
+    defense TEXT NOT NULL,
+    url INTEGER NOT NULL,
+    {", ".join(f"{column} REAL" for column in URL_COLUMNS)},
+    PRIMARY KEY (run_id, server, defense, url)
+);
+CREATE TABLE IF NOT EXISTS traces (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    server TEXT NOT NULL,
+    defense TEXT NOT NULL,
+    url INTEGER NOT NULL,
+    trace INTEGER NOT NULL,
+    {", ".join(f"{column} REAL" for column in TRACE_COLUMNS)},
+    PRIMARY KEY (run_id, server, defense, url, trace)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS servers_by_server ON servers (server, defense);
+CREATE INDEX IF NOT EXISTS urls_by_server ON urls (server, defense, url);
+
+-- Samma kolumner som CSV-filerna, så att plot-skripten kan läsa båda
+CREATE VIEW IF NOT EXISTS server_stats AS
+SELECT runs.run_id, campaign, daita_version, medium,
+       server AS "Server", defense AS "Defense",
+       {", ".join(f'{column} AS "{header}"' for column, header in SERVER_COLUMNS)}
+FROM servers JOIN runs USING (run_id)
+ORDER BY runs.run_id, servers.rowid;
+"""
+
+
+def connect(db_path):
+    """Open (and create if needed) a catalogue database."""
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def get_run(conn, campaign, daita_version, medium, source=None):
+    """run_id for a (campaign, DAITA version, medium), created on first use."""
+    conn.execute("INSERT OR IGNORE INTO runs (campaign, daita_version, medium) VALUES (?, ?, ?)",
+                 (campaign, daita_version, medium))
+    conn.execute("UPDATE runs SET source = coalesce(?, source), updated = ? WHERE campaign = ? AND daita_version = ? AND medium = ?",
+                 (source, datetime.now().isoformat(timespec="seconds"), campaign, daita_version, medium))
+    return conn.execute("SELECT run_id FROM runs WHERE campaign = ? AND daita_version = ? AND medium = ?",
+                        (campaign, daita_version, medium)).fetchone()[0]
+
+
+def store_server(conn, run_id, server, defense, summary, url_rows=(), trace_rows=()):
+    """Replace everything stored for one (server, defense) of a run.
+
+    summary maps SERVER_COLUMNS names to values (missing ones become NULL), url_rows
+    are dicts with url + URL_COLUMNS and trace_rows dicts with url, trace + TRACE_COLUMNS.
+    """
+    key = (run_id, server, defense)
+    for table in ("servers", "urls", "traces"):
+        conn.execute(f"DELETE FROM {table} WHERE run_id = ? AND server = ? AND defense = ?", key)
+
+    columns = [column for column, _ in SERVER_COLUMNS]
+    conn.execute(f"INSERT INTO servers (run_id, server, defense, {', '.join(columns)}) VALUES ({', '.join('?' * (len(columns) + 3))})",
+                 key + tuple(summary.get(column) for column in columns))
+    conn.executemany(f"INSERT INTO urls (run_id, server, defense, url, {', '.join(URL_COLUMNS)}) VALUES ({', '.join('?' * (len(URL_COLUMNS) + 4))})",
+                     [key + (row["url"],) + tuple(row[column] for column in URL_COLUMNS) for row in url_rows])
+    conn.executemany(f"INSERT INTO traces (run_id, server, defense, url, trace, {', '.join(TRACE_COLUMNS)}) VALUES ({', '.join('?' * (len(TRACE_COLUMNS) + 5))})",
+                     [key + (row["url"], row["trace"]) + tuple(row[column] for column in TRACE_COLUMNS) for row in trace_rows])
+
+
+def import_csv(db_path, csv_file, campaign, daita_version, medium):
+    """Add a stats CSV from all-stats.py (server rows only) to the catalogue."""
+    headers = {header: column for column, header in SERVER_COLUMNS}
+    with connect(db_path) as conn:
+        run_id = get_run(conn, campaign, daita_version, medium, os.path.abspath(csv_file))
+        with open(csv_file, newline="") as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            summary = {headers[header.strip()]: float(value) for header, value in row.items()
+                       if header.strip() in headers and value.strip() not in ("", "nan")}
+            store_server(conn, run_id, row["Server"].strip(), row["Defense"].strip(), summary)
+    print(f"Imported {len(rows)} server rows from {csv_file} as {campaign}/{daita_version}/{medium}")
+
+
+def select_run(conn, selector):
+    """run_id of the single run matching a selector like 'daita_version=V2,medium=WiFi'."""
+    filters = dict(part.split("=", 1) for part in selector.split(",") if part)
+    unknown = set(filters) - set(RUN_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown selector keys {sorted(unknown)}, expected {RUN_KEYS}")
+    where = " AND ".join(f"{key} = ?" for key in filters) or "1"
+    matches = conn.execute(f"SELECT run_id, campaign, daita_version, medium FROM runs WHERE {where}",
+                           list(filters.values())).fetchall()
+    if len(matches) != 1:
+        found = ", ".join("/".join(match[1:]) for match in matches) or "none"
+        raise ValueError(f"Selector '{selector}' must match exactly one run, found: {found}")
+    return matches[0][0]
+
+
+def split_source(source):
+    """(database, selector) of a catalogue input like 'results.db#medium=WiFi', None for a plain file."""
+    if SOURCE_SEPARATOR not in source or os.path.exists(source):
+        return None
+    db_path, selector = source.split(SOURCE_SEPARATOR, 1)
+    return db_path, selector
+
+
+def read_run(db_path, selector):
+    """(headers, rows) of the server rows of the selected run, with the same headers as the CSV files."""
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"Catalogue {db_path} not found")
+    headers = ["Server", "Defense"] + [header for _, header in SERVER_COLUMNS]
+    columns = ", ".join(f'"{header}"' for header in headers)
+    with connect(db_path) as conn:
+        run_id = select_run(conn, selector)
+        rows = conn.execute(f"SELECT {columns} FROM server_stats WHERE run_id = ?", (run_id,)).fetchall()
+    return headers, rows
+
+
+def print_status(db_path):
+    """Per run and server: how many URL and trace rows exist out of the expected 50 and 5000."""
+    with connect(db_path) as conn:
+        rows = conn.execute("""
+            SELECT campaign, daita_version, medium, s.server, s.defense,
+                   (SELECT count(*) FROM urls u WHERE u.run_id = s.run_id AND u.server = s.server AND u.defense = s.defense),
+                   (SELECT count(*) FROM traces t WHERE t.run_id = s.run_id AND t.server = s.server AND t.defense = s.defense)
+            FROM servers s JOIN runs USING (run_id)
+            ORDER BY campaign, daita_version, medium, s.server, s.defense""").fetchall()
+
+    print(f"{'Run':<35} | {'Server name':<25} | {'Defense':<12} | {'URLs':<8} | {'Traces':<10}")
+    print("-" * 100)
+    for campaign, daita_version, medium, server, defense, urls, traces in rows:
+        run = "/".join([campaign, daita_version, medium])
+        if urls == 0:
+            urls_text, traces_text = "-", "-"     # Importerad från CSV, bara serversammanfattning
+        else:
+            urls_text = f"{urls}/{EXPECTED_URLS}"
+            traces_text = f"{traces}/{EXPECTED_URLS * EXPECTED_TRACES}"
+        incomplete = urls and (urls < EXPECTED_URLS or traces < EXPECTED_URLS * EXPECTED_TRACES)
+        print(f"{run:<35} | {server:<25} | {defense:<12} | {urls_text:<8} | {traces_text:<10}{'  INCOMPLETE' if incomplete else ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the SQLite results catalogue or import old stats CSVs into it.")
+    parser.add_argument("database", help="catalogue file, e.g. results.db")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="list runs and servers with their number of URL and trace rows")
+    import_parser = subparsers.add_parser("import-csv", help="add a CSV from all-stats.py as a run")
+    import_parser.add_argument("csv_file")
+    import_parser.add_argument("--campaign", default="", help="measurement campaign")
+    import_parser.add_argument("--daita-version", required=True, help="DAITA version, e.g. V2")
+    import_parser.add_argument("--medium", default="", help="capture medium, e.g. WiFi or 4G")
+
+    args = parser.parse_args()
+    if args.command == "status":
+        print_status(args.database)
+    else:
+        import_csv(args.database, args.csv_file, args.campaign, args.daita_version, args.medium)
@@ -0,0 +1,242 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+import parse_ledger
+import pcap_to_log_parser
+
+# Arbetskön ligger i resultatmappen så att alla noder som delar filsystemet ser samma kö:
+#   results/.queue/leases/<server>__<url>.lease   vem som jobbar med enheten, mtime = senaste livstecken
+#   results/.queue/done/<server>__<url>.done      enheten är klar (alla 100 loggar skrivna)
+QUEUE_DIR = ".queue"
+POLL_SECONDS = 1        # Hur ofta en worker utan egen enhet ser efter om något blivit ledigt eller klart
+
+
+def unit_name(server_name, url_id):
+    return f"{server_name}__{url_id}"
+
+
+def list_units(input_dir):
+    """All (server, url_id) work units in the input tree."""
+    return [(server, url_id)
+            for server in sorted(Path(input_dir).iterdir()) if server.is_dir()
+            for url_id in range(1, 51)]
+
+
+class WorkQueue:
+    """Lease-based work queue on a plain (possibly shared) directory, no broker needed."""
+
+    def __init__(self, results, lease_timeout):
+        self.lease_dir = os.path.join(results, QUEUE_DIR, "leases")
+        self.done_dir = os.path.join(results, QUEUE_DIR, "done")
+        self.lease_timeout = lease_timeout
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(self.lease_dir, exist_ok=True)
+        os.makedirs(self.done_dir, exist_ok=True)
+
+    def lease_path(self, unit):
+        return os.path.join(self.lease_dir, f"{unit}.lease")
+
+    def done_path(self, unit):
+        return os.path.join(self.done_dir, f"{unit}.done")
+
+    def is_done(self, unit):
+        return os.path.exists(self.done_path(unit))
+
+    def claim(self, unit):
+        """Try to take the lease on a unit; stale leases from crashed workers are taken over."""
+        lease = self.lease_path(unit)
+        try:
+            fd = os.open(lease, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                age = time.time() - os.stat(lease).st_mtime
+            except FileNotFoundError:
+                return self.claim(unit)
+            if age < self.lease_timeout:
+                return False
+            # rename är atomisk, bara en av workers som ser samma gamla lease lyckas
+            stale = f"{lease}.stale-{self.worker_id}"
+            try:
+                os.rename(lease, stale)
+            except FileNotFoundError:
+                return False
+            # En annan worker kan ha tagit över och skapat en ny lease mellan stat och rename, då flyttades
+            # dess färska lease hit och lämnas tillbaka. link skriver inte över en lease som en tredje worker
+            # hunnit skapa; då förlorar den andra sin lease och märker det före nästa capture (convert_unit)
+            try:
+                age = time.time() - os.stat(stale).st_mtime
+            except FileNotFoundError:
+                return False
+            if age < self.lease_timeout:
+                try:
+                    os.link(stale, lease)
+                except FileExistsError:
+                    pass
+                os.remove(stale)
+                return False
+            os.remove(stale)
+            print(f"Reclaiming {unit}, lease expired {age:.0f} s ago")
+            return self.claim(unit)
+
+        with os.fdopen(fd, "w") as f:
+            json.dump({"worker": self.worker_id, "claimed": time.time()}, f)
+        return True
+
+    def owns(self, unit):
+        try:
+            with open(self.lease_path(unit)) as f:
+                return json.load(f).get("worker") == self.worker_id
+        except (OSError, ValueError):
+            return False
+
+    def heartbeat(self, unit):
+        try:
+            os.utime(self.lease_path(unit))
+        except FileNotFoundError:
+            pass
+
+    def complete(self, unit, info):
+        tmp_path = f"{self.done_path(unit)}.tmp-{self.worker_id}"
+        with open(tmp_path, "w") as f:
+            json.dump(dict(info, worker=self.worker_id, finished=time.time()), f)
+        os.replace(tmp_path, self.done_path(unit))
+        self.release(unit)
+
+    def release(self, unit):
+        try:
+            os.remove(self.lease_path(unit))
+        except FileNotFoundError:
+            pass
+
+
+def convert_unit(queue, server, url_id, args):
+    """Parse all 100 captures of one unit, touching the lease while working."""
+    unit = unit_name(server.name, url_id)
+    stop = threading.Event()
+
+    def keep_alive():
+        while not stop.wait(queue.lease_timeout / 3):
+            queue.heartbeat(unit)
+
+    heartbeat = threading.Thread(target=keep_alive, daemon=True)
+    heartbeat.start()
+    start = time.time()
+    try:
+        # Loggarna skrivs om från början, en krashad worker kan ha lämnat halva filer efter sig
+        for _, _, pcap_path, log_path in pcap_to_log_parser.capture_paths(server, url_id, args.results, args.format):
+            if not queue.owns(unit):
+                break
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            entry = pcap_to_log_parser.parse_pcap(str(pcap_path), log_path, False, args.decoder,
+                                                  args.max_packets, args.max_seconds, args.flow)
+            parse_ledger.record(args.results, log_path, entry)
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    if not queue.owns(unit):
+        # Leasen gick ut och någon annan har tagit över, den worker markerar enheten som klar
+        print(f"Lost lease on {unit}, leaving it to the new owner")
+        return False
+    queue.complete(unit, {"seconds": round(time.time() - start, 1)})
+    return True
+
+
+def worker(args):
+    queue = WorkQueue(args.results, args.lease_timeout)
+    converted = 0
+    while True:
+        remaining = [(server, url_id) for server, url_id in list_units(args.dir)
+                     if not queue.is_done(unit_name(server.name, url_id))]
+        if not remaining:
+            break
+
+        claimed = False
+        for server, url_id in remaining:
+            unit = unit_name(server.name, url_id)
+            if queue.claim(unit):
+                if queue.is_done(unit):
+                    # Blev klar hos en annan worker sedan listan togs fram
+                    queue.release(unit)
+                    continue
+                claimed = True
+                if convert_unit(queue, server, url_id, args):
+                    converted += 1
+                    print(f"[{queue.worker_id}] {server.name} URL {url_id} done")
+
+        if not claimed:
+            # Allt som är kvar hålls av andra workers, vänta på att de blir klara eller dör
+            time.sleep(min(args.lease_timeout / 4, POLL_SECONDS))
+    return converted
+
+
+def verify(args):
+    """Check that every unit is marked done and has all of its logs."""
+    queue = WorkQueue(args.results, args.lease_timeout)
+    missing_units = []
+    missing_logs = 0
+    units = list_units(args.dir)
+    for server, url_id in units:
+        unit = unit_name(server.name, url_id)
+        logs = [log_path for _, _, _, log_path in pcap_to_log_parser.capture_paths(server, url_id, args.results, args.format)]
+        absent = [log_path for log_path in logs if not os.path.exists(log_path)]
+        if not queue.is_done(unit) or absent:
+            missing_units.append(unit)
+            missing_logs += len(absent)
+
+    print(f"{len(units) - len(missing_units)}/{len(units)} units complete")
+    if missing_units:
+        print(f"Incomplete: {', '.join(missing_units[:20])}{' ...' if len(missing_units) > 20 else ''}")
+        print(f"{missing_logs} log files missing\n")
+        return False
+    # Alla enheter är klara, så manifestet kan skrivas för hela datasetet
+    pcap_to_log_parser.write_manifest(args)
+    print("Conversion complete!\n")
+    return True
+
+
+def main(args):
+    if args.command == "verify":
+        return 0 if verify(args) else 1
+
+    if args.flow != "all" and args.decoder != "fast":
+        print("Error: --flow dominant needs the fast decoder\n")
+        return 1
+    if not args.skip_check and not pcap_to_log_parser.check_dataset_structure(Path(args.dir)):
+        print("Input directory file structure not valid\n")
+        return 1
+    os.makedirs(args.results, exist_ok=True)
+    # Alla noder skriver samma inställningar, den sista vinner
+    pcap_to_log_parser.write_run_metadata(args)
+
+    if args.workers == 1:
+        converted = worker(args)
+    else:
+        with multiprocessing.Pool(args.workers) as pool:
+            converted = sum(pool.map(worker, [args] * args.workers))
+    print(f"\nConverted {converted} units on {socket.gethostname()}\n")
+    return 0 if verify(args) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert pcaps to logs with workers on one or many nodes sharing a filesystem.")
+    parser.add_argument("command", choices=["work", "verify"], help="work: claim and convert (server, url) units, verify: check completeness")
+    parser.add_argument("--dir", required=True, help="root folder")
+    parser.add_argument("--results", required=True, help="results folder, also holds the work queue")
+    parser.add_argument("--workers", default=1, type=int, help="worker processes on this node")
+    parser.add_argument("--lease-timeout", default=600, type=float, help="seconds without heartbeat before a unit is re-claimed")
+    parser.add_argument("--format", default="log", choices=["log", "logz"], help="trace format: text (log) or compressed (logz)")
+    parser.add_argument("--decoder", default="fast", choices=["fast", "scapy"], help="pcap decoder: native reader (fast) or scapy")
+    parser.add_argument("--max-packets", default=None, type=int, help="stop reading a capture after this many IP packets")
+    parser.add_argument("--max-seconds", default=None, type=float, help="stop reading a capture this many seconds after its first packet")
+    parser.add_argument("--flow", default="all", choices=["all", "dominant"], help="keep all IP packets, or only the tunnel flow of each capture (see pcap_to_log_parser.py)")
+    parser.add_argument("--skip-check", action="store_true", help="skip check_dataset_structure (e.g. when many nodes start at once)")
+
+    sys.exit(main(parser.parse_args()))
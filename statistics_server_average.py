@@ -1,35 +1,32 @@
 import os
 import argparse
-from pathlib import Path
 import csv
+import trace_io
+import parse_ledger
 
-def process_log_file(log_file):
-    """Process each log file to calculate its total size and duration."""
+def process_log_file(log_file, trace=None):
+    """Process each log file to calculate its total size and duration (trace: already read arrays of the file)."""
     duration = 0
     log_size = 0
 
-    with open(log_file, "r") as f:
-        for line in f:
-            parts = line.strip().split(",")
-
-            time, direction, size = parts
-            size = int(size)
-
-            duration = float(time) / (10 ** 9)  # Convert time to seconds (assuming nanoseconds)
-            log_size += size
+    # Utan förhämtad trace läses filen block för block, komprimerade .logz-filer packas upp som en ström
+    for times, sent, sizes in ([trace] if trace is not None else trace_io.iter_trace_blocks(log_file)):
+        if times.size:
+            duration = times[-1] / (10 ** 9)  # Convert time to seconds (assuming nanoseconds)
+        log_size += int(sizes.sum())
 
     return log_size, duration
 
-def process_server_folders(results_dir):
+def process_server_folders(results_dir, readahead=trace_io.READAHEAD, prefetch_bytes=trace_io.PREFETCH_BYTES):
     results = {}
 
-    base_path = Path(results_dir)
-    for server in base_path.iterdir():
-        if not server.is_dir():
-            continue
+    # list_servers hoppar över punktmappar som arbetskön (.queue) och .ingest
+    for server in trace_io.list_servers(results_dir):
 
         total_duration = 0
         total_size = 0
+        valid_urls = 0
+        excluded_logs = 0
 
         # Process each url folder (from 0 to 49)
         for url_folder_num in range(50):
@@ -41,23 +38,35 @@ def process_server_folders(results_dir):
 
             total_log_duration = 0
             total_log_size = 0
-
-            # Process log files (from 0.log to 99.log)
-            for log_file in url_folder.glob("*.log"):
-                log_size, duration = process_log_file(log_file)
+            valid_logs = 0
+
+            # Process log files (from 0.log to 99.log), except failed (see the ledger) or empty ones
+            log_files, excluded = parse_ledger.valid_trace_files(url_folder)
+            excluded_logs += excluded
+            for log_file, trace in trace_io.prefetch_traces(log_files, readahead, prefetch_bytes):
+                log_size, duration = process_log_file(log_file, trace)
+                if log_size == 0:
+                    excluded_logs += 1
+                    continue
+                valid_logs += 1
                 total_log_size += log_size
                 total_log_duration += duration
+            if not valid_logs:
+                continue
 
-            # Calculate average log size and duration for this URL
-            average_log_size = (total_log_size / 100) / 1024**2  # Convert to MiB
-            average_log_duration = total_log_duration / 100
+            # Calculate average log size and duration for this URL (normally 100 traces)
+            average_log_size = (total_log_size / valid_logs) / 1024**2  # Convert to MiB
+            average_log_duration = total_log_duration / valid_logs
 
             total_size += average_log_size
             total_duration += average_log_duration
+            valid_urls += 1
 
         # Calculate average duration and bandwidth for the server
-        average_duration = total_duration / 50
-        average_size = total_size / 50
+        if excluded_logs:
+            print(f"{server.name:<20} {excluded_logs} traces excluded (failed, truncated or empty)")
+        average_duration = total_duration / max(valid_urls, 1)
+        average_size = total_size / max(valid_urls, 1)
 
         results[server] = (average_duration, average_size)
 
@@ -101,10 +110,11 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process log files and sum bytes transferred.")
     parser.add_argument("results_dir", type=str, help="Path to the input directory")
     parser.add_argument("output_file", type=str, help="Path to output CSV file")
+    trace_io.add_prefetch_arguments(parser)
 
     args = parser.parse_args()
 
-    statistics = process_server_folders(args.results_dir)
+    statistics = process_server_folders(args.results_dir, args.readahead, args.prefetch_mib * 1024 ** 2)
 
     output_path = args.output_file
     if output_path and not output_path.lower().endswith(".csv"):
@@ -0,0 +1,192 @@
+import argparse
+import multiprocessing
+import os
+import struct
+import sys
+import zlib
+import numpy as np
+import trace_io
+
+# Samma struktur som de riktiga mätningarna
+NUM_URLS = 50
+NUM_SAMPLES = 20
+NUM_DEVICES = 5
+
+CLIENT_IP = 0xc0a8010a      # 192.168.1.10, riktningen avgörs av 192.168-prefixet
+SERVER_IP = 0xb9d59a01      # 185.213.154.1
+START_TIME = 1735689600      # 2025-01-01, tidsstämpel för första paketet
+
+# Minsta giltiga PNG (1x1 pixel), check_dataset_structure kräver en skärmdump per pcap
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+PNG_1X1 = (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0))
+           + _png_chunk(b"IDAT", zlib.compress(b"\x00\x00")) + _png_chunk(b"IEND", b""))
+
+# Ethernet + IPv4 + UDP (WireGuard), bara headers sparas (snaplen 42)
+PACKET_DTYPE = np.dtype([
+    ("ts_sec", "<u4"), ("ts_usec", "<u4"), ("incl_len", "<u4"), ("orig_len", "<u4"),
+    ("eth_dst", "V6"), ("eth_src", "V6"), ("eth_type", ">u2"),
+    ("ver_ihl", "u1"), ("tos", "u1"), ("ip_len", ">u2"), ("ip_id", ">u2"), ("frag", ">u2"),
+    ("ttl", "u1"), ("proto", "u1"), ("ip_checksum", ">u2"), ("ip_src", ">u4"), ("ip_dst", ">u4"),
+    ("udp_sport", ">u2"), ("udp_dport", ">u2"), ("udp_len", ">u2"), ("udp_checksum", ">u2"),
+])
+SNAPLEN = 42
+LINKTYPE_ETHERNET = 1
+PCAP_HEADER = struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, SNAPLEN, LINKTYPE_ETHERNET)
+
+
+def server_names(count):
+    """Synthetic server locations, each measured without (-ND) and with (-DT) DAITA."""
+    names = []
+    for i in range(count):
+        names.append(f"xx-syn-wg-{i + 1:03d}-ND")
+        names.append(f"xx-syn-wg-{i + 1:03d}-DT")
+    return names
+
+
+def generate_trace(args, server_index, defended, url, sample, device):
+    """One synthetic page load as (times_ns, sent, sizes), deterministic for a given seed.
+
+    Each URL has its own size/packet profile (the same on every server), each server
+    its own latency factor, and every (sample, device) its own random variation.
+    """
+    url_rng = np.random.default_rng([args.seed, 0, url])
+    url_packets = args.packets * url_rng.lognormal(0, 0.5)
+    url_recv_share = url_rng.uniform(0.55, 0.8)
+    url_duration = args.duration * url_rng.uniform(0.7, 1.3)
+
+    latency = np.random.default_rng([args.seed, 1, server_index]).uniform(0.9, 1.2)
+    rng = np.random.default_rng([args.seed, 2, server_index, int(defended), url, sample, device])
+
+    n = max(1, int(rng.poisson(url_packets)))
+    duration_ns = url_duration * latency * rng.uniform(0.9, 1.1) * 1e9
+    times = np.sort(rng.uniform(0, duration_ns, n))
+    sent = rng.random(n) >= url_recv_share
+    sizes = np.where(
+        sent,
+        np.where(rng.random(n) < 0.8, 124, rng.integers(60, args.mtu + 1, n)),
+        np.where(rng.random(n) < 0.7, args.mtu, rng.integers(60, args.mtu + 1, n))
+    )
+
+    if defended:
+        duration_ns *= 1 + args.padding_delay
+        times *= 1 + args.padding_delay
+
+        # Padding: extra paket i skurar med jämna mellanrum, alla paket fylls ut till en fast storlek
+        n_bursts = max(1, int(n * args.padding_ratio / args.burst_length))
+        burst_start = rng.uniform(0, duration_ns, n_bursts)
+        burst_sent = rng.random(n_bursts) < 0.6
+        offsets = np.arange(args.burst_length) * args.burst_interval_ms * 1e6
+        pad_times = (burst_start[:, None] + offsets[None, :]).ravel()
+        pad_sent = np.repeat(burst_sent, args.burst_length)
+
+        times = np.concatenate([times, pad_times])
+        sent = np.concatenate([sent, pad_sent])
+        order = np.argsort(times, kind="stable")
+        times, sent = times[order], sent[order]
+        sizes = np.where(sent, args.padded_size, args.padded_size + 100)
+
+    # Mikrosekundsupplösning som i pcap-filerna, första paketet vid tid 0
+    times = (times // 1000).astype(np.int64) * 1000
+    times -= times[0]
+    return times, sent, sizes.astype(np.int64)
+
+
+def write_pcap(pcap_file, times, sent, sizes):
+    """Write a trace as a libpcap file with Ethernet/IPv4/UDP headers."""
+    records = np.zeros(times.size, dtype=PACKET_DTYPE)
+    timestamps_us = START_TIME * 1_000_000 + times // 1000
+    records["ts_sec"] = timestamps_us // 1_000_000
+    records["ts_usec"] = timestamps_us % 1_000_000
+    records["incl_len"] = SNAPLEN
+    records["orig_len"] = 14 + sizes
+    records["eth_type"] = 0x0800
+    records["ver_ihl"] = 0x45
+    records["ip_len"] = sizes
+    records["ip_id"] = np.arange(times.size) & 0xffff
+    records["ttl"] = 64
+    records["proto"] = 17
+    records["ip_src"] = np.where(sent, CLIENT_IP, SERVER_IP)
+    records["ip_dst"] = np.where(sent, SERVER_IP, CLIENT_IP)
+    records["udp_sport"] = 51820
+    records["udp_dport"] = 51820
+    records["udp_len"] = sizes - 20
+
+    with open(pcap_file, "wb") as f:
+        f.write(PCAP_HEADER)
+        f.write(records.tobytes())
+
+
+def generate_url(args, server_index, server, url):
+    """All samples and devices of one (server, url), returns the number of packets written."""
+    defended = server.endswith("-DT")
+    packets = 0
+    count = 0
+    for sample in range(1, NUM_SAMPLES + 1):
+        for device in range(1, NUM_DEVICES + 1):
+            times, sent, sizes = generate_trace(args, server_index, defended, url, sample, device)
+            packets += times.size
+
+            if args.pcap_dir:
+                name = f"URL_{url}_Sample_{sample}_D_{device}"
+                write_pcap(os.path.join(args.pcap_dir, server, f"{name}.pcap"), times, sent, sizes)
+                with open(os.path.join(args.pcap_dir, server, f"{name}.png"), "wb") as f:
+                    f.write(PNG_1X1)
+
+            if args.log_dir:
+                log_path = os.path.join(args.log_dir, server, str(url - 1), f"{count}.{args.format}")
+                trace_io.write_trace(log_path, times, sent, sizes)
+            count += 1
+    return packets
+
+
+def generate_url_task(task):
+    return generate_url(*task)
+
+
+def main(args):
+    if not args.pcap_dir and not args.log_dir:
+        print("Error: give --pcap-dir and/or --log-dir\n")
+        return
+
+    servers = server_names(args.servers)
+    tasks = []
+    for server_index, server in enumerate(servers):
+        if args.pcap_dir:
+            os.makedirs(os.path.join(args.pcap_dir, server), exist_ok=True)
+        for url in range(1, NUM_URLS + 1):
+            if args.log_dir:
+                os.makedirs(os.path.join(args.log_dir, server, str(url - 1)), exist_ok=True)
+            tasks.append((args, server_index // 2, server, url))
+
+    with multiprocessing.Pool(args.workers) as pool:
+        total = len(tasks)
+        packets = 0
+        for i, url_packets in enumerate(pool.imap_unordered(generate_url_task, tasks), start=1):
+            packets += url_packets
+            sys.stdout.write(f"\rProgress: {i}/{total} ({i / total * 100:.1f}%)")
+            sys.stdout.flush()
+
+    traces = total * NUM_SAMPLES * NUM_DEVICES
+    print(f"\nGenerated {traces} traces, {packets} packets, for {len(servers)} servers (seed {args.seed})\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic dataset (pcap and/or log trees).")
+    parser.add_argument("--pcap-dir", default=None, help="output folder for <server>/URL_<n>_Sample_<m>_D_<d>.pcap (input to pcap_to_log_parser.py)")
+    parser.add_argument("--log-dir", default=None, help="output folder for <server>/<url>/<n>.log (input to the stats scripts)")
+    parser.add_argument("--format", default="log", choices=["log", "logz"], help="trace format for --log-dir")
+    parser.add_argument("--servers", default=2, type=int, help="number of server locations, each gets an -ND and a -DT folder")
+    parser.add_argument("--seed", default=0, type=int, help="random seed")
+    parser.add_argument("--packets", default=1500, type=float, help="average number of packets per undefended page load")
+    parser.add_argument("--duration", default=22, type=float, help="average page load duration in seconds")
+    parser.add_argument("--mtu", default=1340, type=int, help="largest IP packet size in undefended traffic")
+    parser.add_argument("--padded-size", default=1340, type=int, help="IP size of padded sent packets (received are 100 bytes larger)")
+    parser.add_argument("--padding-ratio", default=1.5, type=float, help="padding packets per real packet on -DT servers")
+    parser.add_argument("--burst-length", default=20, type=int, help="padding packets per burst")
+    parser.add_argument("--burst-interval-ms", default=0.3, type=float, help="time between padding packets in a burst")
+    parser.add_argument("--padding-delay", default=0.1, type=float, help="relative increase in duration on -DT servers")
+    parser.add_argument("--workers", default=None, type=int, help="number of processes (default: all cores)")
+
+    main(parser.parse_args())
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Skripten ligger direkt i repots rot och importeras som moduler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
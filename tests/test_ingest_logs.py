@@ -0,0 +1,50 @@
+import argparse
+import os
+import numpy as np
+import pytest
+import ingest_logs
+import trace_io
+
+
+def make_legacy_tree(root):
+    """One server with one URL folder of three small .log traces."""
+    rng = np.random.default_rng(0)
+    url_folder = root / "se-got-wg-001-ND" / "0"
+    url_folder.mkdir(parents=True)
+    for index in range(3):
+        times = np.cumsum(rng.integers(1000, 100000, 500))
+        sent = rng.random(500) < 0.4
+        sizes = rng.integers(60, 1500, 500)
+        (url_folder / f"{index}.log").write_text(trace_io.format_trace(times, sent, sizes))
+
+
+def ingest(input_dir, output_dir, compressor, verify):
+    args = argparse.Namespace(input_dir=str(input_dir), output_dir=str(output_dir), compressor=compressor,
+                              workers=1, strict=False, verify=verify)
+    return ingest_logs.main(args)
+
+
+@pytest.mark.parametrize("compressor", list(trace_io.COMPRESSORS))
+def test_verify_redoes_unit_with_corrupt_trace(tmp_path, compressor):
+    legacy, output = tmp_path / "legacy", tmp_path / "output"
+    make_legacy_tree(legacy)
+    assert ingest(legacy, output, compressor, verify=True) == 0
+    done = ingest_logs.done_path(str(output), "se-got-wg-001-ND", 0)
+    assert os.path.exists(done)
+
+    # Skadar den komprimerade datan mitt i filen så att dekomprimeringen misslyckas
+    stored = output / "se-got-wg-001-ND" / "0" / "1.logz"
+    data = bytearray(stored.read_bytes())
+    middle = len(data) // 2
+    data[middle:middle + 16] = bytes(byte ^ 0xFF for byte in data[middle:middle + 16])
+    stored.write_bytes(bytes(data))
+
+    assert ingest(legacy, output, compressor, verify=True) == 1
+    assert not os.path.exists(done)
+
+    # Nästa körning gör om enheten och ger en läsbar kopia av källan
+    assert ingest(legacy, output, compressor, verify=True) == 0
+    assert os.path.exists(done)
+    expected = trace_io.read_trace(legacy / "se-got-wg-001-ND" / "0" / "1.log")
+    for column, expected_column in zip(trace_io.read_trace(stored), expected):
+        np.testing.assert_array_equal(column, expected_column)
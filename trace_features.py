@@ -0,0 +1,206 @@
+import argparse
+import csv
+import importlib
+import multiprocessing
+import os
+import numpy as np
+from pathlib import Path
+import memory_profile
+import parse_ledger
+import trace_io
+
+# (nyckel, CSV-kolumn) för features per trace; IAT i millisekunder, en burst = paket i rad åt samma håll
+FEATURE_COLUMNS = [
+    ("packets", "Packets"),
+    ("iat_mean", "IAT Mean (ms)"),
+    ("iat_p50", "IAT Median (ms)"),
+    ("iat_p90", "IAT P90 (ms)"),
+    ("iat_cv", "IAT CV"),
+    ("bursts", "Bursts"),
+    ("direction_switches", "Direction Switches"),
+    ("burst_length_mean", "Average Burst Length"),
+    ("burst_length_max", "Max Burst Length"),
+    ("burst_bytes_mean", "Average Burst Bytes"),
+    ("out_burst_length_mean", "Average Outgoing Burst Length"),
+    ("in_burst_length_mean", "Average Incoming Burst Length"),
+    ("out_burst_bytes_mean", "Average Outgoing Burst Bytes"),
+    ("in_burst_bytes_mean", "Average Incoming Burst Bytes"),
+]
+FEATURES = [key for key, _ in FEATURE_COLUMNS]
+
+
+def _divide(a, b):
+    return np.divide(a, b, out=np.zeros(len(a)), where=b > 0)
+
+
+def _group_percentiles(values, groups, counts, qs):
+    """Linear-interpolated percentiles of values per group (groups sorted ascending), 0 for empty groups."""
+    order = np.lexsort((values, groups))
+    sorted_values = values[order]
+    starts = np.cumsum(counts) - counts
+    result = np.zeros((len(qs), len(counts)))
+    present = counts > 0
+    for i, q in enumerate(qs):
+        position = q / 100 * (counts[present] - 1)
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        base = starts[present]
+        low_value = sorted_values[base + low]
+        result[i, present] = low_value + (sorted_values[base + high] - low_value) * (position - low)
+    return result
+
+
+def batch_features(traces):
+    """Features for a list of (times, sent, sizes) traces, {feature: array with one value per trace}.
+
+    All traces are concatenated and every feature is computed with bincount/reduceat over
+    trace and burst ids, there is no Python loop over packets or bursts.
+    """
+    n_traces = len(traces)
+    features = {key: np.zeros(n_traces) for key in FEATURES}
+    if n_traces == 0:
+        return features
+
+    counts = np.array([trace[0].size for trace in traces])
+    features["packets"] = counts.astype(np.float64)
+    if counts.sum() == 0:
+        return features
+    times = np.concatenate([trace[0] for trace in traces])
+    sent = np.concatenate([trace[1] for trace in traces])
+    sizes = np.concatenate([trace[2] for trace in traces]).astype(np.float64)
+    trace_id = np.repeat(np.arange(n_traces), counts)
+
+    # Inter-arrival-tider inom samma trace
+    same_trace = trace_id[1:] == trace_id[:-1]
+    iat = np.diff(times)[same_trace] / 1e6
+    iat_trace = trace_id[1:][same_trace]
+    iat_count = np.bincount(iat_trace, minlength=n_traces)
+    iat_sum = np.bincount(iat_trace, weights=iat, minlength=n_traces)
+    iat_square = np.bincount(iat_trace, weights=iat * iat, minlength=n_traces)
+    features["iat_mean"] = _divide(iat_sum, iat_count)
+    iat_std = np.sqrt(np.maximum(_divide(iat_square, iat_count) - features["iat_mean"] ** 2, 0))
+    features["iat_cv"] = _divide(iat_std, features["iat_mean"])
+    if iat.size:
+        features["iat_p50"], features["iat_p90"] = _group_percentiles(iat, iat_trace, iat_count, [50, 90])
+
+    # Bursts: ny burst när riktningen byts eller en ny trace börjar
+    new_burst = np.ones(times.size, dtype=bool)
+    new_burst[1:] = (sent[1:] != sent[:-1]) | ~same_trace
+    burst_starts = np.flatnonzero(new_burst)
+    burst_length = np.diff(np.append(burst_starts, times.size)).astype(np.float64)
+    burst_bytes = np.add.reduceat(sizes, burst_starts)
+    burst_trace = trace_id[burst_starts]
+    burst_out = sent[burst_starts]
+
+    bursts = np.bincount(burst_trace, minlength=n_traces).astype(np.float64)
+    features["bursts"] = bursts
+    features["direction_switches"] = np.maximum(bursts - 1, 0)
+    features["burst_length_mean"] = _divide(np.bincount(burst_trace, weights=burst_length, minlength=n_traces), bursts)
+    features["burst_bytes_mean"] = _divide(np.bincount(burst_trace, weights=burst_bytes, minlength=n_traces), bursts)
+
+    # Bursts ligger i trace-ordning, så max per trace blir en reduceat över varje traces första burst
+    first_burst = np.flatnonzero(np.diff(burst_trace, prepend=-1))
+    features["burst_length_max"][burst_trace[first_burst]] = np.maximum.reduceat(burst_length, first_burst)
+
+    for direction, mask in (("out", burst_out), ("in", ~burst_out)):
+        direction_bursts = np.bincount(burst_trace[mask], minlength=n_traces)
+        features[f"{direction}_burst_length_mean"] = _divide(
+            np.bincount(burst_trace[mask], weights=burst_length[mask], minlength=n_traces), direction_bursts)
+        features[f"{direction}_burst_bytes_mean"] = _divide(
+            np.bincount(burst_trace[mask], weights=burst_bytes[mask], minlength=n_traces), direction_bursts)
+    return features
+
+
+@memory_profile.profiled("features")
+def server_features(server_dir, readahead=trace_io.READAHEAD, prefetch_bytes=trace_io.PREFETCH_BYTES):
+    """Per-trace features of every valid trace on a server, with the url and trace index of each."""
+    parts = []
+    urls = []
+    indices = []
+    for url in range(trace_io.NUM_URLS):
+        url_folder = Path(server_dir) / str(url)
+        if not url_folder.is_dir():
+            continue
+        # Samma urval som all-stats.py: bara traces som konverterades utan fel
+        log_files, _ = parse_ledger.valid_trace_files(url_folder)
+        traces = [trace for _, trace in trace_io.prefetch_traces(log_files, readahead, prefetch_bytes)]
+        keep = [i for i, trace in enumerate(traces) if trace[0].size]
+        if not keep:
+            continue
+        parts.append(batch_features([traces[i] for i in keep]))
+        urls.append(np.full(len(keep), url))
+        indices.append(np.array([int(log_files[i].name.split(".")[0]) for i in keep]))
+
+    if not parts:
+        return {"url": np.zeros(0, dtype=np.int64), "trace": np.zeros(0, dtype=np.int64),
+                **{key: np.zeros(0) for key in FEATURES}}
+    result = {key: np.concatenate([part[key] for part in parts]) for key in FEATURES}
+    result["url"] = np.concatenate(urls)
+    result["trace"] = np.concatenate(indices)
+    return result
+
+
+def summarize(features):
+    """Mean of every feature over the traces of a server, averaging per URL first like all-stats.py."""
+    if features["url"].size == 0:
+        return {key: 0.0 for key in FEATURES}
+    urls, url_index = np.unique(features["url"], return_inverse=True)
+    traces_per_url = np.bincount(url_index)
+    return {key: float(np.mean(np.bincount(url_index, weights=features[key]) / traces_per_url)) for key in FEATURES}
+
+
+def process_server(server_dir, per_trace_dir, readahead, prefetch_bytes):
+    features = server_features(server_dir, readahead, prefetch_bytes)
+    if per_trace_dir:
+        np.savez_compressed(os.path.join(per_trace_dir, f"{Path(server_dir).name}.npz"), **features)
+    return summarize(features), int(features["url"].size)
+
+
+def print_and_save_results(results, output_path):
+    # Server/försvar tolkas som i all-stats.py (-ND / -DT)
+    is_server_defended = importlib.import_module("all-stats").is_server_defended
+
+    print("\n===== SUMMARY =====")
+    short = ["packets", "iat_mean", "iat_p50", "bursts", "burst_length_mean", "out_burst_length_mean", "in_burst_length_mean"]
+    header = {key: column for key, column in FEATURE_COLUMNS}
+    print(f"{'Server name':<25} | {'Defense':<12} | {'Traces':<7} | " + " | ".join(f"{header[key]:<14}" for key in short))
+    print("-" * 180)
+    for server, (summary, traces) in results.items():
+        display_server_name, defense = is_server_defended(server.name)
+        print(f"{display_server_name:<25} | {defense:<12} | {traces:<7} | " + " | ".join(f"{summary[key]:<14.2f}" for key in short))
+
+    with open(output_path, mode="w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Server", "Defense", "Traces"] + [column for _, column in FEATURE_COLUMNS])
+        for server, (summary, traces) in results.items():
+            display_server_name, defense = is_server_defended(server.name)
+            writer.writerow([display_server_name, defense, traces] + [round(summary[key], 3) for key in FEATURES])
+    print(f"\nFeatures saved to: {output_path}\n")
+
+
+def main(args):
+    servers = trace_io.list_servers(args.results_dir)
+    if args.per_trace_dir:
+        os.makedirs(args.per_trace_dir, exist_ok=True)
+
+    with multiprocessing.Pool() as pool:
+        tasks = [pool.apply_async(process_server, args=(server, args.per_trace_dir, args.readahead, args.prefetch_mib * 1024 ** 2)) for server in servers]
+        results = {}
+        for server, task in zip(servers, tasks):
+            results[server] = task.get()
+            print(f"{server.name:<35} {results[server][1]} traces")
+
+    output_path = args.output_file
+    if not output_path.lower().endswith(".csv"):
+        output_path += ".csv"
+    print_and_save_results(results, output_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inter-arrival time and burst features per trace, averaged per server and defense.")
+    parser.add_argument("results_dir", type=str, help="Path to the results directory (results/<server>/<url>/<n>.log)")
+    parser.add_argument("output_file", type=str, help="Path to output CSV file")
+    parser.add_argument("--per-trace-dir", default=None, help="also save every trace's features as <server>.npz here")
+    trace_io.add_prefetch_arguments(parser)
+
+    main(parser.parse_args())
@@ -0,0 +1,296 @@
+import gzip
+import io
+import json
+import lzma
+import os
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from pathlib import Path
+
+NUM_URLS = 50           # URL-mappar 0-49 per server
+TRACES_PER_URL = 100    # 20 samples * 5 enheter, 0.log-99.log
+
+TRACE_EXTENSIONS = (".log", ".logz")
+
+# Komprimerat format (.logz), inuti en xz- eller gzip-ström:
+#   header: MAGIC, version (B), längd på metadata (I), metadata som JSON
+#   block:  antal paket (I), tidsskala (q), typkod för tidsdifferenser (B),
+#           antal ordboksposter (H), typkod för ordboksindex (B),
+#           ordbok: riktningar (uint8) och storlekar (int32),
+#           tidsdifferenser / tidsskala, ordboksindex per paket
+# Strömmen slutar med ett block med 0 paket.
+MAGIC = b"DTRC"
+FORMAT_VERSION = 1
+BLOCK_PACKETS = 1 << 16
+# gzip är snabbast att läsa, xz ger ~25% mindre filer för arkivering
+COMPRESSORS = {"gzip": gzip.open, "xz": lzma.open}
+
+# Förhämtning (prefetch_traces): kommande filer läses av bakgrundstrådar medan den förra tolkas,
+# så att varje fil på NFS inte väntar en hel rundresa innan tolkningen börjar
+READAHEAD = 8                       # Filer som läses i förväg, 0 stänger av
+PREFETCH_BYTES = 64 * 1024 ** 2     # Högst så mycket inläst men ännu inte tolkat
+# En .logz packas upp redan i bakgrundstråden; arrayerna (17 byte per paket) blir ~10 gånger större
+# än en gzip-fil (mer för xz), och det är den storleken som räknas mot PREFETCH_BYTES
+LOGZ_EXPANSION = 12
+
+_HEADER = struct.Struct("<4sBI")
+_BLOCK = struct.Struct("<IqBHB")
+_INT_TYPES = [np.int8, np.int16, np.int32, np.int64]
+_UINT_TYPES = [np.uint8, np.uint16]
+
+_EMPTY = np.zeros(0, dtype=np.int64)
+
+
+def parse_trace(data):
+    """Parse the contents of a .log file ("time,dir,size" lines) into arrays.
+
+    Returns (times, sent, sizes): times in nanoseconds (int64), sent as a bool
+    array (True for 's', False for 'r') and sizes in bytes (int64).
+    """
+    data = data.strip()
+    if not data:
+        return _EMPTY, np.zeros(0, dtype=bool), _EMPTY
+
+    # Riktningen görs om till 1/0 så att hela filen kan läsas som en lång sifferlista
+    data = data.replace(b",s,", b",1,").replace(b",r,", b",0,").replace(b"\n", b",")
+    values = np.fromstring(data, dtype=np.int64, sep=",")
+    if values.size % 3 != 0:
+        raise ValueError("malformed trace, expected lines of 'time,direction,size'")
+
+    values = values.reshape(-1, 3)
+    return values[:, 0], values[:, 1] == 1, values[:, 2]
+
+
+def format_trace(times, sent, sizes):
+    """Inverse of parse_trace, the text of a .log file."""
+    directions = np.where(sent, "s", "r")
+    return "\n".join(f"{time},{direction},{size}" for time, direction, size in zip(times.tolist(), directions, sizes.tolist()))
+
+
+def _smallest_type(values, types):
+    for dtype in types:
+        info = np.iinfo(dtype)
+        if values.size == 0 or (values.min() >= info.min and values.max() <= info.max):
+            return types.index(dtype)
+    raise ValueError("values do not fit in any supported integer type")
+
+
+def _encode_block(times, previous_time, sent, sizes):
+    # Tidsstämplarna blir differenser, delade med deras gemensamma faktor (oftast 1000 ns)
+    deltas = np.diff(times, prepend=previous_time)
+    scale = int(np.gcd.reduce(deltas)) or 1
+    deltas = deltas // scale
+    delta_code = _smallest_type(deltas, _INT_TYPES)
+
+    # Riktning och storlek ordboks-kodas, det finns bara ett fåtal olika kombinationer
+    symbols = sizes * 2 + sent
+    table, indices = np.unique(symbols, return_inverse=True)
+    if table.size > np.iinfo(np.uint16).max:
+        raise ValueError("too many distinct packet sizes in one block")
+    index_code = _smallest_type(indices, _UINT_TYPES)
+
+    return b"".join([
+        _BLOCK.pack(times.size, scale, delta_code, table.size, index_code),
+        (table % 2).astype(np.uint8).tobytes(),
+        (table // 2).astype(np.int32).tobytes(),
+        deltas.astype(_INT_TYPES[delta_code]).tobytes(),
+        indices.astype(_UINT_TYPES[index_code]).tobytes()
+    ])
+
+
+def _read_exact(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("truncated compressed trace")
+    return data
+
+
+def _decode_block(f, previous_time):
+    n, scale, delta_code, table_size, index_code = _BLOCK.unpack(_read_exact(f, _BLOCK.size))
+    if n == 0:
+        return None
+    directions = np.frombuffer(_read_exact(f, table_size), dtype=np.uint8)
+    table_sizes = np.frombuffer(_read_exact(f, table_size * 4), dtype=np.int32)
+    delta_type = np.dtype(_INT_TYPES[delta_code])
+    index_type = np.dtype(_UINT_TYPES[index_code])
+    deltas = np.frombuffer(_read_exact(f, n * delta_type.itemsize), dtype=delta_type)
+    indices = np.frombuffer(_read_exact(f, n * index_type.itemsize), dtype=index_type)
+
+    times = previous_time + np.cumsum(deltas.astype(np.int64) * scale)
+    return times, directions[indices] == 1, table_sizes[indices].astype(np.int64)
+
+
+def _detect_compressor(head):
+    return "gzip" if head[:2] == b"\x1f\x8b" else "xz"
+
+
+def open_compressed(path, mode="rb", compressor=None):
+    """Open a .logz file; when reading, the compressor is detected from the file."""
+    if compressor is None:
+        with open(path, "rb") as f:
+            compressor = _detect_compressor(f.read(2))
+    return COMPRESSORS[compressor](path, mode)
+
+
+def write_trace(trace_file, times, sent, sizes, metadata=None, compressor="gzip"):
+    """Write a trace as text (.log) or in the compressed format (.logz)."""
+    if not str(trace_file).endswith(".logz"):
+        with open(trace_file, "w") as f:
+            f.write(format_trace(times, sent, sizes))
+        return
+
+    meta = json.dumps(metadata or {}).encode()
+    with open_compressed(trace_file, "wb", compressor) as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(meta)) + meta)
+        previous_time = 0
+        for start in range(0, len(times), BLOCK_PACKETS):
+            end = start + BLOCK_PACKETS
+            f.write(_encode_block(times[start:end], previous_time, sent[start:end], sizes[start:end]))
+            previous_time = int(times[min(end, len(times)) - 1])
+        f.write(_BLOCK.pack(0, 1, 0, 0, 0))
+
+
+def _read_header(f):
+    magic, version, meta_length = _HEADER.unpack(_read_exact(f, _HEADER.size))
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("not a compressed trace file")
+    return json.loads(_read_exact(f, meta_length))
+
+
+def read_trace_metadata(trace_file):
+    """Metadata stored in a .logz header ({} for text traces)."""
+    if not str(trace_file).endswith(".logz"):
+        return {}
+    with open_compressed(trace_file) as f:
+        return _read_header(f)
+
+
+def iter_trace_blocks(trace_file):
+    """Yield (times, sent, sizes) chunks of a trace, decompressing .logz files as a stream."""
+    if not str(trace_file).endswith(".logz"):
+        yield read_trace(trace_file)
+        return
+
+    with open_compressed(trace_file) as f:
+        yield from _iter_blocks(f)
+
+
+def _iter_blocks(f):
+    _read_header(f)
+    previous_time = 0
+    while True:
+        block = _decode_block(f, previous_time)
+        if block is None:
+            return
+        previous_time = int(block[0][-1])
+        yield block
+
+
+def _join_blocks(blocks):
+    if not blocks:
+        return _EMPTY, np.zeros(0, dtype=bool), _EMPTY
+    return tuple(np.concatenate(column) for column in zip(*blocks))
+
+
+def load_trace(trace_file, data):
+    """Parse the raw bytes of a trace file (.log or .logz) that has already been read, see read_trace."""
+    if not str(trace_file).endswith(".logz"):
+        return parse_trace(data)
+
+    with COMPRESSORS[_detect_compressor(data)](io.BytesIO(data), "rb") as f:
+        return _join_blocks(list(_iter_blocks(f)))
+
+
+def read_trace(trace_file):
+    """Read one trace file (.log or .logz) into (times, sent, sizes) arrays, see parse_trace."""
+    if str(trace_file).endswith(".logz"):
+        return _join_blocks(list(iter_trace_blocks(trace_file)))
+    with open(trace_file, "rb") as f:
+        return parse_trace(f.read())
+
+
+def _read_ahead(trace_file):
+    """Background part of prefetch_traces: a .logz is decompressed block by block, a .log only read."""
+    if str(trace_file).endswith(".logz"):
+        return read_trace(trace_file)
+    with open(trace_file, "rb") as f:
+        return f.read()
+
+
+def _prefetch_size(trace_file):
+    """Memory a read-ahead file will hold until the caller takes it, estimated from its size on disk."""
+    try:
+        size = os.path.getsize(trace_file)
+    except OSError:
+        return 0
+    return size * LOGZ_EXPANSION if str(trace_file).endswith(".logz") else size
+
+
+def prefetch_traces(trace_files, readahead=READAHEAD, max_bytes=PREFETCH_BYTES):
+    """Yield (trace_file, trace) for each file in order, like read_trace but with the I/O done ahead.
+
+    Up to readahead files are read by background threads while the caller works on earlier ones
+    (.logz files are decompressed there as a stream). A read is counted against max_bytes from
+    when it is submitted until its trace is yielded, and no new read starts that would go over it;
+    a single file larger than max_bytes is still read when nothing else is waiting. A read error
+    is raised when its file's turn comes. readahead=0 reads each file in turn.
+    """
+    if readahead <= 0:
+        for trace_file in trace_files:
+            yield trace_file, read_trace(trace_file)
+        return
+
+    files = iter(trace_files)
+    pending = deque()
+    reserved = 0
+    next_file = next(files, None)
+    pool = ThreadPoolExecutor(readahead)
+    try:
+        while True:
+            while next_file is not None and len(pending) < readahead:
+                size = _prefetch_size(next_file)
+                if pending and reserved + size > max_bytes:
+                    break
+                pending.append((next_file, size, pool.submit(_read_ahead, next_file)))
+                reserved += size
+                next_file = next(files, None)
+            if not pending:
+                return
+            trace_file, size, future = pending.popleft()
+            data = future.result()
+            reserved -= size
+            yield trace_file, parse_trace(data) if isinstance(data, bytes) else data
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def add_prefetch_arguments(parser):
+    """--readahead and --prefetch-mib for the scripts that read traces through prefetch_traces."""
+    parser.add_argument("--readahead", default=READAHEAD, type=int, help="log files read ahead in background threads (0: off)")
+    parser.add_argument("--prefetch-mib", default=PREFETCH_BYTES // 1024 ** 2, type=int, help="memory cap for read-ahead log files in MiB")
+
+
+def trace_files(url_folder):
+    """Trace files (.log or .logz) in a URL folder, sorted by their index."""
+    files = [(int(trace_file.name.split(".")[0]), trace_file) for trace_file in Path(url_folder).iterdir()
+             if trace_file.suffix in TRACE_EXTENSIONS and trace_file.name.split(".")[0].isdigit()]
+    return [trace_file for _, trace_file in sorted(files)]
+
+
+def list_servers(results_dir):
+    """Server folders in a results tree, e.g. se-got-wg-001-DT."""
+    return [server for server in sorted(Path(results_dir).iterdir())
+            if server.is_dir() and not server.name.startswith(".")]
+
+
+def iter_server_traces(server_dir):
+    """Yield (url, index, path) for every results/<server>/<url>/<index>.log(z), in numeric order."""
+    server_dir = Path(server_dir)
+    for url in range(NUM_URLS):
+        url_folder = server_dir / str(url)
+        if not url_folder.is_dir():
+            continue
+        for trace_file in trace_files(url_folder):
+            yield url, int(trace_file.name.split(".")[0]), trace_file
@@ -0,0 +1,99 @@
+import argparse
+import csv
+import os
+from pathlib import Path
+import parse_ledger
+import pcap_to_log_parser
+import trace_io
+
+# results/manifest.csv: en rad per logg med vilken server, URL, sample och enhet den kom från,
+# så att statistiken kan delas upp per enhet/sample utan att gå tillbaka till pcap-filerna.
+# Loggnamnet n = (sample-1)*5 + (enhet-1) går också att räkna baklänges, det används för
+# resultatmappar som skapades innan manifestet fanns.
+MANIFEST_NAME = "manifest.csv"
+COLUMNS = ["log", "server", "url", "sample", "device", "pcap"]
+DEVICES = 5
+
+
+def manifest_path(results):
+    return os.path.join(results, MANIFEST_NAME)
+
+
+def identity_from_index(index):
+    """(sample_id, device_id), both counted from 1, of log n.log (inverse of pcap_to_log_parser.log_path)."""
+    return index // DEVICES + 1, index % DEVICES + 1
+
+
+def capture_rows(results, server, log_format="log"):
+    """Manifest rows for every capture of a server folder in the dataset."""
+    rows = []
+    for url_id in range(1, 51):
+        for sample_id, device_id, pcap_path, log_path in pcap_to_log_parser.capture_paths(server, url_id, results, log_format):
+            rows.append({"log": parse_ledger.log_key(results, log_path), "server": Path(server).name, "url": url_id - 1,
+                         "sample": sample_id, "device": device_id, "pcap": str(pcap_path)})
+    return rows
+
+
+def write_manifest(results, rows):
+    """Add rows to the manifest (a row for an already listed log replaces it)."""
+    manifest = _read(results)
+    manifest.update((row["log"], row) for row in rows)
+    # Skrivs till en temporär fil och byts sedan ut, så att en avbruten körning inte lämnar en halv fil
+    temporary = manifest_path(results) + ".partial"
+    with open(temporary, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(sorted(manifest.values(), key=lambda row: (row["server"], int(row["url"]), int(row["sample"]), int(row["device"]))))
+    os.replace(temporary, manifest_path(results))
+
+
+def _read(results):
+    try:
+        with open(manifest_path(results), newline="") as f:
+            return {row["log"]: row for row in csv.DictReader(f)}
+    except FileNotFoundError:
+        return {}
+
+
+_identity_cache = {}
+
+def identities(results):
+    """{log key: (sample_id, device_id)} for a results folder, from the manifest or else from the log names."""
+    results = os.path.abspath(results)
+    if results not in _identity_cache:
+        manifest = _read(results)
+        if manifest:
+            _identity_cache[results] = {key: (int(row["sample"]), int(row["device"])) for key, row in manifest.items()}
+        else:
+            _identity_cache[results] = {parse_ledger.log_key(results, log_file): identity_from_index(index)
+                                        for server in trace_io.list_servers(results)
+                                        for _, index, log_file in trace_io.iter_server_traces(server)}
+    return _identity_cache[results]
+
+
+def trace_identity(results, log_file):
+    """(sample_id, device_id) of one log file in a results folder."""
+    key = parse_ledger.log_key(results, log_file)
+    found = identities(results).get(key)
+    return found if found else identity_from_index(int(Path(log_file).name.split(".")[0]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write results/manifest.csv (server, URL, sample and device of every log) for an existing results folder.")
+    parser.add_argument("results", help="results folder")
+    parser.add_argument("--dir", default=None, help="capture folder the results were converted from (adds the pcap paths)")
+    parser.add_argument("--format", default="log", choices=["log", "logz"], help="trace format of the results folder")
+
+    args = parser.parse_args()
+    if args.dir:
+        rows = [row for server in sorted(Path(args.dir).iterdir()) if server.is_dir()
+                for row in capture_rows(args.results, server, args.format)]
+    else:
+        rows = []
+        for server in trace_io.list_servers(args.results):
+            for url, index, log_file in trace_io.iter_server_traces(server):
+                sample_id, device_id = identity_from_index(index)
+                rows.append({"log": parse_ledger.log_key(args.results, log_file), "server": server.name, "url": url,
+                             "sample": sample_id, "device": device_id, "pcap": ""})
+    write_manifest(args.results, rows)
+    print(f"{len(rows)} traces listed in {manifest_path(args.results)}\n")
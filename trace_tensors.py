@@ -0,0 +1,192 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import numpy as np
+import memory_profile
+import parse_ledger
+import trace_io
+import trace_manifest
+import trace_timeseries
+
+# Träningsdata för attackerna i fast form: en sammanhängande <server>.npy med formen (traces, kanaler, längd)
+# som kan minnesmappas (np.load(..., mmap_mode="r")), och <server>_index.csv med etikett (URL) och
+# ursprung för varje rad. Loggarna tolkas och fylls ut en gång här i stället för vid varje träning.
+METADATA_NAME = "tensors.json"
+INDEX_COLUMNS = ["row", "label", "url", "index", "sample", "device", "log"]
+
+# Kanaler per paket i sekvensformen (de första --length paketen, nollor efter sista paketet)
+SEQUENCE_CHANNELS = {
+    "direction": lambda times, sent, sizes: np.where(sent, 1.0, -1.0),     # +1 skickat, -1 mottaget som i DF
+    "size": lambda times, sent, sizes: sizes.astype(np.float64),
+    "signed_size": lambda times, sent, sizes: np.where(sent, sizes, -sizes).astype(np.float64),
+    "time": lambda times, sent, sizes: times / 1e9,
+    "iat": lambda times, sent, sizes: np.diff(times, prepend=times[:1]) / 1e9,
+}
+# Kanaler per tidsintervall i binform, samma som trace_timeseries.CHANNELS
+BIN_CHANNELS = {
+    "sent_bytes": 0,
+    "received_bytes": 1,
+    "sent_packets": 2,
+    "received_packets": 3,
+}
+REPRESENTATIONS = {"sequence": SEQUENCE_CHANNELS, "bins": BIN_CHANNELS}
+DEFAULT_CHANNELS = {"sequence": ["direction"], "bins": ["sent_bytes", "received_bytes"]}
+
+
+def sequence_tensor(traces, channels, length):
+    """(len(traces), len(channels), length) array of the first length packets of every trace, zero padded."""
+    tensor = np.zeros((len(traces), len(channels), length), dtype=np.float32)
+    if not traces:
+        return tensor
+    counts = np.array([trace[0].size for trace in traces])
+    # Bara de första length paketen av varje trace behövs, resten kapas innan något räknas
+    kept = [tuple(column[:length] for column in trace) for trace in traces]
+    columns = [np.concatenate([trace[i] for trace in kept]) for i in range(3)]
+    kept_counts = np.minimum(counts, length)
+    row = np.repeat(np.arange(len(traces)), kept_counts)
+    position = np.arange(row.size) - np.repeat(np.cumsum(kept_counts) - kept_counts, kept_counts)
+
+    for channel_index, channel in enumerate(channels):
+        values = SEQUENCE_CHANNELS[channel](*columns)
+        if channel == "iat":
+            # Differensen räknas över alla traces i följd, första paketet i varje trace får 0
+            values[position == 0] = 0
+        tensor[row, channel_index, position] = values
+    return tensor
+
+
+def bin_tensor(traces, channels, bin_ms, window_s):
+    """(len(traces), len(channels), bins) array of bytes/packets per time bin (see trace_timeseries.bin_traces)."""
+    bin_ns = int(bin_ms * 1e6)
+    n_bins = int(np.ceil(window_s * 1000 / bin_ms))
+    series, _ = trace_timeseries.bin_traces(traces, bin_ns, n_bins)
+    return series[:, [BIN_CHANNELS[channel] for channel in channels], :]
+
+
+def tensor_length(args):
+    return args.length if args.representation == "sequence" else int(np.ceil(args.window * 1000 / args.bin_ms))
+
+
+def make_tensor(traces, args):
+    if args.representation == "sequence":
+        return sequence_tensor(traces, args.channels, args.length)
+    return bin_tensor(traces, args.channels, args.bin_ms, args.window)
+
+
+@memory_profile.profiled("tensors")
+def server_tensors(server_dir, output_dir, args):
+    """Write <server>.npy and <server>_index.csv for one server, returns the number of rows."""
+    server_dir = Path(server_dir)
+    results = server_dir.parent
+    files = []
+    for url in range(trace_io.NUM_URLS):
+        url_folder = server_dir / str(url)
+        if url_folder.is_dir():
+            log_files, _ = parse_ledger.valid_trace_files(url_folder)
+            files += [(url, log_file) for log_file in log_files]
+
+    tensor_path = os.path.join(output_dir, f"{server_dir.name}.npy")
+    index_path = os.path.join(output_dir, f"{server_dir.name}_index.csv")
+    shape = (len(files), len(args.channels), tensor_length(args))
+    # Skrivs direkt till en minnesmappad fil och byts ut först när den är klar
+    tensor = np.lib.format.open_memmap(tensor_path + ".partial", mode="w+", dtype=np.dtype(args.dtype), shape=shape)
+
+    index_rows = []
+    batch = []
+    row = 0
+    loaded = trace_io.prefetch_traces([log_file for _, log_file in files], args.readahead, args.prefetch_mib * 1024 ** 2)
+    for (url, log_file), (_, trace) in zip(files, loaded):
+        batch.append(trace)
+        sample_id, device_id = trace_manifest.trace_identity(results, log_file)
+        index_rows.append({"row": len(index_rows), "label": url, "url": url, "index": int(log_file.name.split(".")[0]),
+                           "sample": sample_id, "device": device_id, "log": parse_ledger.log_key(results, log_file)})
+        if len(batch) == args.batch:
+            tensor[row:row + len(batch)] = make_tensor(batch, args)
+            row += len(batch)
+            batch = []
+    if batch:
+        tensor[row:row + len(batch)] = make_tensor(batch, args)
+    tensor.flush()
+    del tensor
+    os.replace(tensor_path + ".partial", tensor_path)
+
+    with open(index_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=INDEX_COLUMNS)
+        writer.writeheader()
+        writer.writerows(index_rows)
+    return len(files)
+
+
+def load_server(output_dir, server_name):
+    """(tensor, labels, index rows) of one server; the tensor is memory-mapped read-only."""
+    tensor = np.load(os.path.join(output_dir, f"{server_name}.npy"), mmap_mode="r")
+    with open(os.path.join(output_dir, f"{server_name}_index.csv"), newline="") as f:
+        rows = list(csv.DictReader(f))
+    labels = np.array([int(row["label"]) for row in rows], dtype=np.int64)
+    return tensor, labels, rows
+
+
+def iter_batches(tensor, labels, batch_size, shuffle=True, seed=0):
+    """Yield (x, y) batches as in-memory arrays from a (memory-mapped) tensor.
+
+    With shuffle the rows come in a random order, but every batch is read in ascending
+    row order so that the reads from the file stay as sequential as possible.
+    """
+    order = np.random.default_rng(seed).permutation(len(labels)) if shuffle else np.arange(len(labels))
+    for start in range(0, len(order), batch_size):
+        rows = np.sort(order[start:start + batch_size])
+        yield np.asarray(tensor[rows]), labels[rows]
+
+
+def main(args):
+    channels = REPRESENTATIONS[args.representation]
+    args.channels = args.channels or DEFAULT_CHANNELS[args.representation]
+    unknown = [channel for channel in args.channels if channel not in channels]
+    if unknown:
+        print(f"Error: unknown {args.representation} channel(s) {', '.join(unknown)}, expected {', '.join(channels)}\n")
+        return
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    servers = trace_io.list_servers(args.results_dir)
+    with multiprocessing.Pool() as pool:
+        tasks = [pool.apply_async(server_tensors, args=(server, args.output_dir, args)) for server in servers]
+        rows = {}
+        for server, task in zip(servers, tasks):
+            rows[server.name] = task.get()
+            print(f"{server.name:<35} {rows[server.name]} traces -> {os.path.join(args.output_dir, server.name + '.npy')}")
+
+    shape = [len(args.channels), tensor_length(args)]
+    metadata = {
+        "representation": args.representation,
+        "channels": args.channels,
+        "dtype": args.dtype,
+        "shape": shape,
+        "servers": rows,
+    }
+    if args.representation == "sequence":
+        metadata["length"] = args.length
+    else:
+        metadata.update(bin_ms=args.bin_ms, window_s=args.window)
+    with open(os.path.join(args.output_dir, METADATA_NAME), "w") as f:
+        json.dump(metadata, f, indent=2)
+    print(f"\nTensors of shape (traces, {shape[0]}, {shape[1]}) saved to: {args.output_dir}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Turn every server's traces into one fixed-shape, memory-mappable tensor (<server>.npy) with a label/index file for WF attacks.")
+    parser.add_argument("results_dir", type=str, help="Path to the results directory (results/<server>/<url>/<n>.log)")
+    parser.add_argument("output_dir", type=str, help="Directory for <server>.npy, <server>_index.csv and tensors.json")
+    parser.add_argument("--representation", default="sequence", choices=list(REPRESENTATIONS), help="first packets in order (sequence) or fixed time bins (bins)")
+    parser.add_argument("--channels", nargs="+", default=None,
+                        help=f"sequence: {', '.join(SEQUENCE_CHANNELS)} (default direction); bins: {', '.join(BIN_CHANNELS)} (default sent_bytes received_bytes)")
+    parser.add_argument("--length", default=5000, type=int, help="packets per trace in the sequence representation (DF uses 5000)")
+    parser.add_argument("--bin-ms", default=10, type=float, help="bin width in milliseconds for the bins representation")
+    parser.add_argument("--window", default=60, type=float, help="seconds covered by the bins representation")
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"], help="element type of the tensors")
+    parser.add_argument("--batch", default=256, type=int, help="traces converted and written at a time")
+    trace_io.add_prefetch_arguments(parser)
+
+    main(parser.parse_args())
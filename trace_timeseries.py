@@ -0,0 +1,129 @@
+import argparse
+import multiprocessing
+import os
+import numpy as np
+from pathlib import Path
+import memory_profile
+import trace_io
+
+# Kanaler i varje tidsserie, i denna ordning
+CHANNELS = ["sent bytes", "received bytes", "sent packets", "received packets"]
+PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def bin_traces(traces, bin_ns, n_bins):
+    """Bin (times, sent, sizes) traces into fixed-width time bins.
+
+    Returns (series, overflow): series has shape (len(traces), 4, n_bins) with the
+    channels in CHANNELS order, overflow is the number of packets after the last bin.
+    """
+    series = np.zeros((len(traces), len(CHANNELS), n_bins), dtype=np.float32)
+    if not traces:
+        return series, 0
+
+    counts = [len(times) for times, _, _ in traces]
+    times = np.concatenate([trace[0] for trace in traces])
+    sent = np.concatenate([trace[1] for trace in traces])
+    sizes = np.concatenate([trace[2] for trace in traces])
+    trace_index = np.repeat(np.arange(len(traces)), counts)
+
+    bins = times // bin_ns
+    inside = bins < n_bins
+    overflow = int(np.count_nonzero(~inside))
+    bins, sent, sizes, trace_index = bins[inside], sent[inside], sizes[inside], trace_index[inside]
+
+    # Ett platt index (trace, kanal, bin) per paket, så att allt summeras med två bincount
+    received = (~sent).astype(np.int64)
+    byte_index = (trace_index * len(CHANNELS) + received) * n_bins + bins
+    packet_index = (trace_index * len(CHANNELS) + 2 + received) * n_bins + bins
+
+    size = series.size
+    flat = np.bincount(byte_index, weights=sizes, minlength=size)
+    flat += np.bincount(packet_index, minlength=size)
+    series[:] = flat.reshape(series.shape)
+    return series, overflow
+
+
+@memory_profile.profiled("timeseries")
+def server_timeseries(server_dir, bin_ms=10, window_s=60, readahead=trace_io.READAHEAD, prefetch_bytes=trace_io.PREFETCH_BYTES):
+    """Mean and percentile curves per URL and for the whole server (logs read ahead, see trace_io.prefetch_traces)."""
+    bin_ns = int(bin_ms * 1e6)
+    n_bins = int(np.ceil(window_s * 1000 / bin_ms))
+
+    url_mean = np.zeros((trace_io.NUM_URLS, len(CHANNELS), n_bins), dtype=np.float32)
+    url_percentiles = np.zeros((trace_io.NUM_URLS, len(PERCENTILES), len(CHANNELS), n_bins), dtype=np.float32)
+    trace_count = np.zeros(trace_io.NUM_URLS, dtype=np.int64)
+    overflow = 0
+
+    traces_per_url = {}
+    server_traces = list(trace_io.iter_server_traces(server_dir))
+    loaded = trace_io.prefetch_traces([log_file for _, _, log_file in server_traces], readahead, prefetch_bytes)
+    for (url, _, _), (_, trace) in zip(server_traces, loaded):
+        traces_per_url.setdefault(url, []).append(trace)
+
+    for url, traces in traces_per_url.items():
+        series, url_overflow = bin_traces(traces, bin_ns, n_bins)
+        url_mean[url] = series.mean(axis=0)
+        url_percentiles[url] = np.percentile(series, PERCENTILES, axis=0)
+        trace_count[url] = len(traces)
+        overflow += url_overflow
+
+    # Serverkurvan: medel över alla traces, spridning mellan URL:ernas medelkurvor
+    measured = trace_count > 0
+    if measured.any():
+        server_mean = np.average(url_mean[measured], axis=0, weights=trace_count[measured]).astype(np.float32)
+        server_percentiles = np.percentile(url_mean[measured], PERCENTILES, axis=0).astype(np.float32)
+    else:
+        server_mean = np.zeros((len(CHANNELS), n_bins), dtype=np.float32)
+        server_percentiles = np.zeros((len(PERCENTILES), len(CHANNELS), n_bins), dtype=np.float32)
+
+    return {
+        "bin_ms": np.float64(bin_ms),
+        "channels": np.array(CHANNELS),
+        "percentiles": np.array(PERCENTILES),
+        "url_mean": url_mean,
+        "url_percentiles": url_percentiles,
+        "server_mean": server_mean,
+        "server_percentiles": server_percentiles,
+        "trace_count": trace_count,
+        "overflow_packets": np.int64(overflow)
+    }
+
+
+def process_server(server_dir, output_dir, bin_ms, window_s, readahead, prefetch_bytes):
+    result = server_timeseries(server_dir, bin_ms, window_s, readahead, prefetch_bytes)
+    output_path = os.path.join(output_dir, f"{Path(server_dir).name}.npz")
+    np.savez_compressed(output_path, **result)
+    return output_path, int(result["trace_count"].sum()), int(result["overflow_packets"])
+
+
+def load_timeseries(path):
+    """Load a saved server time series as a dict of arrays."""
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def main(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    servers = trace_io.list_servers(args.results_dir)
+
+    with multiprocessing.Pool() as pool:
+        tasks = [pool.apply_async(process_server, args=(server, args.output_dir, args.bin_ms, args.window,
+                                                         args.readahead, args.prefetch_mib * 1024 ** 2))
+                 for server in servers]
+        for server, task in zip(servers, tasks):
+            output_path, traces, overflow = task.get()
+            print(f"{server.name:<35} {traces} traces -> {output_path}")
+            if overflow:
+                print(f"{'':<35} {overflow} packets after the {args.window} s window were not binned")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bin every trace into sent/received time series and aggregate per URL and server.")
+    parser.add_argument("results_dir", type=str, help="Path to the results directory (results/<server>/<url>/<n>.log)")
+    parser.add_argument("output_dir", type=str, help="Directory for the <server>.npz files")
+    parser.add_argument("--bin-ms", default=10, type=float, help="bin width in milliseconds")
+    parser.add_argument("--window", default=60, type=float, help="length of the binned window in seconds")
+    trace_io.add_prefetch_arguments(parser)
+
+    main(parser.parse_args())
@@ -0,0 +1,253 @@
+import argparse
+import csv
+import multiprocessing
+import os
+import re
+import time
+from pathlib import Path
+import parse_ledger
+import pcap_to_log_parser
+
+CAPTURE_NAME = re.compile(r"URL_(\d+)_Sample_(\d+)_D_(\d+)\.pcap(ng)?(\.gz|\.zst)?$")
+
+# Löpande summor per (server, URL), medelvärden räknas först när de skrivs ut
+STAT_KEYS = ["traces", "bytes", "sent_bytes", "received_bytes", "duration", "sent_packets", "received_packets"]
+
+
+def trace_summary(log_file):
+    """Sums for one converted trace, in STAT_KEYS order."""
+    import numpy as np
+    import trace_io
+
+    times, sent, sizes = trace_io.read_trace(log_file)
+    sent_bytes = int(sizes[sent].sum())
+    received_bytes = int(sizes[~sent].sum())
+    number_sent = int(np.count_nonzero(sent))
+    duration = times[-1] / (10 ** 9) if times.size else 0
+    return [1, sent_bytes + received_bytes, sent_bytes, received_bytes, duration, number_sent, sizes.size - number_sent]
+
+
+def convert_capture(results, pcap_path, log_path):
+    """Convert one finished capture, record it in the ledger and summarise the written trace."""
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    # Skrivs under ett tillfälligt namn, en avbruten körning får inte lämna en halv logg som ser klar ut
+    partial_path = os.path.join(os.path.dirname(log_path), f".partial-{os.path.basename(log_path)}")
+    entry = pcap_to_log_parser.parse_pcap(str(pcap_path), partial_path, False)
+    os.replace(partial_path, log_path)
+    parse_ledger.record(results, log_path, entry)
+    if entry["status"] != parse_ledger.OK:
+        # Kommer inte med i statistiken, precis som i all-stats.py
+        print(f"{pcap_path}: {entry['status']} ({entry['error'] or 'no IP packets'})")
+        return None
+    return trace_summary(log_path)
+
+
+class RunningStats:
+    """Per-server statistics that are updated one trace at a time."""
+
+    def __init__(self):
+        self.urls = {}
+
+    def add(self, server_name, url_id, summary):
+        totals = self.urls.setdefault((server_name, url_id), [0] * len(STAT_KEYS))
+        for i, value in enumerate(summary):
+            totals[i] += value
+
+    def url_averages(self, server_name):
+        """{url_id: {stat: average per trace}} for the URLs measured so far on a server."""
+        averages = {}
+        for (name, url_id), totals in self.urls.items():
+            if name == server_name:
+                averages[url_id] = {key: total / totals[0] for key, total in zip(STAT_KEYS[1:], totals[1:])}
+        return averages
+
+    def server_row(self, server_name, urls=None):
+        """Average over URLs (like all-stats.py), optionally only over the given URL ids."""
+        averages = self.url_averages(server_name)
+        if urls is not None:
+            averages = {url_id: values for url_id, values in averages.items() if url_id in urls}
+        if not averages:
+            return None
+        row = {key: sum(values[key] for values in averages.values()) / len(averages) for key in STAT_KEYS[1:]}
+        row["urls"] = len(averages)
+        row["traces"] = sum(totals[0] for (name, url_id), totals in self.urls.items()
+                            if name == server_name and url_id in averages)
+        return row
+
+    def servers(self):
+        return sorted({name for name, _ in self.urls})
+
+
+def location(server_name):
+    """(location, defended) for -ND / -DT server folders, defended is None for other names."""
+    if server_name.endswith("-ND"):
+        return server_name[:-3], False
+    if server_name.endswith("-DT"):
+        return server_name[:-3], True
+    return server_name, None
+
+
+def overheads(stats):
+    """DAITA overhead per location, computed only over URLs measured on both -ND and -DT."""
+    pairs = {}
+    for server_name in stats.servers():
+        name, defended = location(server_name)
+        if defended is not None:
+            pairs.setdefault(name, {})[defended] = server_name
+
+    rows = []
+    for name, pair in sorted(pairs.items()):
+        if len(pair) != 2:
+            continue
+        shared = set(stats.url_averages(pair[False])) & set(stats.url_averages(pair[True]))
+        undefended = stats.server_row(pair[False], shared)
+        defended = stats.server_row(pair[True], shared)
+        if undefended is None or defended is None:
+            continue
+
+        def ratio(key):
+            return defended[key] / undefended[key] - 1 if undefended[key] else float("inf")
+
+        rows.append((name, len(shared), ratio("bytes"), ratio("duration"), ratio("sent_packets")))
+    return rows
+
+
+def print_summary(stats, expected):
+    print("\n===== RUNNING SUMMARY =====")
+    print(f"{'Server name':<30} | {'Traces':<12} | {'URLs':<5} | {'Average Duration (s)':<22} | {'Average Bandwidth (MiB)':<25}")
+    print("-" * 105)
+    for server_name in stats.servers():
+        row = stats.server_row(server_name)
+        print(f"{server_name:<30} | {row['traces']:>5}/{expected:<6} | {row['urls']:<5} | {row['duration']:<22.2f} | {row['bytes'] / 1024**2:<25.2f}")
+
+    rows = overheads(stats)
+    if rows:
+        print(f"\n{'Location':<30} | {'Shared URLs':<12} | {'Bandwidth Overhead':<20} | {'Time Overhead':<15} | {'Sent Packet Overhead':<20}")
+        print("-" * 110)
+        for name, shared, bandwidth, duration, sent_packets in rows:
+            print(f"{name:<30} | {shared:<12} | {bandwidth:<20.1%} | {duration:<15.1%} | {sent_packets:<20.1%}")
+    print()
+
+
+def save_summary(stats, output_path):
+    """Write the current per-server averages as CSV, replaced atomically so readers never see half a file."""
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, mode="w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Server", "Traces", "URLs", "Average Duration (s)", "Average Bandwidth (MiB)",
+                         "Average Sent Bandwidth (MiB)", "Average Received Bandwidth (MiB)",
+                         "Average Number Sent", "Average Number Received"])
+        for server_name in stats.servers():
+            row = stats.server_row(server_name)
+            writer.writerow([server_name, row["traces"], row["urls"], round(row["duration"], 2),
+                             round(row["bytes"] / 1024**2, 2), round(row["sent_bytes"] / 1024**2, 2),
+                             round(row["received_bytes"] / 1024**2, 2), round(row["sent_packets"], 2),
+                             round(row["received_packets"], 2)])
+    os.replace(tmp_path, output_path)
+
+
+class CaptureWatcher:
+    """Finds captures whose size has stopped changing, i.e. that the capture tool has finished writing."""
+
+    def __init__(self, input_dir, stable_seconds):
+        self.input_dir = Path(input_dir)
+        self.stable_seconds = stable_seconds
+        self.seen = {}      # pcap -> (storlek, tid då storleken senast ändrades)
+        self.handled = set()
+
+    def scan(self):
+        """Return (server_name, url_id, sample_id, device_id, pcap_path) for newly finished captures."""
+        now = time.monotonic()
+        ready = []
+        for server in sorted(self.input_dir.iterdir()):
+            if not server.is_dir():
+                continue
+            for pcap_path in server.iterdir():
+                match = CAPTURE_NAME.match(pcap_path.name)
+                if not match or pcap_path in self.handled:
+                    continue
+                try:
+                    size = pcap_path.stat().st_size
+                except FileNotFoundError:
+                    continue
+
+                previous = self.seen.get(pcap_path)
+                if previous is None or previous[0] != size:
+                    self.seen[pcap_path] = (size, now)
+                elif size > 0 and now - previous[1] >= self.stable_seconds:
+                    del self.seen[pcap_path]
+                    self.handled.add(pcap_path)
+                    ready.append((server.name, *map(int, match.groups()[:3]), pcap_path))
+        return ready
+
+
+def main(args):
+    print(f"Watching {args.dir}, results folder: {args.results}")
+    os.makedirs(args.results, exist_ok=True)
+    summary_path = args.summary or os.path.join(args.results, "running_stats.csv")
+
+    stats = RunningStats()
+    watcher = CaptureWatcher(args.dir, args.stable)
+    expected = 50 * 20 * 5
+    pending = {}
+    last_activity = time.monotonic()
+    changed = False
+
+    with multiprocessing.Pool(args.workers) as pool:
+        try:
+            while True:
+                for server_name, url_id, sample_id, device_id, pcap_path in watcher.scan():
+                    log_path = pcap_to_log_parser.log_path(args.results, server_name, url_id, sample_id, device_id, args.format)
+                    if os.path.exists(log_path):
+                        # Redan konverterad i en tidigare körning, räknas bara in i statistiken
+                        if parse_ledger.log_key(args.results, log_path) not in parse_ledger.excluded_logs(args.results):
+                            stats.add(server_name, url_id, trace_summary(log_path))
+                            changed = True
+                    else:
+                        pending[pcap_path] = (server_name, url_id, pool.apply_async(convert_capture, args=(args.results, pcap_path, log_path)))
+                    last_activity = time.monotonic()
+
+                for pcap_path, (server_name, url_id, task) in list(pending.items()):
+                    if task.ready():
+                        del pending[pcap_path]
+                        try:
+                            summary = task.get()
+                            if summary is not None:
+                                stats.add(server_name, url_id, summary)
+                            print(f"Converted {server_name}/{pcap_path.name}")
+                        except Exception as e:
+                            print(f"Error converting {pcap_path}: {e}")
+                        changed = True
+
+                # Sammanfattningen uppdateras efter varje omgång klara konverteringar, även när fler väntar
+                if changed:
+                    print_summary(stats, expected)
+                    if pending:
+                        print(f"{len(pending)} conversions in progress")
+                    save_summary(stats, summary_path)
+                    changed = False
+
+                if args.idle_exit and not pending and time.monotonic() - last_activity > args.idle_exit:
+                    print(f"No new captures for {args.idle_exit} s, stopping")
+                    break
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            print(f"\nStopped, {len(pending)} unfinished conversions are redone on the next start")
+
+    print_summary(stats, expected)
+    save_summary(stats, summary_path)
+    print(f"Statistics saved to: {summary_path}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert captures to logs as they are recorded and keep running per-server statistics.")
+    parser.add_argument("--dir", required=True, help="root folder that the capture devices write to")
+    parser.add_argument("--results", required=True, help="results folder, may already exist (converted logs are skipped)")
+    parser.add_argument("--stable", default=10, type=float, help="seconds a pcap must keep the same size before it is converted")
+    parser.add_argument("--interval", default=2, type=float, help="seconds between scans of the input folder")
+    parser.add_argument("--idle-exit", default=0, type=float, help="stop after this many seconds without new captures (0: run until Ctrl-C)")
+    parser.add_argument("--summary", default=None, help="CSV with running statistics (default: <results>/running_stats.csv)")
+    parser.add_argument("--workers", default=None, type=int, help="number of conversion processes (default: all cores)")
+    parser.add_argument("--format", default="log", choices=["log", "logz"], help="trace format: text (log) or compressed (logz)")
+
+    main(parser.parse_args())